@@ -0,0 +1,283 @@
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import ListingParser
+import RateLimiter
+import PipelineMetrics
+
+SEARCH_API_URL = ListingParser.AUTOTRADER_BASE_URL + "/Refinement/Search"
+DEFAULT_PAGE_SIZE = 15
+DEFAULT_WORKERS = 8
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0 Safari/537.36",
+    "Accept": "application/json, text/javascript, */*; q=0.01",
+    "Content-Type": "application/json",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+
+def create_session(pool_size=10, retries=3):
+    """
+    Creates a requests.Session with a pooled, retrying HTTP adapter.
+
+    Args:
+        pool_size (int): Maximum number of kept-alive connections per host.
+        retries (int): Number of retries on connection errors and 429/5xx responses.
+
+    Returns:
+        requests.Session: A session ready to talk to the search API.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None,  # Retry POSTs too, the search endpoint is read-only
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def load_search_payload(file_path="fordfusion2017-19.txt"):
+    """
+    Loads a JSON search payload (Make, Model, PriceMin, Skip, Top, ...) from a file.
+    """
+    with open(file_path, "r") as file:
+        return json.load(file)
+
+
+def build_search_payload(filters, address="Kanata, ON", page_size=DEFAULT_PAGE_SIZE):
+    """
+    Builds a search API payload from the filters dict returned by GetUserQuery.main.
+
+    Args:
+        filters (dict): Filters with make, model, price, mileage, year and distance keys.
+        address (str): Location the proximity search is centered on.
+        page_size (int): Number of listings requested per page.
+
+    Returns:
+        dict: A payload shaped like fordfusion2017-19.txt.
+    """
+    payload = {
+        "Address": address,
+        "Make": filters['make'],
+        "Model": filters['model'],
+        "PriceMin": filters['price_min'],
+        "PriceMax": filters['price_max'],
+        "OdometerMin": filters['min_mileage'],
+        "OdometerMax": filters['max_mileage'],
+        "YearMin": filters['min_year'],
+        "YearMax": filters['max_year'],
+        "Skip": 0,
+        "Top": page_size,
+        "IsNew": True,
+        "IsUsed": True,
+        "WithPhotos": True,
+        "micrositeType": 1,
+    }
+    # -1 means nationwide, which is expressed by leaving Proximity out
+    if filters.get('max_distance', -1) != -1:
+        payload["Proximity"] = filters['max_distance']
+    return payload
+
+
+def _first_int(data, keys):
+    for key in keys:
+        value = data.get(key)
+        if value is not None:
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                continue
+    return None
+
+
+def parse_search_response(data):
+    """
+    Splits a search API response into the listings HTML and the total result count.
+
+    Args:
+        data (dict): Decoded JSON body of the search API.
+
+    Returns:
+        tuple: (ads_html (str), total_results (int or None))
+    """
+    ads_html = data.get("AdsHtml") or ""
+
+    results_data = data.get("SearchResultsDataJson") or {}
+    if isinstance(results_data, str):
+        try:
+            results_data = json.loads(results_data)
+        except ValueError:
+            results_data = {}
+
+    total_results = _first_int(results_data, ["totalResultCount", "TotalResultCount", "totalResults"])
+    if total_results is None:
+        total_results = _first_int(data, ["TotalResultCount", "totalResultCount", "TotalResults"])
+    return ads_html, total_results
+
+
+def fetch_search_page(session, payload, skip, top=DEFAULT_PAGE_SIZE, api_url=SEARCH_API_URL, timeout=15, exclusions=None):
+    """
+    Fetches a single page of results from the search API.
+
+    Returns:
+        tuple: (listings (list), total_results (int or None))
+    """
+    page_payload = dict(payload, Skip=skip, Top=top)
+    with PipelineMetrics.get_metrics().stage("search_pages").timed():
+        with RateLimiter.throttled():
+            response = session.post(api_url, json=page_payload, timeout=timeout)
+            response.raise_for_status()
+        ads_html, total_results = parse_search_response(response.json())
+        return ListingParser.parse_listings(ads_html, exclusions), total_results
+
+
+def search_listings(payload, max_pages=9999, session=None, api_url=SEARCH_API_URL, exclusions=None):
+    """
+    Pages through the search API and returns the same records as fetch_listings_from_page.
+
+    Args:
+        payload (dict): Search payload, see build_search_payload / load_search_payload.
+        max_pages (int): Maximum number of pages to fetch.
+        session (requests.Session): Session to reuse; a pooled one is created if omitted.
+        api_url (str): Search endpoint, overridable for the stub server.
+        exclusions (list): Keywords to exclude, passed through to the listing parser.
+
+    Returns:
+        list: A list of listing dicts (Title, Price, Location, Mileage, Link).
+    """
+    own_session = session is None
+    if own_session:
+        session = create_session()
+
+    top = payload.get("Top") or DEFAULT_PAGE_SIZE
+    skip = payload.get("Skip") or 0
+    all_listings = []
+    current_page = 1
+
+    try:
+        while current_page <= max_pages:
+            print(f"Fetching page {current_page} from search API...")
+            listings, total_results = fetch_search_page(session, payload, skip, top, api_url, exclusions=exclusions)
+            if not listings and total_results is None:
+                break
+            all_listings.extend(listings)
+
+            skip += top
+            if total_results is not None and skip >= total_results:
+                break
+            current_page += 1
+    finally:
+        if own_session:
+            session.close()
+
+    return all_listings
+
+
+def with_result_offset(url, rcs, rcp=None):
+    """
+    Returns the search URL with its rcs (result offset) and optionally rcp (page size) replaced.
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query["rcs"] = str(rcs)
+    if rcp is not None:
+        query["rcp"] = str(rcp)
+    # Keep commas and spaces the way GetUserQuery encodes them (%2C, %20)
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def page_size_from_url(url):
+    """
+    Reads the rcp (results per page) parameter from a search URL.
+    """
+    query = dict(parse_qsl(urlsplit(url).query))
+    try:
+        return int(query.get("rcp", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+
+def page_offsets(total_results, page_size, max_pages, first_offset=0):
+    """
+    Computes the result offsets of every page after the first one.
+
+    Args:
+        total_results (int): Total number of results reported by page 1.
+        page_size (int): Results per page.
+        max_pages (int): Maximum number of pages to fetch, including page 1.
+        first_offset (int): Offset of page 1.
+
+    Returns:
+        list: Offsets of pages 2..N, in page order.
+    """
+    total_pages = min(max_pages, math.ceil(max(total_results - first_offset, 0) / page_size))
+    return [first_offset + page * page_size for page in range(1, total_pages)]
+
+
+def fetch_pages_concurrently(fetch_page, offsets, workers=DEFAULT_WORKERS):
+    """
+    Fetches pages through a bounded worker pool and returns them in offset order.
+
+    Args:
+        fetch_page (callable): Takes an offset and returns the list of listings on that page.
+        offsets (list): Offsets to fetch.
+        workers (int): Maximum number of pages fetched at the same time.
+
+    Returns:
+        list: One list of listings per offset, in the same order as offsets.
+            A page that fails is reported and returned as an empty list.
+    """
+    def fetch_safely(offset):
+        try:
+            return fetch_page(offset)
+        except Exception as e:
+            print(f"Error fetching results at offset {offset}: {e}")
+            return []
+
+    if not offsets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(offsets)))) as executor:
+        # executor.map yields results in submission order, whatever order they finish in
+        return list(executor.map(fetch_safely, offsets))
+
+
+def merge_listings(pages):
+    """
+    Merges pages of listings in order, keeping the first occurrence of each Link.
+    """
+    seen_links = set()
+    merged = []
+    for page in pages:
+        for listing in page:
+            link = listing.get("Link")
+            if link in seen_links:
+                continue
+            seen_links.add(link)
+            merged.append(listing)
+    return merged
+
+
+def fetch_results_page(session, search_url, offset, timeout=15, exclusions=None):
+    """
+    Fetches one server-rendered results page at the given rcs offset.
+
+    Returns:
+        tuple: (listings (list), total_results (int or None))
+    """
+    with PipelineMetrics.get_metrics().stage("search_pages").timed():
+        with RateLimiter.throttled():
+            response = session.get(with_result_offset(search_url, offset), timeout=timeout, headers={"Accept": "text/html"})
+            response.raise_for_status()
+        return ListingParser.parse_listings(response.text, exclusions), ListingParser.parse_result_count(response.text)
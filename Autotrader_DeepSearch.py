@@ -1,62 +1,191 @@
+import contextlib
 import csv
+import glob
+import itertools
+import json
+import os
+import pathlib
 import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import RateLimiter
+import DetailParser
+import BrowserPool
+import BrowserFactory
+import DetailFetcher
+import DiskCache
+import ListingParser
+import ListingStore
+import PipelineMetrics
 
+# Details of every enriched listing are kept here between runs
+DETAIL_CACHE_PATH = "detail_cache.sqlite"
+DETAIL_CACHE_TTL_SECONDS = 3 * 24 * 3600
+DETAIL_CACHE_MAX_BYTES = 100 * 1024 * 1024
 
-def extract_details_with_webdriver(driver, url):
+
+# Reads the view model and all three detail sections in a single WebDriver round trip
+EXTRACT_DETAILS_SCRIPT = """
+const texts = selector => Array.from(document.querySelectorAll(selector), element => element.innerText.trim());
+const specifications = [];
+document.querySelectorAll('#sl-card-body .list-item').forEach(item => {
+    const key = item.querySelector('.col-xs-6');
+    const value = item.querySelector('strong');
+    if (key && value) {
+        specifications.push([key.innerText.trim(), value.innerText.trim()]);
+    }
+});
+return JSON.stringify({
+    model: window['ngVdpModel'] || null,
+    highlights: texts('#hl-card-body .list-text'),
+    specifications: specifications,
+    features: texts('#fo-card-body .list-text'),
+});
+"""
+
+# How extract_details_with_webdriver reads a loaded page:
+#   batched     one execute_script call returning everything as JSON
+#   structured  page_source parsed for the embedded vehicle JSON, element-by-element DOM walk without it
+#   dom         element-by-element DOM walk only (two find_element calls per spec item)
+EXTRACTION_MODES = ("batched", "structured", "dom")
+DEFAULT_EXTRACTION_MODE = "batched"
+
+
+def _extract_details_batched(driver):
+    data = json.loads(driver.execute_script(EXTRACT_DETAILS_SCRIPT))
+    details = DetailParser.details_from_view_model(data.get("model"))
+    if details:
+        return details
+    return DetailParser.format_details(data["highlights"], dict(data["specifications"]), data["features"])
+
+
+def _extract_details_from_dom(driver):
+    # Extract highlights
+    highlights = []
+    try:
+        highlight_elements = driver.find_elements(By.CSS_SELECTOR, "#hl-card-body .list-text")
+        highlights = [element.text.strip() for element in highlight_elements]
+    except Exception:
+        pass
+
+    # Extract specifications
+    specifications = {}
+    try:
+        spec_elements = driver.find_elements(By.CSS_SELECTOR, "#sl-card-body .list-item")
+        for element in spec_elements:
+            key = element.find_element(By.CSS_SELECTOR, ".col-xs-6").text.strip()
+            value = element.find_element(By.CSS_SELECTOR, "strong").text.strip()
+            specifications[key] = value
+    except Exception:
+        pass
+
+    # Extract features
+    features = []
+    try:
+        feature_elements = driver.find_elements(By.CSS_SELECTOR, "#fo-card-body .list-text")
+        features = [element.text.strip() for element in feature_elements]
+    except Exception:
+        pass
+
+    return DetailParser.format_details(highlights, specifications, features)
+
+
+def extract_details_with_webdriver(driver, url, mode=DEFAULT_EXTRACTION_MODE):
     """
     Extracts highlights, specifications, and features from a car's detail page using WebDriver.
+
+    In the default batched mode everything is read with a single execute_script
+    call; see EXTRACTION_MODES for the slower, element-by-element alternatives.
     """
     try:
-        driver.get(url)
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.ID, "highlightWidget"))
-        )
+        with RateLimiter.throttled():
+            driver.get(url)
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.ID, "highlightWidget"))
+            )
 
-        # Extract highlights
-        highlights = []
-        try:
-            highlight_elements = driver.find_elements(By.CSS_SELECTOR, "#hl-card-body .list-text")
-            highlights = [element.text.strip() for element in highlight_elements]
-        except Exception:
-            pass
+        if mode == "batched":
+            return _extract_details_batched(driver)
 
-        # Extract specifications
-        specifications = {}
-        try:
-            spec_elements = driver.find_elements(By.CSS_SELECTOR, "#sl-card-body .list-item")
-            for element in spec_elements:
-                key = element.find_element(By.CSS_SELECTOR, ".col-xs-6").text.strip()
-                value = element.find_element(By.CSS_SELECTOR, "strong").text.strip()
-                specifications[key] = value
-        except Exception:
-            pass
-
-        # Extract features
-        features = []
-        try:
-            feature_elements = driver.find_elements(By.CSS_SELECTOR, "#fo-card-body .list-text")
-            features = [element.text.strip() for element in feature_elements]
-        except Exception:
-            pass
-
-        return {
-            "Highlights": "; ".join(highlights),
-            "Specifications": "; ".join([f"{key}: {value}" for key, value in specifications.items()]),
-            "Features": "; ".join(features),
-        }
+        if mode == "structured":
+            # Read everything from the embedded vehicle JSON in one pass when the page has it
+            details = DetailParser.details_from_structured_data(driver.page_source)
+            if details:
+                return details
+
+        return _extract_details_from_dom(driver)
     except Exception as e:
         print(f"Error processing {url}: {e}")
-        return {
-            "Highlights": "N/A",
-            "Specifications": "N/A",
-            "Features": "N/A",
-        }
+        return dict(DetailParser.EMPTY_DETAILS)
+
+
+def count_webdriver_commands(driver, func):
+    """
+    Runs func() and counts the WebDriver commands (HTTP round trips to chromedriver) it issues.
+
+    Returns:
+        tuple: (result of func, dict of command name -> count)
+    """
+    counts = {}
+    original_execute = driver.execute
+
+    def counting_execute(driver_command, params=None):
+        counts[driver_command] = counts.get(driver_command, 0) + 1
+        return original_execute(driver_command, params)
+
+    # Elements route their commands through their parent driver, so they are counted too
+    driver.execute = counting_execute
+    try:
+        result = func()
+    finally:
+        del driver.execute
+    return result, counts
+
+
+def fixture_detail_urls():
+    """
+    Returns file:// URLs of the saved detail pages (fixtures/detail_page*.html), for benchmarking without the site.
+    """
+    pattern = os.path.join(ListingParser.FIXTURES_DIR, "detail_page*.html")
+    return [pathlib.Path(path).as_uri() for path in sorted(glob.glob(pattern))]
+
+
+def benchmark_extraction_modes(urls=None, driver_path=BrowserFactory.CHROMEDRIVER_PATH, modes=EXTRACTION_MODES,
+                               headless=True):
+    """
+    Loads each detail page once per extraction mode and reports the WebDriver commands
+    and time each mode needs per page, checking that they extract the same details.
+    urls defaults to the saved fixture detail pages (fixture_detail_urls), so the
+    command counts can be compared offline; it needs a local Chrome.
+
+    Returns:
+        dict: Mode -> {"commands": average commands per page, "seconds": average seconds per page}
+    """
+    urls = urls or fixture_detail_urls()
+    driver = create_chrome_driver(driver_path, headless)
+    totals = {mode: {"commands": 0, "seconds": 0.0} for mode in modes}
+    try:
+        for url in urls:
+            extracted = {}
+            for mode in modes:
+                start_time = time.perf_counter()
+                details, counts = count_webdriver_commands(
+                    driver, lambda: extract_details_with_webdriver(driver, url, mode))
+                totals[mode]["seconds"] += time.perf_counter() - start_time
+                totals[mode]["commands"] += sum(counts.values())
+                extracted[mode] = details
+                print(f"{mode:>10}: {sum(counts.values()):4d} commands {counts}")
+            if len({tuple(sorted(details.items())) for details in extracted.values()}) > 1:
+                print(f"Extraction modes disagree on {url}")
+    finally:
+        driver.quit()
+
+    results = {}
+    for mode, total in totals.items():
+        results[mode] = {"commands": total["commands"] / len(urls), "seconds": total["seconds"] / len(urls)}
+        print(f"{mode:>10}: {results[mode]['commands']:.1f} commands/page, {results[mode]['seconds']:.2f} s/page")
+    return results
 
 
 def count_rows_in_csv(file_path):
@@ -85,95 +214,274 @@ def convert_seconds_to_hms(seconds):
     Returns:
     - tuple: A tuple containing hours, minutes, and seconds.
     """
-    hours = seconds // 3600
-    minutes = (seconds % 3600) // 60
+    hours = int(seconds // 3600)
+    minutes = int((seconds % 3600) // 60)
     remaining_seconds = seconds % 60
-    print(f"ETA: {hours}h, {minutes}m, {remaining_seconds:.2f}s")
+    return hours, minutes, remaining_seconds
+
+def create_chrome_driver(driver_path, headless=True):
+    """
+    Starts a Chrome WebDriver configured for detail-page scraping (no images, CSS, notifications or ads).
+    """
+    return BrowserFactory.create_driver(driver_path, headless)
+
 
-def update_csv_with_details(input_csv, output_csv, driver_path):
+def fetch_listing_details(driver, link, session=None, stats=None):
+    """
+    Fetches the details of one listing: over plain HTTP first when a session is
+    given, with the browser only used when the details are not in the
+    server-rendered HTML (or the request fails).
+    """
+    if session is not None:
+        try:
+            with PipelineMetrics.get_metrics().stage("detail_http").timed():
+                details = DetailFetcher.fetch_details(session, link)
+            http_error = False
+        except Exception as e:
+            print(f"HTTP fetch failed for {link}, using the browser: {e}")
+            details, http_error = None, True
+        if details:
+            if stats is not None:
+                stats.record_hit()
+            return details
+        if stats is not None:
+            stats.record_fallback(error=http_error)
+    return extract_details_with_webdriver(driver, link)
+
+
+def enrich_row(driver, row, session=None, stats=None, cache=None):
+    """
+    Returns the Highlights/Specifications/Features for one CSV row, read from its Link.
+
+    Details already in the cache (and younger than its TTL) are returned without
+    touching the site; freshly fetched ones are stored in it.
+    """
+    link = row.get("Link")
+    if link and link.startswith("http"):
+        cache_key = DiskCache.normalize_listing_url(link)
+        if cache is not None:
+            details = cache.get(cache_key)
+            if details is not None:
+                print(f"Cached link: {link}")
+                return details
+
+        print(f"Processing link: {link}")
+        details = fetch_listing_details(driver, link, session, stats)
+        if cache is not None and details != DetailParser.EMPTY_DETAILS:
+            cache.set(cache_key, details)
+        return details
+    print(f"Invalid or missing link for row: {row}")
+    return dict(DetailParser.EMPTY_DETAILS)
+
+
+def read_csv_links(file_path):
+    """
+    Yields the Link of each row of a CSV, in order ("" for rows without one).
+    """
+    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            yield row.get('Link', '')
+
+
+class DeepSearchCheckpoint:
+    """
+    Streams enriched rows to a partial output file and journals each finished row,
+    so an interrupted deep search can pick up where it stopped.
+
+    Files next to the output CSV:
+        <output>.partial  enriched rows written so far (header included)
+        <output>.journal  one "<Link>\t<partial file size>" line per finished row
+
+    Rows are written in input order, so the journal is always a prefix of the input;
+    resuming only needs the journal's links, checked against the first input rows.
+    """
+
+    def __init__(self, output_csv, fieldnames):
+        self.output_csv = output_csv
+        self.partial_path = output_csv + ".partial"
+        self.journal_path = output_csv + ".journal"
+        self.fieldnames = fieldnames
+        self.rows_done = 0
+
+    def _partial_header_matches(self):
+        with open(self.partial_path, mode='r', newline='', encoding='utf-8') as partial:
+            return next(csv.reader(partial), None) == list(self.fieldnames)
+
+    def open(self, input_links=None):
+        """
+        Opens the checkpoint files, resuming from an earlier run when they exist.
+
+        Args:
+            input_links (iterable): The Link of each input row, in order. An earlier run
+                is only resumed if it journaled the same links as the first input rows
+                (and wrote the same columns); otherwise its files are discarded, so a
+                changed input, or another query writing the same output path, starts over.
+
+        Returns:
+            int: Number of input rows already enriched by an earlier run.
+        """
+        entries = []
+        if os.path.exists(self.partial_path) and os.path.exists(self.journal_path):
+            with open(self.journal_path, mode='r', encoding='utf-8') as journal:
+                for line in journal:
+                    link, _, offset = line.rstrip("\n").rpartition("\t")
+                    if offset.isdigit():
+                        entries.append((link, int(offset)))
+        if entries and input_links is not None:
+            journaled_links = [link for link, _ in entries]
+            if (journaled_links != list(itertools.islice(input_links, len(entries)))
+                    or not self._partial_header_matches()):
+                print(f"Discarding the deep search checkpoint of {self.output_csv}: it was made from a different input.")
+                entries = []
+        self.rows_done = len(entries)
+        last_link, last_offset = entries[-1] if entries else (None, None)
+
+        if self.rows_done:
+            # Drop anything written after the last journaled row (a crash between the two writes)
+            os.truncate(self.partial_path, last_offset)
+            print(f"Resuming deep search after {self.rows_done} rows (last: {last_link}).")
+            self.outfile = open(self.partial_path, mode='a', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.outfile, fieldnames=self.fieldnames)
+            self.journal = open(self.journal_path, mode='a', encoding='utf-8')
+        else:
+            self.outfile = open(self.partial_path, mode='w', newline='', encoding='utf-8')
+            self.writer = csv.DictWriter(self.outfile, fieldnames=self.fieldnames)
+            self.writer.writeheader()
+            self.outfile.flush()
+            self.journal = open(self.journal_path, mode='w', encoding='utf-8')
+        return self.rows_done
+
+    def write(self, row):
+        """
+        Appends one enriched row and records it in the journal.
+        """
+        self.writer.writerow(row)
+        self.outfile.flush()
+        self.journal.write(f"{row.get('Link', '')}\t{self.outfile.tell()}\n")
+        self.journal.flush()
+        self.rows_done += 1
+
+    def close(self):
+        self.outfile.close()
+        self.journal.close()
+
+    def commit(self):
+        """
+        Moves the finished output into place and removes the journal.
+        """
+        self.close()
+        os.replace(self.partial_path, self.output_csv)
+        os.remove(self.journal_path)
+
+
+def enrich_stream(items, driver_path, workers=BrowserPool.DEFAULT_WORKERS, recycle_after=BrowserPool.DEFAULT_RECYCLE_AFTER, headless=True, http_first=True, cache_path=DETAIL_CACHE_PATH, cache_ttl=DETAIL_CACHE_TTL_SECONDS, total=None, known_details=None):
+    """
+    Fetches the details of every item and yields (item, details) pairs in input order.
+
+    Items (CSV row dicts or Listing records) are read lazily and enriched by a pool
+    of `workers` browsers, each restarted after `recycle_after` pages. With
+    http_first, pages are fetched over plain HTTP and a browser is only started
+    for pages that need one; the first browser needed is the run's warm shared
+    one (see BrowserFactory). Details are cached in cache_path for cache_ttl
+    seconds, so repeat searches only fetch listings they have not seen recently
+    (cache_path=None disables the cache; a DiskCache can be passed instead of a
+    path to share one cache between concurrent streams, and is left open).
+
+    Args:
+        items (iterable): Rows or listings to enrich.
+        total (int): Number of items, for the progress ETA (optional).
+        known_details (callable): Returns details already known for an item (e.g.
+            from the listing store), or None to fetch them (optional).
+
+    Yields:
+        tuple: (item, dict of Highlights/Specifications/Features)
+    """
+    session = DetailFetcher.create_session(pool_size=workers) if http_first else None
+    stats = DetailFetcher.DetailFetchStats()
+    shared_cache = isinstance(cache_path, DiskCache.DiskCache)
+    if shared_cache:
+        cache = cache_path
+    else:
+        cache = DiskCache.DiskCache(cache_path, cache_ttl, DETAIL_CACHE_MAX_BYTES) if cache_path else None
+    metrics = PipelineMetrics.get_metrics().stage("deep_search", total=total)
+
+    def timed_enrich_row(driver, item):
+        row = item if isinstance(item, dict) else {"Link": item.link}
+        start_time = time.perf_counter()
+        details = known_details(item) if known_details is not None else None
+        if details is None:
+            details = enrich_row(driver, row, session, stats, cache)
+        else:
+            PipelineMetrics.get_metrics().add("details_reused", 1)
+        return item, details, time.perf_counter() - start_time
+
+    try:
+        with BrowserPool.BrowserPool(BrowserFactory.pooled_driver_factory(driver_path, headless), workers, recycle_after) as pool:
+            for item, details, elapsed_time in pool.imap(timed_enrich_row, items):
+                metrics.record(elapsed_time, ok=details != DetailParser.EMPTY_DETAILS)
+                print(metrics.progress_line())
+                yield item, details
+                # Optional delay to avoid being flagged by the site
+                #time.sleep(0.5)
+    finally:
+        if session is not None:
+            session.close()
+        stats.report()
+        if cache is not None and not shared_cache:
+            cache.report("Detail cache")
+            cache.close()
+
+
+def update_csv_with_details(input_csv, output_csv, driver_path, workers=BrowserPool.DEFAULT_WORKERS, recycle_after=BrowserPool.DEFAULT_RECYCLE_AFTER, headless=True, http_first=True, cache_path=DETAIL_CACHE_PATH, cache_ttl=DETAIL_CACHE_TTL_SECONDS, store_path=ListingStore.LISTING_STORE_PATH):
     """
     Reads an input CSV, adds additional information from links using WebDriver, and writes to an output CSV.
+
+    Rows are enriched by enrich_stream (see there for the pool, HTTP-first and
+    cache options); the output keeps the input's row order. Rows are streamed:
+    each one is appended to the output as soon as it is done and journaled, so a
+    rerun after a crash resumes where it stopped. Enriched details are also saved
+    to the listing store at store_path (None to skip).
     """
-    chromedriver_path = r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe"
-
-    adblocker_crx_path = r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\CarSearchCA\\CJPALHDLNBPAFIAMEJDNHCPHJBKEIAGM_1_61_2_0.crx"
-
-    # Configure Chrome options
-    chrome_options = Options()
-    chrome_options.add_extension(adblocker_crx_path)
-
-    # Initialize the WebDriver
-    service = Service(chromedriver_path)
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-    service = Service(driver_path)
-    options = webdriver.ChromeOptions()
-    options.add_argument("--disable-webgl")
-    options.add_argument("--disable-gpu")  # Disable GPU for better compatibility
-    options.add_argument("--blink-settings=imagesEnabled=false") 
-    options.add_argument("--log-level=3")  # Fatal-only logs
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])  # Avoid "Controlled by automation" message
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_experimental_option("prefs", {
-        "profile.managed_default_content_settings.images": 2,  # Block images
-        "profile.default_content_setting_values.notifications": 2,  # Block notifications
-        "profile.managed_default_content_settings.stylesheets": 2,  # Block CSS
-    })
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(service=service, options=options)
+    store = ListingStore.ListingStore(store_path) if store_path else None
     totalrows = count_rows_in_csv(input_csv)
     with open(input_csv, mode='r', newline='', encoding='utf-8') as infile:
         reader = csv.DictReader(infile)
-        rows = list(reader)
-
-    # Add new columns
-    fieldnames = reader.fieldnames + ["Highlights", "Specifications", "Features"]
-    updated_rows = []
-    sum_elapsed = []
-    #start_time = time.time()
-    for row in rows:
-        start_time = time.time()
-        link = row.get("Link")
-        if link and link.startswith("http"):
-            print(f"Processing link: {link}")
-            details = extract_details_with_webdriver(driver, link)
-            row.update(details)
-        else:
-            print(f"Invalid or missing link for row: {row}")
-            row.update({"Highlights": "N/A", "Specifications": "N/A", "Features": "N/A"})
-        updated_rows.append(row)
-        time.sleep(0.25)
-        elapsed_time = time.time() - start_time
-        sum_elapsed.append(elapsed_time)
-        avgtime = 0
-        for etime in sum_elapsed:
-            avgtime += etime
-        
-        avgtime /= float(len(sum_elapsed))
-        print(f"Average Time: {avgtime:.4f} seconds")
-        avgtime *= totalrows
-        print(f"Elapsed time: {elapsed_time:.4f} seconds")
-        convert_seconds_to_hms(avgtime)
-        totalrows -= 1
-        # Optional delay to avoid being flagged by the site
-        #time.sleep(0.5)
-
-    # Close the driver
-    driver.quit()
-
-    # Write updated data to output CSV
-    with open(output_csv, mode='w', newline='', encoding='utf-8') as outfile:
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(updated_rows)
-
-
-def deep_search_main(input_csv = "Autotrader_Listings_Filtered.csv"):
+
+        # Add new columns
+        fieldnames = reader.fieldnames + ["Highlights", "Specifications", "Features"]
+        checkpoint = DeepSearchCheckpoint(output_csv, fieldnames)
+        with contextlib.closing(read_csv_links(input_csv)) as input_links:
+            rows_done = checkpoint.open(input_links)
+        pending_rows = itertools.islice(reader, rows_done, None)
+        totalrows -= rows_done
+
+        enriched = enrich_stream(pending_rows, driver_path, workers, recycle_after, headless, http_first,
+                                 cache_path, cache_ttl, total=totalrows)
+        try:
+            with contextlib.closing(enriched):
+                for row, details in enriched:
+                    row.update(details)
+                    checkpoint.write(row)
+                    if store is not None and details != DetailParser.EMPTY_DETAILS and row.get("Link"):
+                        store.save_enrichment(row["Link"], details)
+        except BaseException:
+            checkpoint.close()
+            print(f"Deep search interrupted after {checkpoint.rows_done} rows; rerun to resume.")
+            raise
+        finally:
+            if store is not None:
+                store.close()
+
+    # Only replace the output once every row is enriched (the input may be the same file)
+    checkpoint.commit()
+
+
+def deep_search_main(input_csv = "Autotrader_Listings_Filtered.csv", workers=BrowserPool.DEFAULT_WORKERS):
     output_csv = input_csv# .split(".")[0]+"_DeepSearch.csv"  # Output file name
     driver_path = r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe"
     
     print("Updating CSV with additional details from links using WebDriver...")
-    update_csv_with_details(input_csv, output_csv, driver_path)
+    update_csv_with_details(input_csv, output_csv, driver_path, workers=workers)
     print(f"Updated data saved to {output_csv}")
     return output_csv
 
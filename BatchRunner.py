@@ -0,0 +1,87 @@
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import Autotrader_DeepSearch
+import AutotraderSearchAPI
+import BrowserFactory
+import CarSearchKijijiAutos
+import DiskCache
+import GetUserQuery
+import ListingStore
+import PipelineMetrics
+import ResultPageCache
+
+DEFAULT_QUERY_FILE = "queries.json"
+# Queries run at once; each also runs its own search and deep-search workers
+DEFAULT_CONCURRENCY = 2
+
+
+def run_batch(queries, keyword="null", concurrency=DEFAULT_CONCURRENCY, use_api=True,
+              workers=AutotraderSearchAPI.DEFAULT_WORKERS, store_path=ListingStore.LISTING_STORE_PATH,
+              cache_path=Autotrader_DeepSearch.DETAIL_CACHE_PATH, result_cache_path=ResultPageCache.RESULT_CACHE_PATH,
+              check_newest=False):
+    """
+    Runs many queries in one process, `concurrency` at a time, without prompting.
+
+    Every query goes through CarSearchKijijiAutos.run with one shared listing
+    store, one shared detail cache and one shared results page cache, so a listing
+    found by two queries is only deep-searched once, and a results page two queries
+    share is only fetched once. Browsers come from BrowserFactory, so the warm shared
+    browser and the rate limiter are shared by every query as well.
+
+    Args:
+        queries (list): Dicts from GetUserQuery.read_query_json.
+        keyword (str): Keyword for queries that don't set their own ("null" for none).
+
+    Returns:
+        list: (query name, output CSV path or "" when nothing was found, error or None), in query order.
+    """
+    PipelineMetrics.reset()
+    cache = DiskCache.DiskCache(cache_path, Autotrader_DeepSearch.DETAIL_CACHE_TTL_SECONDS,
+                                Autotrader_DeepSearch.DETAIL_CACHE_MAX_BYTES) if cache_path else None
+    result_cache = ResultPageCache.ResultPageCache(result_cache_path) if result_cache_path else None
+    results = []
+    start_time = time.perf_counter()
+    try:
+        with ListingStore.ListingStore(store_path) as store:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                futures = [
+                    (query["name"], executor.submit(
+                        CarSearchKijijiAutos.run, query["keyword"] or keyword, use_api, workers, store_path,
+                        query["query"], store, cache, result_cache, check_newest, name=query["name"]))
+                    for query in queries
+                ]
+                for name, future in futures:
+                    try:
+                        results.append((name, future.result(), None))
+                    except Exception as e:
+                        print(f"Query '{name}' failed: {e}")
+                        results.append((name, "", e))
+    finally:
+        if cache is not None:
+            cache.report("Detail cache")
+            cache.close()
+        if result_cache is not None:
+            result_cache.report()
+            result_cache.close()
+        BrowserFactory.shutdown()
+
+    print(f"Ran {len(results)} queries in {time.perf_counter() - start_time:.1f}s:")
+    for name, file_path, error in results:
+        print(f"  {name}: {file_path or ('failed' if error else 'no listings')}")
+    return results
+
+
+def run_query_file(file_path=DEFAULT_QUERY_FILE, keyword="null", concurrency=DEFAULT_CONCURRENCY):
+    """
+    Runs every query of a JSON query file (see GetUserQuery.read_query_json) and saves the batch's metrics.
+    """
+    results = run_batch(GetUserQuery.read_query_json(file_path), keyword, concurrency)
+    CarSearchKijijiAutos.dump_run_metrics(file_path)
+    return results
+
+
+if __name__ == "__main__":
+    # python BatchRunner.py [queries.json] [keyword]
+    run_query_file(*sys.argv[1:3])
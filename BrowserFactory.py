@@ -0,0 +1,279 @@
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+
+import PipelineMetrics
+
+CHROMEDRIVER_PATH = r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe"
+
+# Requests matching these patterns are dropped by Chrome itself (Network.setBlockedURLs),
+# which replaces loading the ad-blocking .crx into every browser
+BLOCKED_URL_PATTERNS = [
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*googletagmanager.com*",
+    "*google-analytics.com*",
+    "*adservice.google.*",
+    "*amazon-adsystem.com*",
+    "*facebook.net*",
+    "*scorecardresearch.com*",
+    "*criteo.*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*adsrvr.org*",
+    "*moatads.com*",
+    "*.woff", "*.woff2", "*.ttf",
+    "*.mp4", "*.webm",
+]
+
+
+def build_chrome_options(headless=True, block_images=True, block_css=True):
+    """
+    Builds the Chrome options every stage of the scraper uses.
+
+    Args:
+        headless (bool): Run the browser without a window.
+        block_images (bool): Don't download images.
+        block_css (bool): Don't download stylesheets.
+
+    Returns:
+        ChromeOptions: The configured options.
+    """
+    options = webdriver.ChromeOptions()
+    if headless:
+        options.add_argument("--headless=new")
+    options.add_argument("--disable-webgl")
+    options.add_argument("--disable-gpu")  # Disable GPU for better compatibility
+    if block_images:
+        options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--log-level=3")  # Fatal-only logs
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])  # Avoid "Controlled by automation" message
+    options.add_experimental_option("useAutomationExtension", False)
+    prefs = {"profile.default_content_setting_values.notifications": 2}  # Block notifications
+    if block_images:
+        prefs["profile.managed_default_content_settings.images"] = 2  # Block images
+    if block_css:
+        prefs["profile.managed_default_content_settings.stylesheets"] = 2  # Block CSS
+    options.add_experimental_option("prefs", prefs)
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    return options
+
+
+def block_urls(driver, patterns=BLOCKED_URL_PATTERNS):
+    """
+    Tells the browser to drop requests to ad, tracking and other heavy URLs over CDP.
+
+    Returns:
+        bool: False if the browser does not support it (it keeps working, just unblocked).
+    """
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(patterns)})
+        return True
+    except Exception as e:
+        print(f"Could not enable URL blocking: {e}")
+        return False
+
+
+def create_driver(driver_path=CHROMEDRIVER_PATH, headless=True, block_ads=True):
+    """
+    Starts a new Chrome WebDriver with the shared configuration and records how long it took.
+
+    Args:
+        driver_path (str): Path to chromedriver; when it doesn't exist, Selenium locates one itself.
+        headless (bool): Run the browser without a window.
+        block_ads (bool): Block ad and tracking requests over CDP.
+
+    Returns:
+        WebDriver: The started browser. The caller owns it and must quit it.
+    """
+    start_time = time.perf_counter()
+    service = Service(executable_path=driver_path) if driver_path and os.path.exists(driver_path) else Service()
+    driver = webdriver.Chrome(service=service, options=build_chrome_options(headless))
+    if block_ads:
+        block_urls(driver)
+    elapsed = time.perf_counter() - start_time
+
+    metrics = PipelineMetrics.get_metrics()
+    metrics.stage("browser_startup").record(elapsed)
+    metrics.add("browser_starts")
+    metrics.add("browser_startup_seconds", elapsed)
+    return driver
+
+
+class _SharedDriverLease:
+    """
+    Hands out the shared browser; quit() gives it back for the next stage instead of closing it.
+    discard() closes it for good (a pool recycling it, or after a failure), so the
+    next lease starts a fresh one.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def quit(self):
+        if not self._returned:
+            self._returned = True
+            _release_shared(self._driver)
+
+    def discard(self):
+        if not self._returned:
+            self._returned = True
+            _release_shared(self._driver, discard=True)
+
+
+_config = {"driver_path": CHROMEDRIVER_PATH, "headless": True, "block_ads": True}
+_shared = {"driver": None, "config": None, "in_use": False, "owner": None}
+_lock = threading.Lock()
+
+
+def configure(driver_path=CHROMEDRIVER_PATH, headless=True, block_ads=True):
+    """
+    Sets the browser configuration stages get when they don't ask for a specific one.
+    """
+    _config.update(driver_path=driver_path, headless=headless, block_ads=block_ads)
+
+
+def _resolve_config(driver_path, headless, block_ads):
+    return (
+        _config["driver_path"] if driver_path is None else driver_path,
+        _config["headless"] if headless is None else headless,
+        _config["block_ads"] if block_ads is None else block_ads,
+    )
+
+
+def _is_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+
+def lease_shared_driver(driver_path=None, headless=None, block_ads=None, owner=None):
+    """
+    Returns the shared warm browser (starting it on first use), or None if another
+    stage is using it or it was started with a different configuration.
+
+    The returned driver's quit() hands the browser back instead of closing it.
+    owner identifies the stage leasing it (None: a new stage every time); only a
+    stage taking over a browser another stage warmed up counts as a reuse.
+    """
+    config = _resolve_config(driver_path, headless, block_ads)
+    owner = owner if owner is not None else object()
+    with _lock:
+        if _shared["in_use"]:
+            return None
+        if _shared["driver"] is not None and _shared["config"] != config:
+            return None
+        _shared["in_use"] = True
+        driver = _shared["driver"]
+        reused = driver is not None and _shared["owner"] is not owner
+        _shared["owner"] = owner
+
+    if driver is None:
+        try:
+            driver = create_driver(*config)
+        except Exception:
+            with _lock:
+                _shared["in_use"] = False
+            raise
+        with _lock:
+            _shared["driver"], _shared["config"] = driver, config
+    elif reused:
+        PipelineMetrics.get_metrics().add("browser_reuses")
+    return _SharedDriverLease(driver)
+
+
+def _release_shared(driver, discard=False):
+    # A stage that failed may have left the browser unusable; start fresh next time then
+    if discard or not _is_alive(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with _lock:
+            _shared["driver"], _shared["config"] = None, None
+    with _lock:
+        _shared["in_use"] = False
+
+
+@contextmanager
+def borrow_driver(driver_path=None, headless=None, block_ads=None):
+    """
+    Yields a browser for one stage: the shared warm one when it's free, otherwise a
+    private one that is quit afterwards.
+
+    Usage:
+        with BrowserFactory.borrow_driver() as driver:
+            driver.get(url)
+    """
+    driver = lease_shared_driver(driver_path, headless, block_ads)
+    if driver is None:
+        driver = create_driver(*_resolve_config(driver_path, headless, block_ads))
+    try:
+        yield driver
+    finally:
+        driver.quit()
+
+
+def pooled_driver_factory(driver_path=None, headless=None, block_ads=None):
+    """
+    Returns a create_driver callable for BrowserPool: the first worker to need a browser
+    takes over the shared warm one if it's free, the others start their own. When the
+    pool recycles the shared browser (page count or a failed job) it is quit for good,
+    and the next lease starts a fresh one.
+    """
+    owner = object()  # the pool's workers are one stage: re-leasing the browser among them isn't a reuse
+
+    def create():
+        return lease_shared_driver(driver_path, headless, block_ads, owner) or create_driver(
+            *_resolve_config(driver_path, headless, block_ads))
+    return create
+
+
+def shutdown():
+    """
+    Quits the shared browser. Safe to call more than once; also runs at exit.
+    """
+    with _lock:
+        driver = _shared["driver"]
+        _shared["driver"], _shared["config"], _shared["in_use"], _shared["owner"] = None, None, False, None
+    if driver is not None:
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+
+def report():
+    """
+    Prints how many browsers the run started and the startup time saved by reusing the shared one.
+    """
+    metrics = PipelineMetrics.get_metrics()
+    with metrics.lock:
+        starts = metrics.counters.get("browser_starts", 0)
+        if not starts:
+            return
+        average_startup = metrics.counters.get("browser_startup_seconds", 0.0) / starts
+        reuses = metrics.counters.get("browser_reuses", 0)
+        saved = reuses * average_startup
+        metrics.counters["browser_startup_seconds_saved"] = round(saved, 3)
+    print(
+        f"Browsers: {starts} started ({average_startup:.2f}s each on average), "
+        f"{reuses} stages reused the warm browser, saving about {saved:.1f}s of startup"
+    )
+
+
+atexit.register(shutdown)
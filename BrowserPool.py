@@ -0,0 +1,203 @@
+import os
+import queue
+import threading
+
+# Each Chrome instance wants roughly a core of its own while rendering a page
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+# Browsers are restarted after this many pages to keep their memory growth in check
+DEFAULT_RECYCLE_AFTER = 50
+
+_STOP = object()
+
+
+class _LazyDriver:
+    """
+    Stands in for a WebDriver and only starts the browser the first time it is used,
+    so jobs that end up not needing a browser never pay for one.
+    """
+
+    def __init__(self, create_driver):
+        self._create_driver = create_driver
+        self._driver = None
+
+    @property
+    def started(self):
+        return self._driver is not None
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            self._driver = self._create_driver()
+        return getattr(self._driver, name)
+
+    def quit(self, discard=False):
+        """
+        Quits the browser. A leased browser (see BrowserFactory) is handed back on a
+        plain quit; discard=True closes it for good, so the next job gets a fresh one.
+        """
+        if self._driver is not None:
+            close = getattr(self._driver, "discard", None) if discard else None
+            (close or self._driver.quit)()
+            self._driver = None
+
+
+class BrowserPool:
+    """
+    A pool of pre-configured WebDriver workers fed from a work queue.
+
+    Every worker thread owns one browser, created with create_driver() the first
+    time one of its jobs uses it. A browser is quit and replaced after
+    recycle_after pages, or as soon as a job using it fails. imap() hands out the results in the same order as the input, whatever
+    order the workers finish in.
+
+    Usage:
+        with BrowserPool(create_driver, workers=4) as pool:
+            for details in pool.imap(extract_details_with_webdriver, links):
+                ...
+    """
+
+    def __init__(self, create_driver, workers=DEFAULT_WORKERS, recycle_after=DEFAULT_RECYCLE_AFTER):
+        self.create_driver = create_driver
+        self.workers = max(1, workers)
+        self.recycle_after = recycle_after
+        self.jobs = queue.Queue()
+        self.threads = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _start(self):
+        if self.threads:
+            return
+        for worker_id in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"browser-worker-{worker_id}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _quit(self, driver, discard=False):
+        try:
+            driver.quit(discard=discard)
+        except Exception as e:
+            print(f"Error closing browser: {e}")
+
+    def _work(self):
+        driver = _LazyDriver(self.create_driver)
+        pages_served = 0
+        try:
+            while True:
+                job = self.jobs.get()
+                if job is _STOP:
+                    break
+                func, index, item, deliver, cancelled = job
+                if cancelled.is_set():
+                    deliver(index, None, None)
+                    continue
+
+                try:
+                    result, error = func(driver, item), None
+                    if driver.started:
+                        pages_served += 1
+                except Exception as e:
+                    result, error = None, e
+                    # A failed job may have left the browser in a bad state, start fresh
+                    if driver.started:
+                        self._quit(driver, discard=True)
+                        pages_served = 0
+
+                if self.recycle_after and pages_served >= self.recycle_after:
+                    self._quit(driver, discard=True)
+                    pages_served = 0
+                deliver(index, result, error)
+        finally:
+            self._quit(driver)
+
+    def imap(self, func, items, window=None):
+        """
+        Runs func(driver, item) for every item on the pool and yields the results in input order.
+
+        Args:
+            func (callable): Takes a WebDriver and an item, returns a result.
+            items (iterable): Items to process; read lazily.
+            window (int): Maximum number of items queued, running or waiting to be
+                yielded at once (defaults to 4 per worker), which keeps memory
+                constant however many items there are.
+
+        Yields:
+            The result of func for each item, in the order of items. If func raised,
+            the exception is re-raised here; if reading items raised, that exception
+            is re-raised after the results of the items read before it.
+        """
+        self._start()
+        window = window or self.workers * 4
+        slots = threading.Semaphore(window)
+        results = {}
+        results_ready = threading.Condition()
+        feeding_done = threading.Event()
+        cancelled = threading.Event()
+        fed_count = [0]
+        feed_error = []
+
+        def deliver(index, result, error):
+            with results_ready:
+                results[index] = (result, error)
+                results_ready.notify_all()
+
+        def feed():
+            try:
+                for index, item in enumerate(items):
+                    slots.acquire()
+                    if cancelled.is_set():
+                        break
+                    self.jobs.put((func, index, item, deliver, cancelled))
+                    fed_count[0] = index + 1
+            except Exception as e:
+                # Reading the items failed (e.g. an upstream stage): re-raised by the consumer
+                # after the last fed result, so a truncated run never looks complete
+                feed_error.append(e)
+            finally:
+                feeding_done.set()
+                with results_ready:
+                    results_ready.notify_all()
+
+        feeder = threading.Thread(target=feed, name="browser-pool-feeder", daemon=True)
+        feeder.start()
+
+        next_index = 0
+        try:
+            while True:
+                with results_ready:
+                    while next_index not in results and not (feeding_done.is_set() and next_index >= fed_count[0]):
+                        results_ready.wait()
+                    if next_index not in results:
+                        if feed_error:
+                            raise feed_error[0]
+                        break
+                    result, error = results.pop(next_index)
+                slots.release()
+                next_index += 1
+                if error is not None:
+                    raise error
+                yield result
+        finally:
+            if next_index < fed_count[0] or not feeding_done.is_set():
+                # The caller stopped early: let queued jobs drain without loading more pages
+                cancelled.set()
+                slots.release()
+
+    def map(self, func, items):
+        """
+        Like imap, but returns all results as a list.
+        """
+        return list(self.imap(func, items))
+
+    def shutdown(self):
+        """
+        Stops every worker and quits its browser. Safe to call more than once.
+        """
+        for _ in self.threads:
+            self.jobs.put(_STOP)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
@@ -1,29 +1,29 @@
 import csv
+import time
+import FeatureVocabulary
 import KeywordCleanup
+import PipelineMetrics
 
 
 def remove_duplicates_from_row(row):
     """
     Removes duplicates within a single row. If an item appears in one column, it will not appear in others.
+
+    Items are interned to IDs, so the cross-column check is a bitset test instead
+    of string comparisons. The row gets its own vocabulary: titles and links are
+    unique per listing and would only bloat the shared one.
+    """
+    vocabulary = FeatureVocabulary.FeatureVocabulary()
+    columns = FeatureVocabulary.dedup_ids([vocabulary.encode_text(col) for col in row])
+    return ["; ".join(vocabulary.decode(feature_ids)) for feature_ids in columns]
+
+
+def clean_listing_features(listing):
+    """
+    Drops features already listed as highlights (and repeats), working on the listing's IDs directly.
     """
-    # Gather all unique values from all columns
-    unique_values = set()
-    for col in row:
-        if col:
-            unique_values.update(col.split("; "))
-
-    # Remove duplicates from each column
-    seen_values = set()
-    cleaned_row = []
-    for col in row:
-        if col:
-            items = col.split("; ")
-            filtered_items = [item for item in items if item not in seen_values]
-            seen_values.update(filtered_items)
-            cleaned_row.append("; ".join(filtered_items))
-        else:
-            cleaned_row.append("")
-    return cleaned_row
+    listing.highlight_ids, listing.feature_ids = FeatureVocabulary.dedup_ids([listing.highlight_ids, listing.feature_ids])
+    return listing
 
 
 def clean_csv(input_file, output_file):
@@ -37,10 +37,13 @@ def clean_csv(input_file, output_file):
         rows = list(reader)
 
     cleaned_rows = [headers]  # Start with headers
+    metrics = PipelineMetrics.get_metrics().stage("cleanup", total=len(rows))
 
     for row in rows:
+        start_time = time.perf_counter()
         cleaned_row = remove_duplicates_from_row(row)
         cleaned_rows.append(cleaned_row)
+        metrics.record(time.perf_counter() - start_time)
 
     with open(output_file, mode="w", newline="", encoding="utf-8") as outfile:
         writer = csv.writer(outfile)
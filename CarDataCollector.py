@@ -1,11 +1,12 @@
-from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 
 from bs4 import BeautifulSoup
 import time
+import RateLimiter
+import BrowserFactory
 
 def get_makes_from_autotrader():
     """
@@ -17,50 +18,24 @@ def get_makes_from_autotrader():
     Returns:
         list: A list of car makes available on AutoTrader.ca.
     """
-    # Setup Chrome WebDriver options
-    options = Options()
-    # if headless:
-    #options.add_argument("--headless")  # Run browser in headless mode
-    #options.add_argument("--enable-unsafe-webgpu")
-    options.add_argument("--disable-webgl")
-    options.add_argument("--disable-gpu")  # Disable GPU for better compatibility
-    options.add_argument("--blink-settings=imagesEnabled=false") 
-    options.add_argument("--log-level=3")  # Fatal-only logs
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])  # Avoid "Controlled by automation" message
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_experimental_option("prefs", {
-        "profile.managed_default_content_settings.images": 2,  # Block images
-        "profile.default_content_setting_values.notifications": 2,  # Block notifications
-        "profile.managed_default_content_settings.stylesheets": 2,  # Block CSS
-    })
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-
-    # Initialize WebDriver
-    service = Service(
-        executable_path=r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe",
-        service_args=["--log-path=chromedriver.log"]
-    )
-    driver = webdriver.Chrome(service=service, options=options)
-
-    try:
-        # Open AutoTrader.ca
-        driver.get("https://www.autotrader.ca")
-        time.sleep(3)  # Wait for the page to load
-
-        # Locate the rfMakes dropdown and fetch all makes
-        makes_dropdown = driver.find_element(By.ID, "rfMakes")
-        makes_options = makes_dropdown.find_elements(By.TAG_NAME, "option")
-        makes = [option.text.strip() for option in makes_options if option.text.strip()]
-        return makes
-
-    except Exception as e:
-        print(f"An error occurred while fetching makes: {e}")
-        return []
-
-    finally:
-        # Close the WebDriver
-        driver.quit()
+    # Reuse the run's warm browser instead of starting a new one
+    with BrowserFactory.borrow_driver() as driver:
+        try:
+            # Open AutoTrader.ca and wait for the makes dropdown to render
+            with RateLimiter.throttled():
+                driver.get("https://www.autotrader.ca")
+                makes_dropdown = WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.ID, "rfMakes"))
+                )
+
+            # Fetch all makes from the rfMakes dropdown
+            makes_options = makes_dropdown.find_elements(By.TAG_NAME, "option")
+            makes = [option.text.strip() for option in makes_options if option.text.strip()]
+            return makes
+
+        except Exception as e:
+            print(f"An error occurred while fetching makes: {e}")
+            return []
 
 def get_models_from_autotrader(manufacturer, headless=True):
     """
@@ -73,56 +48,47 @@ def get_models_from_autotrader(manufacturer, headless=True):
     Returns:
         list: A list of car models available for the given manufacturer.
     """
-    # Setup Chrome WebDriver options
-    options = Options()
-    if headless:
-        options.add_argument("--headless")  # Run browser in headless mode
-    options.add_argument("--disable-gpu")  # Disable GPU for better compatibility
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-
-    # Initialize WebDriver
-    service = Service(executable_path=r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe")
-    options = webdriver.ChromeOptions()
-    driver = webdriver.Chrome(service=service, options=options)
-
-    try:
-         # Open AutoTrader.ca
-        driver.get("https://www.autotrader.ca")
-        time.sleep(3)  # Wait for the page to load
-
-        # Select the manufacturer from the dropdown
-        makes_dropdown = driver.find_element(By.ID, "rfMakes")
-        makes_options = makes_dropdown.find_elements(By.TAG_NAME, "option")
+    # Reuse the run's warm browser instead of starting a new one
+    with BrowserFactory.borrow_driver(headless=headless) as driver:
+        try:
+            # Open AutoTrader.ca and wait for the makes dropdown to render
+            with RateLimiter.throttled():
+                driver.get("https://www.autotrader.ca")
+                makes_dropdown = WebDriverWait(driver, 15).until(
+                    EC.presence_of_element_located((By.ID, "rfMakes"))
+                )
+
+            # Select the manufacturer from the dropdown
+            makes_options = makes_dropdown.find_elements(By.TAG_NAME, "option")
         
-        # Find the manufacturer option
-        manufacturer_value = None
-        for option in makes_options:
-            if option.text.strip().lower() == manufacturer.lower():
-                manufacturer_value = option.get_attribute("value")
-                break
-
-        if not manufacturer_value:
-            print(f"Manufacturer '{manufacturer}' not found in the dropdown.")
-            return []
-
-        makes_dropdown.send_keys(manufacturer_value)
-        time.sleep(2)
-
-        # Fetch the list of models from the updated dropdown
-        models_dropdown = driver.find_element(By.ID, "rfModel")  # Adjust this ID based on AutoTrader's page
-        models_options = models_dropdown.find_elements(By.TAG_NAME, "option")
+            # Find the manufacturer option
+            manufacturer_value = None
+            for option in makes_options:
+                if option.text.strip().lower() == manufacturer.lower():
+                    manufacturer_value = option.get_attribute("value")
+                    break
+
+            if not manufacturer_value:
+                print(f"Manufacturer '{manufacturer}' not found in the dropdown.")
+                return []
+
+            makes_dropdown.send_keys(manufacturer_value)
+
+            # Wait until the models dropdown is filled in for the selected make
+            models_dropdown = WebDriverWait(driver, 15).until(
+                EC.presence_of_element_located((By.ID, "rfModel"))  # Adjust this ID based on AutoTrader's page
+            )
+            WebDriverWait(driver, 15).until(
+                lambda d: len(models_dropdown.find_elements(By.TAG_NAME, "option")) > 1
+            )
+            models_options = models_dropdown.find_elements(By.TAG_NAME, "option")
         
-        # Extract and return model names
-        models = [option.text.strip() for option in models_options if option.text.strip()]
-        return models
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return []
-
-    finally:
-        # Close the WebDriver
-        driver.quit()
+            # Extract and return model names
+            models = [option.text.strip() for option in models_options if option.text.strip()]
+            return models
+        except Exception as e:
+            print(f"An error occurred: {e}")
+            return []
 
 # # Example usage
 # if __name__ == "__main__":
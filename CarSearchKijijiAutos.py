@@ -1,131 +1,121 @@
 ##from io import FileIO
-import os, shutil
-import requests
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+import contextlib
+import os, re, shutil, threading
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from datetime import datetime
 import time
 import csv
-import KeywordCleanup, CSVCleanup, Autotrader_DeepSearch,ShowCars,GetUserQuery
+import Autotrader_DeepSearch,ShowCars,GetUserQuery
+import ListingParser, AutotraderSearchAPI, RateLimiter, PipelineMetrics, BrowserFactory, Listing, ListingDelta, ListingStore, Pipeline, ShardPlanner, ResultPageCache
 
 def fetch_listings_from_page(driver, exclusions):
     """
     Extracts all listings from the current page and filters out those containing exclusion keywords.
     """
-    page_source = driver.page_source
-    soup = BeautifulSoup(page_source, 'html.parser')
-
-    listings = []
-    listing_wrappers = soup.find_all('div', class_='dealer-split-wrapper')
-
-    for wrapper in listing_wrappers:
-        try:
-            # Extract listing link
-            link_element = wrapper.find('a', class_='inner-link')
-            link = "https://www.autotrader.ca" + link_element['href'] if link_element else "N/A"
-
-            # Extract title
-            title_element = wrapper.find('span', class_='title-with-trim')
-            title = title_element.text.strip() if title_element else "N/A"
-
-            # Skip listings with excluded keywords
-            # if any(keyword.lower() in title.lower() for keyword in exclusions):
-            #     continue
-
-            # Extract price
-            price_element = wrapper.find('span', class_='price-amount')
-            price = price_element.text.strip() if price_element else "N/A"
-
-            # Extract location
-            location_element = wrapper.find('span', class_='proximity-text')
-            location = location_element.text.strip() if location_element else "N/A"
-
-            # Extract mileage
-            mileage_element = wrapper.find('span', class_='odometer-proximity')
-            mileage = mileage_element.text.strip() if mileage_element else "N/A"
-
-            listings.append({
-                'Title': title,
-                'Price': price,
-                'Location': location,
-                'Mileage': mileage,
-                'Link': link,
-            })
-        except Exception as e:
-            print(f"Error parsing listing: {e}")
-
-    return listings
+    return ListingParser.parse_listings(driver.page_source, exclusions)
 
 
 def scrape_autotrader_listings(url, exclusions, max_pages=9999):
     """
     Scrapes up to max_pages listings from Autotrader while filtering out excluded keywords.
     """
-    service = Service(executable_path=r"C:\\Users\\togoo\\Desktop\\Self Improvement\\Coding Projects\\CarSearchCA\\chromedriver-win64\\chromedriver.exe")
-    options = webdriver.ChromeOptions()
-    options.add_argument("--disable-webgl")
-    options.add_argument("--disable-gpu")  # Disable GPU for better compatibility
-    options.add_argument("--blink-settings=imagesEnabled=false") 
-    options.add_argument("--log-level=3")  # Fatal-only logs
-    options.add_experimental_option("excludeSwitches", ["enable-automation"])  # Avoid "Controlled by automation" message
-    options.add_experimental_option("useAutomationExtension", False)
-    options.add_experimental_option("prefs", {
-        "profile.managed_default_content_settings.images": 2,  # Block images
-        "profile.default_content_setting_values.notifications": 2,  # Block notifications
-        "profile.managed_default_content_settings.stylesheets": 2,  # Block CSS
-    })
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(service=service, options=options)
-
-    driver.get(url)
-    all_listings = []
-    current_page = 1
-
-    while current_page <= max_pages:
-        print(f"Scraping page {current_page}...")
-
-        # Extract and filter listings from the current page
-        listings = fetch_listings_from_page(driver, exclusions)
-        all_listings.extend(listings)
-
-        # Check if there's a next page and navigate to it
-        try:
-            next_page_button = WebDriverWait(driver, 3).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, f'.page-item[data-page="{current_page + 1}"] a'))
-            )
-            next_page_button.click()
-            current_page += 1
-            time.sleep(6)  # Wait for the next page to load
-        except Exception as e:
-            print("No more pages found or error occurred:", e)
-            break
+    # The warm browser from earlier stages (make/model lookup) is reused when it's free
+    with BrowserFactory.borrow_driver() as driver:
+        with RateLimiter.throttled():
+            driver.get(url)
+        all_listings = []
+        current_page = 1
+        page_metrics = PipelineMetrics.get_metrics().stage("search_pages")
+        page_start = time.perf_counter()
+
+        while current_page <= max_pages:
+            print(f"Scraping page {current_page}...")
+
+            # Extract and filter listings from the current page
+            listings = fetch_listings_from_page(driver, exclusions)
+            all_listings.extend(listings)
+
+            # Check if there's a next page and navigate to it
+            try:
+                next_page_button = WebDriverWait(driver, 3).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, f'.page-item[data-page="{current_page + 1}"] a'))
+                )
+            except Exception as e:
+                print("No more pages found or error occurred:", e)
+                page_metrics.record(time.perf_counter() - page_start)
+                break
+
+            try:
+                # Wait until the old results are replaced instead of sleeping a fixed time
+                old_listing = driver.find_element(By.CSS_SELECTOR, ".dealer-split-wrapper")
+                with RateLimiter.throttled():
+                    next_page_button.click()
+                    WebDriverWait(driver, 20).until(EC.staleness_of(old_listing))
+                    WebDriverWait(driver, 20).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, ".dealer-split-wrapper"))
+                    )
+                current_page += 1
+            except Exception as e:
+                print("Next page did not load:", e)
+                page_metrics.record(time.perf_counter() - page_start, ok=False, timeout=PipelineMetrics.is_timeout(e))
+                break
+            page_metrics.record(time.perf_counter() - page_start)
+            page_start = time.perf_counter()
 
-    driver.quit()
     return all_listings
 
 
 def save_to_csv(listings, file_name, filedir = "null"):
     """
-    Saves listings to a CSV file with the specified file name.
+    Saves listings (Listing records or scraped dicts) to a CSV file with the specified file name.
     """
-    fieldnames = ['Title', 'Price', 'Location', 'Mileage', 'Link']
+    fieldnames = Listing.LISTING_COLUMNS
     with open(file_name, mode='w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
         writer.writeheader()
         for listing in listings:
-            writer.writerow(listing)
+            writer.writerow(listing.to_row() if isinstance(listing, Listing.Listing) else listing)
     
     if filedir != "null":
         shutil.move(file_name,filedir)
 
 
-def main():
-    search_url,max_pages,exclusions,filters = GetUserQuery.main()
+def _open_store(store, store_path):
+    # A store shared by the caller (batch runs) stays open; otherwise one is opened for the call
+    if store is not None:
+        return contextlib.nullcontext(store)
+    return ListingStore.ListingStore(store_path)
+
+
+def _open_result_cache(result_cache):
+    # Like _open_store: a shared ResultPageCache stays open, a path is opened for the call, None disables caching
+    if result_cache is None or isinstance(result_cache, ResultPageCache.ResultPageCache):
+        return contextlib.nullcontext(result_cache)
+    return ResultPageCache.ResultPageCache(result_cache)
+
+
+def search(use_api=True, workers=AutotraderSearchAPI.DEFAULT_WORKERS, store_path=ListingStore.LISTING_STORE_PATH,
+           query=None, store=None, result_cache=ResultPageCache.RESULT_CACHE_PATH, check_newest=False):
+    """
+    Asks for the query (unless one is given), runs the search and records the listings in the listing store.
+
+    Args:
+        query (tuple): (search URL, max_pages, exclusions, filters) as GetUserQuery.main or
+            GetUserQuery.read_query_json builds them; None to ask interactively.
+        store (ListingStore): An open store to record into instead of opening store_path.
+        result_cache: Path of the results page cache, a shared ResultPageCache, or None to
+            always fetch. Used by the concurrent (workers > 1) search paths.
+        check_newest (bool): Reuse cached pages only while the search's newest listings are
+            unchanged (see ResultPageCache), instead of only while they are fresh.
+
+    Returns:
+        tuple: (list of Listing, the query filters, with the exclusions under "exclusions",
+            the ListingDelta against the last run of the same query, or None without a store)
+    """
+    search_url,max_pages,exclusions,filters = query if query is not None else GetUserQuery.main()
+    filters = dict(filters, exclusions=exclusions)
 
     #modified_url = f"https://www.autotrader.ca/cars/{make}/{model}/?rcp=15&rcs=0&srt=35&pRng={price_min}%2C{price_max}&prx={max_distance}&loc=Kanata%2C%20ON&hprc=True&wcp=True&sts=New-Used&inMarket=advancedSearch"
 
@@ -133,32 +123,152 @@ def main():
 
     # print("Search URL: ",search_url)
     # print("Exclusion Keywords: ",exclusions)
-    listings = scrape_autotrader_listings(search_url, exclusions, max_pages=max_pages)
+    listings = []
+    if use_api:
+        try:
+            if workers > 1:
+                # Large searches are split into year/price/mileage shards fetched in parallel (see ShardPlanner)
+                with AutotraderSearchAPI.create_session(pool_size=workers) as session, \
+                        _open_result_cache(result_cache) as page_cache:
+                    fetch_page, page_size = ShardPlanner.api_page_fetcher(
+                        session, exclusions=exclusions, cache=page_cache, check_newest=check_newest)
+                    listings = ShardPlanner.search_sharded(filters, fetch_page, page_size, max_pages, workers)
+                    if page_cache is not None:
+                        page_cache.report()
+            else:
+                payload = AutotraderSearchAPI.build_search_payload(filters)
+                listings = AutotraderSearchAPI.search_listings(payload, max_pages=max_pages, exclusions=exclusions)
+        except Exception as e:
+            print(f"Search API failed, falling back to results pages: {e}")
+    if not listings and workers > 1:
+        try:
+            with AutotraderSearchAPI.create_session(pool_size=workers) as session, \
+                    _open_result_cache(result_cache) as page_cache:
+                fetch_page, page_size = ShardPlanner.results_page_fetcher(
+                    session, search_url, exclusions, cache=page_cache, check_newest=check_newest)
+                listings = ShardPlanner.search_sharded(filters, fetch_page, page_size, max_pages, workers)
+                if page_cache is not None:
+                    page_cache.report()
+        except Exception as e:
+            print(f"Fetching results pages failed, falling back to the browser: {e}")
+    if not listings:
+        listings = scrape_autotrader_listings(search_url, exclusions, max_pages=max_pages)
+    # Parse prices, mileages and the rest once, here, instead of in every later stage
+    listings = [Listing.Listing.from_row(listing) for listing in listings]
+    delta = None
+    if listings and (store is not None or store_path):
+        with _open_store(store, store_path) as run_store:
+            delta, run_id = ListingDelta.record_run(run_store, filters, listings)
+            print(f"Stored {len(listings)} listings as run {run_id} ({run_store.count()} listings in {run_store.path}).")
+        delta.report()
+    return listings, filters, delta
+
+
+_reserved_paths = set()
+_reserved_paths_lock = threading.Lock()
+
+
+def output_csv_path(filters, name=None):
+    """
+    Returns a timestamped CSV path for a query, in its Make_Model folder (created if needed).
+
+    The query's name (batch queries have one) goes into the file name. A path already
+    handed out in this process, or already on disk, gets a _2, _3... suffix, so
+    queries of a batch with the same filters started in the same second don't
+    write over each other's CSV, .partial and _delta.csv files.
+    """
     datestr = datetime.now().strftime(f"%Y-%m-%d_%H-%M-%S")
-    if listings:
-        print(f"Found {len(listings)} listings. Saving to CSV...")
-        folder_name = f"{filters['make']}_{filters['model']}"
-        folder_path = str(os.path.join(os.getcwd(), folder_name))
-        file_name = f"{filters['price_min']}-{filters['price_max']}_{filters['min_mileage']}-{filters['max_mileage']}_{filters['min_year']}-{filters['max_year']}_{datestr}.csv"
-        # Step 2: Check if the folder exists
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
-            print(f"Folder '{folder_name}' created at: {folder_path}")
-        else:
-            print(f"Folder '{folder_name}' already exists. Files will be added to it.")
-        
-        #TODO: Individual folders for each car, and reduce redundant CSV files. 
-        save_to_csv(listings, file_name,folder_path)
-        print(f"Listings saved to {file_name}.")
-        return folder_path +"\\" + file_name
+    folder_name = f"{filters['make']}_{filters['model']}"
+    folder_path = str(os.path.join(os.getcwd(), folder_name))
+    file_name = f"{filters['price_min']}-{filters['price_max']}_{filters['min_mileage']}-{filters['max_mileage']}_{filters['min_year']}-{filters['max_year']}_{datestr}"
+    if name:
+        file_name = re.sub(r"[^A-Za-z0-9-]+", "_", name).strip("_") + "_" + file_name
+    # Check if the folder exists
+    if not os.path.exists(folder_path):
+        os.makedirs(folder_path, exist_ok=True)  # another query of a batch may create it first
+        print(f"Folder '{folder_name}' created at: {folder_path}")
     else:
+        print(f"Folder '{folder_name}' already exists. Files will be added to it.")
+    #TODO: Individual folders for each car. The listing store keeps every run, so the CSV is only an export.
+    with _reserved_paths_lock:
+        file_path = os.path.join(folder_path, file_name + ".csv")
+        suffix = 1
+        while file_path in _reserved_paths or os.path.exists(file_path):
+            suffix += 1
+            file_path = os.path.join(folder_path, f"{file_name}_{suffix}.csv")
+        _reserved_paths.add(file_path)
+    return file_path
+
+
+def main(use_api=True, workers=AutotraderSearchAPI.DEFAULT_WORKERS, store_path=ListingStore.LISTING_STORE_PATH, export_csv=True):
+    """
+    Runs the search, records the listings in the listing store and (with export_csv)
+    saves them to a CSV in a Make_Model folder.
+
+    Returns:
+        str: Path of the exported CSV, or "" when nothing was found or exported.
+    """
+    listings, filters, delta = search(use_api, workers, store_path)
+    if not listings:
         print("No listings found.")
         return ""
+    if not export_csv:
+        return ""
+    print(f"Found {len(listings)} listings. Saving to CSV...")
+    file_path = output_csv_path(filters)
+    save_to_csv(listings, file_path)
+    print(f"Listings saved to {file_path}.")
+    return file_path
+
+
+def run(keyword="null", use_api=True, workers=AutotraderSearchAPI.DEFAULT_WORKERS, store_path=ListingStore.LISTING_STORE_PATH,
+        query=None, store=None, cache_path=Autotrader_DeepSearch.DETAIL_CACHE_PATH,
+        result_cache=ResultPageCache.RESULT_CACHE_PATH, check_newest=False, name=None):
+    """
+    Searches, then streams the listings through dedup, deep search, cleanup and the
+    keyword filter into one CSV (see Pipeline.run_pipeline).
+
+    query, store, result_cache and check_newest are passed to search; cache_path
+    (a path or a shared DiskCache) is the deep search's detail cache. name (a batch
+    query's name) goes into the output file name.
+
+    Returns:
+        str: Path of the output CSV, or "" when nothing was found.
+    """
+    listings, filters, delta = search(use_api, workers, store_path, query, store, result_cache, check_newest)
+    if not listings:
+        print("No listings found.")
+        return ""
+    file_path = output_csv_path(filters, name)
+    if delta is not None:
+        delta_path = os.path.splitext(file_path)[0] + "_delta.csv"
+        delta.write_report(delta_path)
+        print(f"Delta report saved to {delta_path}")
+    if store is not None or store_path:
+        with _open_store(store, store_path) as run_store:
+            return Pipeline.run_pipeline(listings, file_path, keyword, run_store, exclusions=filters['exclusions'],
+                                         delta=delta, cache_path=cache_path)
+    return Pipeline.run_pipeline(listings, file_path, keyword, exclusions=filters['exclusions'], cache_path=cache_path)
+
+
+def dump_run_metrics(filename):
+    """
+    Prints the run's per-stage metrics and saves them next to the output CSV
+    (or in the working directory when there is no output).
+    """
+    BrowserFactory.report()
+    metrics = PipelineMetrics.get_metrics()
+    metrics.report()
+    base_name = os.path.splitext(filename)[0] if filename else "pipeline"
+    metrics.dump(base_name + "_metrics.json", base_name + "_metrics.csv")
+    print(f"Run metrics saved to {base_name}_metrics.json and {base_name}_metrics.csv")
+
 
 if __name__ == "__main__":
     keyword = "sport"#str(input("Enter Keyword: "))
-    filename = main()
-    filename = CSVCleanup.csvmain(filename)
-    filename = Autotrader_DeepSearch.deep_search_main(filename)
-    filename = KeywordCleanup.keycleanup(keyword,filename)
-    ShowCars.showcarsmain(filename)
+    PipelineMetrics.reset()
+    filename = run(keyword)
+    BrowserFactory.shutdown()
+    dump_run_metrics(filename)
+    if filename:
+        ShowCars.showcarsmain(filename)
@@ -0,0 +1,203 @@
+import time
+
+import numpy as np
+
+import Listing
+
+# Columns the scores are written to
+SCORE_COLUMNS = ["DealScore", "ExpectedPrice"]
+
+# Ridge penalty on the year and mileage slopes, so a make/model with a handful of
+# listings falls back towards its mean price instead of an unstable fit
+RIDGE_PENALTY = 1.0
+# A trim's price offset is its mean residual shrunk by count / (count + this)
+TRIM_SHRINKAGE = 2.0
+# Mileage is fitted in units of this many km
+MILEAGE_UNIT_KM = 10000.0
+
+
+def _group_codes(keys):
+    """
+    Returns integer codes (first-seen order) for a sequence of hashable keys, and the number of codes.
+    """
+    codes = {}
+    array = np.fromiter((codes.setdefault(key, len(codes)) for key in keys), dtype=np.int64)
+    return array, len(codes)
+
+
+def _fill_missing(values, groups, group_count):
+    # Missing values get their group's mean, or the overall mean for a group with none known
+    known = ~np.isnan(values)
+    if known.all():
+        return values
+    if not known.any():
+        return np.zeros_like(values)
+    counts = np.bincount(groups[known], minlength=group_count)
+    sums = np.bincount(groups[known], weights=values[known], minlength=group_count)
+    means = np.where(counts > 0, sums / np.maximum(counts, 1), values[known].mean())
+    return np.where(known, values, means[groups])
+
+
+def score_arrays(prices, years, mileages, groups, trims, ridge=RIDGE_PENALTY, trim_shrinkage=TRIM_SHRINKAGE):
+    """
+    Fits price against year and mileage per make/model, plus a per-trim offset, and
+    scores each listing by how far below its expected price it is asking.
+
+    Every make/model is fitted at once: the per-group normal equations are summed
+    with bincount and solved as one batch of 3x3 systems, so there is no loop over
+    listings or groups.
+
+    Args:
+        prices, years, mileages (ndarray): Floats, NaN where unknown. Listings without
+            a price get no score; a missing year or mileage is filled with the group mean.
+        groups (ndarray): Make/model code of each listing (0..G-1).
+        trims (ndarray): Trim code of each listing (codes may be shared across groups).
+
+    Returns:
+        tuple: (expected price, deal score) arrays. The score is the residual
+            (expected - asking) in standard deviations of the group's residuals, so
+            positive is cheaper than comparable listings; NaN without a price.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+    trims = np.asarray(trims, dtype=np.int64)
+    group_count = int(groups.max()) + 1 if len(groups) else 0
+    priced = ~np.isnan(prices)
+    weights = priced.astype(np.float64)
+    targets = np.where(priced, prices, 0.0)
+
+    years = _fill_missing(np.asarray(years, dtype=np.float64), groups, group_count)
+    mileages = _fill_missing(np.asarray(mileages, dtype=np.float64), groups, group_count)
+    design = np.column_stack([
+        np.ones_like(targets),
+        years - (years.mean() if len(years) else 0.0),
+        mileages / MILEAGE_UNIT_KM - (mileages.mean() / MILEAGE_UNIT_KM if len(mileages) else 0.0),
+    ])
+    columns = design.shape[1]
+
+    # Per-group X'X and X'y, one bincount per matrix entry
+    normal = np.empty((group_count, columns, columns))
+    for i in range(columns):
+        for j in range(i, columns):
+            normal[:, i, j] = normal[:, j, i] = np.bincount(
+                groups, weights=design[:, i] * design[:, j] * weights, minlength=group_count)
+    moments = np.column_stack([
+        np.bincount(groups, weights=design[:, i] * targets, minlength=group_count) for i in range(columns)])
+    normal[:, 0, 0] += 1e-9  # groups without a single price solve to zero instead of failing
+    for i in range(1, columns):
+        normal[:, i, i] += ridge
+    coefficients = np.linalg.solve(normal, moments[:, :, None])[:, :, 0]
+    expected = np.einsum("ij,ij->i", design, coefficients[groups])
+
+    # Trim offsets: the shrunk mean residual of each (make/model, trim)
+    trim_keys = groups * (int(trims.max()) + 1 if len(trims) else 1) + trims
+    _, trim_keys = np.unique(trim_keys, return_inverse=True)
+    residuals = np.where(priced, targets - expected, 0.0)
+    trim_sums = np.bincount(trim_keys, weights=residuals)
+    trim_counts = np.bincount(trim_keys, weights=weights)
+    expected += (trim_sums / (trim_counts + trim_shrinkage))[trim_keys]
+
+    residuals = np.where(priced, expected - targets, 0.0)
+    group_counts = np.bincount(groups, weights=weights, minlength=group_count)
+    group_variance = np.bincount(groups, weights=residuals ** 2, minlength=group_count) / np.maximum(group_counts - 1, 1)
+    overall_std = residuals[priced].std() if priced.any() else 0.0
+    group_std = np.sqrt(group_variance)
+    # Groups too small (or too uniform) for their own spread use the overall one
+    group_std = np.where((group_counts > 2) & (group_std > 0), group_std, overall_std or 1.0)
+
+    scores = np.where(priced, residuals / group_std[groups], np.nan)
+    return expected, scores
+
+
+def rank_order(scores):
+    """
+    Returns the indices that sort scores best first, with unscored (NaN) listings last.
+    """
+    return np.argsort(np.where(np.isnan(scores), np.inf, -scores), kind="stable")
+
+
+def _as_float(value):
+    return np.nan if value is None else float(value)
+
+
+def score_listings(listings):
+    """
+    Scores Listing records and returns them best deal first.
+
+    Each listing gets DealScore and ExpectedPrice columns (in listing.extra, so
+    they are written to CSV); listings without a price have them blank and go last.
+
+    Returns:
+        list: The listings, ranked.
+    """
+    listings = list(listings)
+    if not listings:
+        return listings
+    prices = np.fromiter((_as_float(listing.price) for listing in listings), dtype=np.float64, count=len(listings))
+    years = np.fromiter((_as_float(listing.year) for listing in listings), dtype=np.float64, count=len(listings))
+    mileages = np.fromiter((_as_float(listing.mileage) for listing in listings), dtype=np.float64, count=len(listings))
+    groups, _ = _group_codes((listing.make.lower(), listing.model.lower()) for listing in listings)
+    trims, _ = _group_codes((listing.trim or "").lower() for listing in listings)
+
+    expected, scores = score_arrays(prices, years, mileages, groups, trims)
+    ranked = []
+    for index in rank_order(scores).tolist():
+        listing = listings[index]
+        if np.isnan(scores[index]):
+            listing.extra["DealScore"] = ""
+            listing.extra["ExpectedPrice"] = ""
+        else:
+            listing.extra["DealScore"] = f"{scores[index]:.2f}"
+            listing.extra["ExpectedPrice"] = f"${int(round(expected[index])):,}"
+        ranked.append(listing)
+    return ranked
+
+
+def _synthetic_arrays(count, group_count=60, trim_count=8, seed=0):
+    generator = np.random.default_rng(seed)
+    groups = generator.integers(0, group_count, count)
+    trims = generator.integers(0, trim_count, count)
+    years = generator.integers(2008, 2025, count).astype(np.float64)
+    mileages = np.clip(generator.normal(15000, 4000, count) * (2025 - years), 0, None)
+    base = generator.uniform(20000, 60000, group_count)
+    prices = (base[groups] * 0.88 ** (2025 - years) - mileages * 0.03 + trims * 1200
+              + generator.normal(0, 1500, count))
+    prices[generator.random(count) < 0.02] = np.nan
+    years[generator.random(count) < 0.01] = np.nan
+    return prices, years, mileages, groups, trims
+
+
+def benchmark_scoring(sizes=(10000, 100000), repeat=5):
+    """
+    Times score_arrays (fit + score + rank) on synthetic listings.
+
+    Returns:
+        dict: Size -> best seconds of `repeat` runs.
+    """
+    results = {}
+    for size in sizes:
+        arrays = _synthetic_arrays(size)
+        best = float("inf")
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            _, scores = score_arrays(*arrays)
+            rank_order(scores)
+            best = min(best, time.perf_counter() - start_time)
+        results[size] = best
+        print(f"{size} listings: scored and ranked in {best * 1000:.1f} ms")
+
+    # The same through Listing records, including reading the fields into arrays
+    prices, years, mileages, groups, trims = _synthetic_arrays(sizes[-1])
+    listings = [
+        Listing.Listing(price=None if np.isnan(price) else int(price), year=None if np.isnan(year) else int(year),
+                        mileage=int(mileage), make=f"make{group}", model="model", trim=f"trim{trim}")
+        for price, year, mileage, group, trim in zip(prices, years, mileages, groups, trims)
+    ]
+    start_time = time.perf_counter()
+    score_listings(listings)
+    print(f"{len(listings)} Listing records: scored, ranked and annotated in {time.perf_counter() - start_time:.2f}s")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_scoring()
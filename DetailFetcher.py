@@ -0,0 +1,88 @@
+import threading
+
+import AutotraderSearchAPI
+import DetailParser
+import RateLimiter
+
+HTML_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-CA,en;q=0.9",
+}
+
+
+class DetailFetchStats:
+    """
+    Thread-safe counters of how each detail page was served during a run.
+    """
+
+    def __init__(self):
+        self.http_hits = 0
+        self.browser_fallbacks = 0
+        self.http_errors = 0
+        self.lock = threading.Lock()
+
+    def record_hit(self):
+        with self.lock:
+            self.http_hits += 1
+
+    def record_fallback(self, error=False):
+        with self.lock:
+            self.browser_fallbacks += 1
+            if error:
+                self.http_errors += 1
+
+    def as_dict(self):
+        with self.lock:
+            total = self.http_hits + self.browser_fallbacks
+            return {
+                "pages": total,
+                "http_hits": self.http_hits,
+                "browser_fallbacks": self.browser_fallbacks,
+                "http_errors": self.http_errors,
+                "http_hit_rate": self.http_hits / total if total else 0.0,
+                "fallback_rate": self.browser_fallbacks / total if total else 0.0,
+            }
+
+    def report(self):
+        """
+        Prints the HTTP hit and browser fallback rates of the run.
+        """
+        stats = self.as_dict()
+        if not stats["pages"]:
+            return
+        print(
+            f"Detail pages: {stats['pages']} total, "
+            f"{stats['http_hits']} over HTTP ({stats['http_hit_rate']:.1%}), "
+            f"{stats['browser_fallbacks']} needed the browser ({stats['fallback_rate']:.1%}, "
+            f"{stats['http_errors']} after HTTP errors)"
+        )
+
+
+def create_session(pool_size=10):
+    """
+    Creates a pooled session that asks for HTML instead of the search API's JSON.
+    """
+    session = AutotraderSearchAPI.create_session(pool_size=pool_size)
+    session.headers.update(HTML_HEADERS)
+    session.headers.pop("Content-Type", None)
+    session.headers.pop("X-Requested-With", None)
+    return session
+
+
+def fetch_details(session, url, timeout=15):
+    """
+    Fetches a detail page over plain HTTP and extracts its details.
+
+    Args:
+        session (requests.Session): Pooled session, see create_session.
+        url (str): Listing URL.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        dict or None: The Highlights/Specifications/Features columns, or None when
+            the sections are not in the server-rendered HTML.
+    """
+    with RateLimiter.throttled():
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+    return DetailParser.details_from_html(response.text)
@@ -0,0 +1,241 @@
+import json
+import re
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Script that assigns the vehicle detail page's view model, e.g. window['ngVdpModel'] = {...};
+EMBEDDED_MODEL_PATTERN = re.compile(r"""ngVdpModel['"]?\]?\s*=\s*""")
+JSON_LD_PATTERN = re.compile(
+    r'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+
+# JSON-LD (schema.org Car/Vehicle) properties mapped onto the spec labels shown on the page
+JSON_LD_SPEC_LABELS = [
+    ("vehicleModelDate", "Year"),
+    ("bodyType", "Body Type"),
+    ("vehicleConfiguration", "Trim"),
+    ("mileageFromOdometer", "Kilometres"),
+    ("vehicleTransmission", "Transmission"),
+    ("driveWheelConfiguration", "Drivetrain"),
+    ("color", "Exterior Colour"),
+    ("vehicleInteriorColor", "Interior Colour"),
+    ("numberOfDoors", "Doors"),
+    ("seatingCapacity", "Passengers"),
+    ("fuelType", "Fuel Type"),
+    ("vehicleEngine", "Engine"),
+    ("vehicleIdentificationNumber", "VIN"),
+    ("sku", "Stock Number"),
+]
+
+# Server-rendered sections holding the highlights, specifications and features
+DETAIL_SECTION_IDS = ["hl-card-body", "sl-card-body", "fo-card-body"]
+
+EMPTY_DETAILS = {"Highlights": "N/A", "Specifications": "N/A", "Features": "N/A"}
+
+
+def format_details(highlights, specifications, features):
+    """
+    Joins extracted details into the Highlights/Specifications/Features CSV columns.
+
+    Args:
+        highlights (list): Highlight strings.
+        specifications (dict): Spec label -> value, in page order.
+        features (list): Feature strings.
+
+    Returns:
+        dict: The three columns, "; "-joined the same way for every extraction path.
+    """
+    return {
+        "Highlights": "; ".join(highlights),
+        "Specifications": "; ".join([f"{key}: {value}" for key, value in specifications.items()]),
+        "Features": "; ".join(features),
+    }
+
+
+def extract_embedded_model(html):
+    """
+    Pulls the vehicle detail page's embedded view model (ngVdpModel) out of the HTML.
+
+    Returns:
+        dict or None: The decoded model, or None if the page does not embed one.
+    """
+    match = EMBEDDED_MODEL_PATTERN.search(html)
+    if not match:
+        return None
+    start = html.find("{", match.end())
+    if start == -1:
+        return None
+    try:
+        model, _ = json.JSONDecoder().raw_decode(html, start)
+    except ValueError:
+        return None
+    return model if isinstance(model, dict) else None
+
+
+def extract_json_ld(html):
+    """
+    Returns every JSON-LD object embedded in the page, with @graph containers flattened.
+    """
+    objects = []
+    for block in JSON_LD_PATTERN.findall(html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            continue
+        pending = data if isinstance(data, list) else [data]
+        while pending:
+            item = pending.pop(0)
+            if not isinstance(item, dict):
+                continue
+            if "@graph" in item:
+                pending.extend(item["@graph"])
+            else:
+                objects.append(item)
+    return objects
+
+
+def _text(value):
+    """
+    Turns a string, number or schema.org object (QuantitativeValue, EngineSpecification, ...) into display text.
+    """
+    if isinstance(value, dict):
+        if "value" in value:
+            unit = value.get("unitText") or value.get("unitCode") or ""
+            return f"{value['value']} {unit}".strip()
+        return str(value.get("name") or "").strip()
+    if isinstance(value, list):
+        return ", ".join(filter(None, (_text(item) for item in value)))
+    return str(value).strip() if value is not None else ""
+
+
+def _strings(items, keys=("name", "value", "description", "text", "key")):
+    strings = []
+    for item in items or []:
+        if isinstance(item, dict):
+            item = next((item[key] for key in keys if item.get(key)), "")
+        text = _text(item)
+        if text:
+            strings.append(text)
+    return strings
+
+
+def _details_from_embedded_model(model):
+    highlights, specifications, features = [], {}, []
+
+    spec_section = model.get("specifications") or {}
+    spec_items = spec_section.get("specs") if isinstance(spec_section, dict) else spec_section
+    for item in spec_items or []:
+        if isinstance(item, dict) and item.get("key"):
+            specifications[_text(item["key"])] = _text(item.get("value"))
+
+    highlight_section = model.get("featureHighlights") or {}
+    if isinstance(highlight_section, dict):
+        highlights = _strings(highlight_section.get("highlights"))
+        features = _strings(highlight_section.get("options"))
+    else:
+        highlights = _strings(highlight_section)
+
+    if not features:
+        features = _strings(model.get("features") or model.get("options"))
+    return highlights, specifications, features
+
+
+def _specifications_from_json_ld(objects):
+    specifications = {}
+    for item in objects:
+        item_types = item.get("@type")
+        item_types = item_types if isinstance(item_types, list) else [item_types]
+        if not any(item_type in ("Car", "Vehicle") for item_type in item_types):
+            continue
+        brand = _text(item.get("brand"))
+        if brand:
+            specifications["Make"] = brand
+        if item.get("model"):
+            specifications["Model"] = _text(item["model"])
+        for property_name, label in JSON_LD_SPEC_LABELS:
+            text = _text(item.get(property_name))
+            if text:
+                specifications[label] = text
+    return specifications
+
+
+def details_from_view_model(model):
+    """
+    Maps an already-decoded view model (e.g. window.ngVdpModel read in the browser) onto the detail columns.
+
+    Returns:
+        dict or None: The three columns, or None if the model has no specifications.
+    """
+    if not isinstance(model, dict):
+        return None
+    highlights, specifications, features = _details_from_embedded_model(model)
+    if not specifications:
+        return None
+    return format_details(highlights, specifications, features)
+
+
+def details_from_structured_data(html):
+    """
+    Maps the vehicle's structured data onto the Highlights/Specifications/Features columns.
+
+    The embedded view model carries all three sections. JSON-LD only describes the
+    vehicle itself, so it is used to fill in specifications the view model lacks.
+
+    Args:
+        html (str): HTML of a vehicle detail page.
+
+    Returns:
+        dict or None: The three columns, or None when the page has no view model
+            (or no specifications at all) and the caller should fall back to the DOM.
+    """
+    model = extract_embedded_model(html)
+    if not model:
+        return None
+
+    highlights, specifications, features = _details_from_embedded_model(model)
+    if not specifications:
+        specifications = _specifications_from_json_ld(extract_json_ld(html))
+
+    if not specifications:
+        return None
+    return format_details(highlights, specifications, features)
+
+
+def details_from_dom(html):
+    """
+    Parses the server-rendered highlight, specification and feature sections of a detail page.
+
+    Args:
+        html (str): HTML of a vehicle detail page.
+
+    Returns:
+        dict or None: The three columns, or None when the specification section is not in the HTML
+            (the page was rendered client-side and needs a browser).
+    """
+    soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer(id=DETAIL_SECTION_IDS))
+    if not soup.find(id="sl-card-body"):
+        return None
+
+    highlights = [element.text.strip() for element in soup.select("#hl-card-body .list-text")]
+
+    specifications = {}
+    for element in soup.select("#sl-card-body .list-item"):
+        key_element = element.select_one(".col-xs-6")
+        value_element = element.select_one("strong")
+        if key_element and value_element:
+            specifications[key_element.text.strip()] = value_element.text.strip()
+
+    features = [element.text.strip() for element in soup.select("#fo-card-body .list-text")]
+    return format_details(highlights, specifications, features)
+
+
+def details_from_html(html):
+    """
+    Extracts the detail columns from a detail page's HTML without a browser:
+    structured data first, then the server-rendered sections.
+
+    Returns:
+        dict or None: The three columns, or None if neither source is in the HTML.
+    """
+    return details_from_structured_data(html) or details_from_dom(html)
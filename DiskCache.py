@@ -0,0 +1,146 @@
+import json
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def normalize_listing_url(url):
+    """
+    Normalizes a listing URL into a cache key: lower-case scheme and host, no query
+    string (tracking parameters like ursrc/urp change between searches), no fragment
+    and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, "", ""))
+
+
+class DiskCache:
+    """
+    A persistent key/value cache in a single SQLite file.
+
+    Values are stored as JSON. Entries older than ttl_seconds are treated as
+    missing; once the stored values exceed max_bytes, the least recently used
+    entries are evicted. Hits, misses, expirations and evictions are counted
+    for reporting. Safe to share between threads.
+    """
+
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "stores": 0, "evictions": 0}
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "stored_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None if it is missing or older than the TTL.
+        """
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT value, size, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            value, size, stored_at = row
+            if self.ttl_seconds is not None and now - stored_at > self.ttl_seconds:
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.connection.commit()
+                self.total_bytes -= size
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.connection.commit()
+            self.stats["hits"] += 1
+        return json.loads(value)
+
+    def set(self, key, value):
+        """
+        Stores a JSON-serializable value under key, evicting old entries if the cache is full.
+        """
+        data = json.dumps(value)
+        size = len(data.encode("utf-8"))
+        now = time.time()
+        with self.lock:
+            previous = self.connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, data, size, now, now),
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+            self.stats["stores"] += 1
+            self._evict()
+            self.connection.commit()
+
+    def _evict(self):
+        # Drop least recently used entries in small batches until the cache fits again
+        while self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            rows = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            for key, size in rows:
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.stats["evictions"] += 1
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def purge_expired(self):
+        """
+        Deletes every entry older than the TTL. Returns the number of entries removed.
+        """
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self.lock:
+            removed_bytes, removed = self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0), COUNT(*) FROM entries WHERE stored_at < ?", (cutoff,)
+            ).fetchone()
+            self.connection.execute("DELETE FROM entries WHERE stored_at < ?", (cutoff,))
+            self.connection.commit()
+            self.total_bytes -= removed_bytes
+            self.stats["expired"] += removed
+        return removed
+
+    def report(self, label="Cache"):
+        """
+        Prints the hit/miss statistics of this run.
+        """
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = self.stats["hits"] / lookups if lookups else 0.0
+        print(
+            f"{label}: {self.stats['hits']} hits, {self.stats['misses']} misses ({hit_rate:.1%} hit rate), "
+            f"{self.stats['expired']} expired, {self.stats['evictions']} evicted, "
+            f"{self.total_bytes / 1024:.0f} KiB stored"
+        )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
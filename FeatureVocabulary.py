@@ -0,0 +1,155 @@
+import random
+import sys
+import threading
+import time
+
+
+class FeatureVocabulary:
+    """
+    Interns highlight/feature strings to small integer IDs.
+
+    The same few hundred strings ("Bluetooth", "Backup Camera", ...) repeat across
+    thousands of listings, so each listing only keeps a tuple of IDs (page order)
+    and the strings are stored once here. A set of IDs is also available as a
+    bitset (a Python int with bit i set for ID i), which turns cross-column dedup
+    and "has all of these features" checks into integer operations.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, text):
+        """
+        Returns the ID of a string, assigning the next free ID the first time it is seen.
+        """
+        feature_id = self.ids.get(text)
+        if feature_id is None:
+            with self.lock:
+                feature_id = self.ids.get(text)
+                if feature_id is None:
+                    feature_id = len(self.strings)
+                    self.strings.append(text)
+                    self.ids[text] = feature_id
+        return feature_id
+
+    def encode(self, items):
+        """
+        Interns strings and returns their IDs as a tuple, in the given order.
+        """
+        return tuple(self.intern(item) for item in items)
+
+    def encode_text(self, text):
+        """
+        Interns the items of a "; "-joined column.
+        """
+        return self.encode(item for item in (text or "").split("; ") if item)
+
+    def decode(self, feature_ids):
+        return [self.strings[feature_id] for feature_id in feature_ids]
+
+    def lookup(self, text):
+        """
+        Returns the ID of a string without interning it, or None if it was never seen.
+        """
+        return self.ids.get(text)
+
+    def mask(self, items):
+        """
+        Bitset of the given strings; strings never seen leave no bit, so they can't match anything.
+        """
+        bits = 0
+        for item in items:
+            feature_id = self.ids.get(item)
+            if feature_id is not None:
+                bits |= 1 << feature_id
+        return bits
+
+
+def bitset(feature_ids):
+    """
+    Returns the bitset (int) with a bit set for each ID.
+    """
+    bits = 0
+    for feature_id in feature_ids:
+        bits |= 1 << feature_id
+    return bits
+
+
+def dedup_ids(columns):
+    """
+    Removes IDs already seen in an earlier column (and repeats within a column).
+
+    Args:
+        columns (list): One sequence of IDs per column.
+
+    Returns:
+        list: One tuple of IDs per column, order kept.
+    """
+    seen = 0
+    cleaned = []
+    for feature_ids in columns:
+        kept = []
+        for feature_id in feature_ids:
+            bit = 1 << feature_id
+            if not seen & bit:
+                seen |= bit
+                kept.append(feature_id)
+        cleaned.append(tuple(kept))
+    return cleaned
+
+
+_vocabulary = FeatureVocabulary()
+
+
+def get_vocabulary():
+    """
+    Returns the vocabulary shared by every listing in this process.
+    """
+    return _vocabulary
+
+
+def benchmark_memory(listing_count=5000, features_per_listing=40, vocabulary_size=400):
+    """
+    Compares the memory of feature lists kept as strings (as split from the CSV)
+    against interned ID tuples, for synthetic listings.
+
+    Returns:
+        dict: Bytes per listing for each representation.
+    """
+    generator = random.Random(0)
+    names = [f"Feature number {index} with a typical length" for index in range(vocabulary_size)]
+    vocabulary = FeatureVocabulary()
+
+    string_lists, id_tuples = [], []
+    for _ in range(listing_count):
+        # Every listing gets fresh string objects, like splitting a CSV column does
+        items = ["".join(name) for name in generator.sample(names, features_per_listing)]
+        string_lists.append(items)
+        id_tuples.append(vocabulary.encode(items))
+
+    string_bytes = sum(sys.getsizeof(items) + sum(sys.getsizeof(item) for item in items) for items in string_lists)
+    id_bytes = sum(sys.getsizeof(feature_ids) for feature_ids in id_tuples)
+    vocabulary_bytes = sum(sys.getsizeof(text) for text in vocabulary.strings) + sys.getsizeof(vocabulary.ids)
+
+    start_time = time.perf_counter()
+    wanted = vocabulary.mask(names[:3])
+    matched = sum(1 for feature_ids in id_tuples if bitset(feature_ids) & wanted == wanted)
+    query_seconds = time.perf_counter() - start_time
+
+    results = {
+        "strings_bytes_per_listing": string_bytes / listing_count,
+        "ids_bytes_per_listing": (id_bytes + vocabulary_bytes) / listing_count,
+    }
+    print(f"Strings: {results['strings_bytes_per_listing']:.0f} bytes/listing; "
+          f"interned IDs: {results['ids_bytes_per_listing']:.0f} bytes/listing (vocabulary included)")
+    print(f"Feature query over {listing_count} listings: {query_seconds * 1000:.1f} ms ({matched} matches)")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_memory()
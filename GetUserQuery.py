@@ -1,4 +1,6 @@
-import CarDataCollector
+import json
+
+import MakeModelCatalog
 
 def read_query_file(file_path="querydetails.txt"):
     with open(file_path, "r") as file:
@@ -68,30 +70,41 @@ def read_query_file(file_path="querydetails.txt"):
 def create_query_file():
     # Open a new file named querydetails.txt for writing
     with open("querydetails.txt", "w") as file:
-        # Get car make
-        all_makes = CarDataCollector.get_makes_from_autotrader()
-        print(all_makes)
-        make = ""
+        # Get car make (from the cached catalog; typos are matched to the closest make)
+        catalog = MakeModelCatalog.get_catalog()
+        all_makes = catalog.make_counts()
+        print(", ".join(f"{name} ({count})" if count is not None else name for name, count in all_makes))
+        make = None
         model = -2
-        while make == "" or make not in all_makes: 
-            make = input("Enter make of car: ")
-            if make not in all_makes and make != "":
-                make = input("Please enter a valid car maker: ")
+        while make is None:
+            typed_make = input("Enter make of car: ")
+            make = catalog.match_make(typed_make)
+            if make is None and typed_make.strip():
+                close_makes = MakeModelCatalog.suggestions(typed_make, catalog.makes())
+                print(f"Please enter a valid car maker{' (did you mean ' + ', '.join(close_makes) + '?)' if close_makes else ''}.")
+            elif make is not None and make != typed_make.strip():
+                print(f"Using make: {make}")
         file.write(f"Make: {make}\n")
         
         # Get car model
-        modelsformake = CarDataCollector.get_models_from_autotrader(make)
-        for index, modelformake in enumerate(modelsformake):
-            print(f"{index}: {modelformake}")
+        modelsformake = catalog.model_counts(make)
+        for index, (modelformake, count) in enumerate(modelsformake):
+            print(f"{index}: {modelformake}" + (f" ({count})" if count is not None else ""))
+        modelsformake = [modelformake for modelformake, _ in modelsformake]
         while True:
+            typed_model = input("Select model ID (or name) of car: ").strip()
             try:
-                model = int(input("Select model ID of car: ").strip())
+                model = int(typed_model)
                 if 0 <= model < len(modelsformake):
                     model = modelsformake[model]
                     break
                 else:
                     print(f"Invalid index. Please choose a number between 0 and {len(modelsformake) - 1}.")
             except ValueError:
+                model = MakeModelCatalog.fuzzy_match(typed_model, modelsformake)
+                if model is not None:
+                    print(f"Using model: {model}")
+                    break
                 print("Invalid input. Please enter a valid input.")
         file.write(f"Model: {model}\n")
         
@@ -297,6 +310,97 @@ def use_previous_or_new_query():
         else:
             print("Invalid input. Please enter 'yes' or 'no'.")
 
+def build_query(filters):
+    """
+    Builds the search URL for a filters dict (make, model, price, mileage, year and distance keys).
+
+    Returns:
+        tuple: (search URL, max_pages, exclusions, filters), as main returns them.
+    """
+    make, model = filters['make'], filters['model']
+    # Replace spaces with URL encoding and convert to lowercase
+    make_encoded = make.replace(" ", "%20").lower()
+    model_encoded = model.replace(" ", "%20").lower()
+
+    # Construct the AutoTrader URL with the new parameters
+    modified_url = (
+        f"https://www.autotrader.ca/cars/{make_encoded}/{model_encoded}/?"
+        f"rcp=15&rcs=0&srt=35&"
+        f"yRng={filters['min_year']}%2C{filters['max_year']}&"  # Year range
+        f"pRng={filters['price_min']}%2C{filters['price_max']}&"   # Price range
+        f"oRng={filters['min_mileage']}%2C{filters['max_mileage']}&"  # Mileage range
+        f"prx={filters['max_distance']}&"             # Maximum distance
+        f"loc=Kanata%2C%20ON&"
+        f"hprc=True&wcp=True&sts=New-Used&inMarket=advancedSearch"
+    )
+    return modified_url, filters['max_pages'], filters['exclusions'], filters
+
+
+# Values for keys a JSON query leaves out: no bound, every page, nationwide
+QUERY_DEFAULTS = {
+    "PriceMin": 0,
+    "PriceMax": 999999,
+    "OdometerMin": 0,
+    "OdometerMax": 999999,
+    "YearMin": 1900,
+    "YearMax": 2100,
+    "MaxPages": 999,
+    "Proximity": -1,
+    "Exclusions": [],
+}
+
+
+def filters_from_payload(payload):
+    """
+    Converts a JSON query into the filters dict main builds interactively.
+
+    A query is shaped like the search API payload (see fordfusion2017-19.txt):
+    Make and Model are required; PriceMin/PriceMax, OdometerMin/OdometerMax,
+    YearMin/YearMax and Proximity (km, -1 for nationwide) are optional, as are
+    the batch-only MaxPages, Exclusions (list of keywords), Keyword and Name.
+    Other payload keys (Address, Skip, Top, ...) are ignored.
+    """
+    if not payload.get("Make") or not payload.get("Model"):
+        raise ValueError(f"Query needs a Make and a Model: {payload}")
+    values = dict(QUERY_DEFAULTS, **payload)
+    return {
+    'make': values["Make"],                             # Car make
+    'model': values["Model"],                           # Car model
+    'price_min': int(values["PriceMin"]),               # Minimum price
+    'price_max': int(values["PriceMax"]),               # Maximum price
+    'max_pages': int(values["MaxPages"]),               # Maximum number of pages to search
+    'max_distance': int(values["Proximity"]),           # Maximum distance for the search
+    'exclusions': list(values["Exclusions"]),           # Keywords to exclude
+    'min_mileage': int(values["OdometerMin"]),          # Minimum mileage
+    'max_mileage': int(values["OdometerMax"]),          # Maximum mileage
+    'min_year': int(values["YearMin"]),                 # Minimum year
+    'max_year': int(values["YearMax"])                  # Maximum year
+    }
+
+
+def read_query_json(file_path):
+    """
+    Reads one JSON query, or a list of them, from a file.
+
+    Returns:
+        list: One dict per query with "name", "keyword" (None if not given) and
+            "query" (the tuple main returns), in file order.
+    """
+    with open(file_path, "r") as file:
+        payloads = json.load(file)
+    if isinstance(payloads, dict):
+        payloads = [payloads]
+    queries = []
+    for payload in payloads:
+        filters = filters_from_payload(payload)
+        queries.append({
+            "name": payload.get("Name") or f"{filters['make']} {filters['model']}",
+            "keyword": payload.get("Keyword"),
+            "query": build_query(filters),
+        })
+    return queries
+
+
 def main():
     make, model, price_min, price_max, max_pages, max_distance, exclusions, min_mileage, max_mileage, min_year, max_year = use_previous_or_new_query()
     allfilters = {
@@ -312,21 +416,7 @@ def main():
     'min_year': min_year,              # Minimum year
     'max_year': max_year               # Maximum year
     }
-    # Replace spaces with URL encoding and convert to lowercase
-    make_encoded = make.replace(" ", "%20").lower()
-    model_encoded = model.replace(" ", "%20").lower()
-
-    # Construct the AutoTrader URL with the new parameters
-    modified_url = (
-        f"https://www.autotrader.ca/cars/{make_encoded}/{model_encoded}/?"
-        f"rcp=15&rcs=0&srt=35&"
-        f"yRng={min_year}%2C{max_year}&"  # Year range
-        f"pRng={price_min}%2C{price_max}&"   # Price range
-        f"oRng={min_mileage}%2C{max_mileage}&"  # Mileage range
-        f"prx={max_distance}&"             # Maximum distance
-        f"loc=Kanata%2C%20ON&"
-        f"hprc=True&wcp=True&sts=New-Used&inMarket=advancedSearch"
-    )
+    modified_url, max_pages, exclusions, allfilters = build_query(allfilters)
 
     print("Search URL: ", modified_url)
     print("Exclusion Keywords: ", exclusions)
@@ -334,6 +424,5 @@ def main():
     return modified_url, max_pages, exclusions, allfilters
 
 
-while True:
+if __name__ == "__main__":
     main()
-    break
\ No newline at end of file
@@ -1,18 +1,22 @@
-import csv, re
+import csv, time
+import PipelineMetrics
+import KeywordMatcher
+import Listing
+import NearDuplicates
 
-def filter_rows_with_keyword_and_add_trim(input_file, output_file, keyword="null"):
-    # Compile a regular expression for a whole-word match (case-insensitive)
-    keyword_pattern = re.compile(rf'\b{re.escape(keyword)}\b', re.IGNORECASE)
-    trim_pattern = re.compile(r'Trim:\s*([^;]+)')  # Extract text after "Trim:" up to the next semicolon
+def filter_rows_with_keyword_and_add_trim(input_file, output_file, keyword="null", exclusions=()):
+    # One whole-word, case-insensitive matcher: the keyword in any column, exclusions in the title and trim
+    matcher = KeywordMatcher.KeywordMatcher.from_keyword(keyword, exclusions)
     
     matches_found = 0  # Counter for debugging
     seen_links = set()  # Set to track unique links
+    metrics = PipelineMetrics.get_metrics().stage("keyword_filter")
     
     # Open the input CSV file
     with open(input_file, mode='r', newline='', encoding='utf-8') as infile:
         reader = csv.DictReader(infile)
-        # Define new fieldnames with the added "Trim" column
-        fieldnames = reader.fieldnames[:4] + ["Trim"] + reader.fieldnames[4:]
+        # Define new fieldnames with the added "Trim" column (only once if an earlier pass added it)
+        fieldnames = Listing.csv_fieldnames(reader.fieldnames)
         
         # Prepare the output CSV file
         with open(output_file, mode='w', newline='', encoding='utf-8') as outfile:
@@ -23,15 +27,14 @@ def filter_rows_with_keyword_and_add_trim(input_file, output_file, keyword="null
             # Process each row in the input CSV
             for row in reader:
                 #print(f"DEBUG: Checking row: {row}")  # Debug: print row content
+                start_time = time.perf_counter()
                 
                 # Normalize values and check if the keyword matches as a full word
-                if keyword == "null" or any(keyword_pattern.search(str(value).strip() or "") for value in row.values()):
+                if matcher.matches_row(row):
                     link = row.get("Link", "").strip()  # Get the Link column value
                     if link and link not in seen_links:  # Check if link is unique
-                        # Extract "Trim" value from the Specifications field
-                        specifications = row.get("Specifications", "")
-                        trim_match = trim_pattern.search(specifications)
-                        trim_value = trim_match.group(1).strip() if trim_match else "Unknown"
+                        # Take the Trim from the parsed listing (its specifications, or an earlier pass)
+                        trim_value = Listing.Listing.from_row(row).trim or "Unknown"
                         
                         # Insert the "Trim" value into the row
                         row["Trim"] = trim_value
@@ -42,18 +45,23 @@ def filter_rows_with_keyword_and_add_trim(input_file, output_file, keyword="null
                         matches_found += 1
                     else:
                         #print(f"DEBUG: Duplicate link found, skipping row: {row}")
-                        continue
+                        pass
+                metrics.record(time.perf_counter() - start_time)
 
     #print(f"DEBUG: Total matches found (unique links): {matches_found}")
 
-def remove_duplicates_and_clean_trim(input_file, output_file):
-    trim_pattern = re.compile(r'Trim:\s*([^;]+)')  # Regex to extract Trim value
+def remove_duplicates_and_clean_trim(input_file, output_file, near_duplicates=True):
     seen_links = set()  # Set to track unique links
+    # Relisted vehicles come back under new links, so also compare title/trim/mileage/price/features
+    # (this runs on the deep-searched CSV, so the VIN keeps different vehicles apart)
+    index = NearDuplicates.NearDuplicateIndex() if near_duplicates else None
+    relists = 0
+    metrics = PipelineMetrics.get_metrics().stage("dedup")
     
     with open(input_file, mode='r', newline='', encoding='utf-8') as infile:
         reader = csv.DictReader(infile)
-        # Define new fieldnames with the added "Trim" column
-        fieldnames = reader.fieldnames[:4] + ["Trim"] + reader.fieldnames[4:]
+        # Define new fieldnames with the added "Trim" column (only once if an earlier pass added it)
+        fieldnames = Listing.csv_fieldnames(reader.fieldnames)
         
         # Prepare the output CSV file
         with open(output_file, mode='w', newline='', encoding='utf-8') as outfile:
@@ -63,12 +71,19 @@ def remove_duplicates_and_clean_trim(input_file, output_file):
             
             # Process each row in the input CSV
             for row in reader:
+                start_time = time.perf_counter()
                 link = row.get("Link", "").strip()  # Get the Link column value
                 if link and link not in seen_links:  # Check if link is unique
-                    # Extract "Trim" value from the Specifications field
-                    specifications = row.get("Specifications", "")
-                    trim_match = trim_pattern.search(specifications)
-                    raw_trim = trim_match.group(1).strip() if trim_match else "Unknown"
+                    listing = Listing.Listing.from_row(row)
+                    original = index.add(listing) if index is not None else None
+                    if original is not None:
+                        print(f"Dropped near duplicate {link}: same vehicle as {original.link}")
+                        seen_links.add(link)
+                        relists += 1
+                        metrics.record(time.perf_counter() - start_time)
+                        continue
+                    # Take the Trim from the parsed listing (its specifications, or an earlier pass)
+                    raw_trim = listing.trim or "Unknown"
                     
                     # Clean and standardize the Trim value
                     clean_trim_value = raw_trim
@@ -79,9 +94,10 @@ def remove_duplicates_and_clean_trim(input_file, output_file):
                     seen_links.add(link)  # Mark the link as seen
                 else:
                     #print(f"DEBUG: Duplicate link found, skipping row: {row}")
-                    continue
+                    pass
+                metrics.record(time.perf_counter() - start_time)
 
-    print(f"DEBUG: Processed file, removed duplicates, and standardized trims.")
+    print(f"DEBUG: Processed file, removed duplicates ({relists} relisted vehicles), and standardized trims.")
 
 
 def keycleanup(keyword = "Performance",input_csv = "Autotrader_Listings_Updated.csv"):
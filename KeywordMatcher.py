@@ -0,0 +1,217 @@
+import re
+import time
+
+# Row columns exclusions are looked for in (include terms are looked for in every column)
+EXCLUSION_COLUMNS = ("Title", "Trim")
+
+
+def _normalize(term):
+    # Case- and whitespace-insensitive form a term is matched and reported as
+    return " ".join(term.lower().split())
+
+
+def _term_pattern(term):
+    # Phrases match with any run of whitespace between their words
+    return r"\s+".join(re.escape(word) for word in term.split())
+
+
+def _compile(terms, lookahead=False):
+    # One whole-word alternation, longest first; group 1 is the term matched
+    if not terms:
+        return None
+    alternation = r"\b(" + "|".join(_term_pattern(term) for term in sorted(terms, key=len, reverse=True)) + r")\b"
+    return re.compile(f"(?={alternation})" if lookahead else alternation, re.IGNORECASE)
+
+
+def _join(values):
+    # A separator no phrase can match across, so phrases never span two columns
+    return "\x00".join(str(value) for value in values if value)
+
+
+class KeywordMatcher:
+    """
+    Matches any number of include, exclude and phrase terms in one pass.
+
+    Exclusions are compiled into one alternation regex, checked first, so a row
+    is rejected at the first excluded term. Include terms and phrases are compiled
+    into a second one, matched as a lookahead so every term is found at every
+    position: overlapping terms ("fusion sport", "sport package") and terms nested
+    in a longer one ("sport" in "sport package") are all reported. Matching is
+    case-insensitive and whole-word.
+
+    A text matches when it contains no excluded term and, if there are include
+    terms or phrases, all of them (require_all=True) or at least one of them.
+    In a row, include terms are looked for in every column, exclusions only in
+    exclude_columns (the title and trim, as the scraper has always applied them),
+    so excluding "manual" doesn't drop a car listing "manual climate control".
+
+    Usage:
+        matcher = KeywordMatcher(include=["sport"], exclude=["salvage", "rebuilt"], phrases=["adaptive cruise"])
+        matcher.matches_row(row)
+    """
+
+    def __init__(self, include=(), exclude=(), phrases=(), require_all=True, exclude_columns=EXCLUSION_COLUMNS):
+        self.include = {_normalize(term) for term in list(include) + list(phrases) if term and term.strip()}
+        self.exclude = {_normalize(term) for term in exclude if term and term.strip()}
+        self.require_all = require_all
+        self.exclude_columns = tuple(exclude_columns)
+        self.include_pattern = _compile(self.include, lookahead=True)
+        self.exclude_pattern = _compile(self.exclude)
+        # Terms found inside each include term: a lookahead reports one term per position,
+        # so "sport" starting at the same place as "sport package" is added from here
+        self.contained = {
+            term: {other for other in self.include
+                   if other != term and re.search(r"\b" + _term_pattern(other) + r"\b", term)}
+            for term in self.include
+        }
+
+    @classmethod
+    def from_keyword(cls, keyword="null", exclusions=()):
+        """
+        Builds the matcher for the pipeline's single keyword ("null" for none) plus exclusions.
+        """
+        include = [] if not keyword or keyword == "null" else [keyword]
+        return cls(include=include, exclude=exclusions)
+
+    def scan(self, text):
+        """
+        Returns the set of terms found in the text; an excluded term, if any, is returned alone.
+        """
+        found = set()
+        if not text:
+            return found
+        if self.exclude_pattern is not None:
+            match = self.exclude_pattern.search(text)
+            if match:
+                found.add(_normalize(match.group(1)))
+                return found
+        return self.scan_included(text)
+
+    def _included(self, found):
+        if not self.include:
+            return True
+        if self.require_all:
+            return self.include <= found
+        return bool(found & self.include)
+
+    def matches_text(self, text):
+        found = self.scan(text)
+        return not found & self.exclude and self._included(found)
+
+    def matches_row(self, row):
+        """
+        True if the row's exclude_columns hold no excluded term and its columns,
+        scanned together, hold the include terms.
+        """
+        if self.exclude_pattern is not None and self.excludes(
+                _join(row.get(column) for column in self.exclude_columns)):
+            return False
+        return self._included(self.scan_included(_join(row.values())) if self.include else set())
+
+    def scan_included(self, text):
+        """
+        Returns the set of include terms and phrases found in the text (exclusions are ignored).
+        """
+        found = set()
+        if self.include_pattern is None or not text:
+            return found
+        for match in self.include_pattern.finditer(text):
+            term = _normalize(match.group(1))
+            found.add(term)
+            found |= self.contained.get(term, set())
+        return found
+
+    def matches_listing(self, listing):
+        return self.matches_row(listing.to_row())
+
+    def excludes_listing(self, listing):
+        """
+        True if a scraped listing dict's title contains an excluded term.
+        """
+        return self.excludes(listing.get("Title") or "")
+
+    def excludes(self, text):
+        """
+        True if the text contains an excluded term (include terms are ignored).
+        """
+        return self.exclude_pattern is not None and bool(text) and self.exclude_pattern.search(text) is not None
+
+
+_exclusion_matchers = {}
+
+
+def exclusion_matcher(exclusions):
+    """
+    Returns a (cached) matcher for a list of excluded keywords, or the matcher itself if one is passed.
+    """
+    if isinstance(exclusions, KeywordMatcher):
+        return exclusions
+    key = tuple(exclusions or ())
+    if key not in _exclusion_matchers:
+        _exclusion_matchers[key] = KeywordMatcher(exclude=key)
+    return _exclusion_matchers[key]
+
+
+# (matcher arguments, text or row, expected match), checked by check_matching: nested and
+# overlapping terms must each be found, whatever longer term they are part of
+MATCHING_CASES = [
+    ({"include": ["sport"], "phrases": ["sport package"]}, "2018 Fusion sport package", True),
+    ({"include": ["adaptive cruise"], "exclude": ["cruise"]}, "adaptive cruise control", False),
+    ({"include": ["fusion sport", "sport package"]}, "2018 Ford Fusion Sport Package", True),
+    ({"include": ["sport"]}, "2018 Fusion Sportback", False),
+    ({"exclude": ["manual"]}, {"Title": "2018 Ford Fusion SE", "Features": "Manual climate control"}, True),
+    ({"exclude": ["manual"]}, {"Title": "2018 Ford Fusion SE Manual", "Features": ""}, False),
+    ({"include": ["sunroof"], "exclude": ["salvage"]}, {"Title": "2018 Fusion", "Features": "Sunroof"}, True),
+]
+
+
+def check_matching(cases=MATCHING_CASES):
+    """
+    Runs the MATCHING_CASES (text through matches_text, rows through matches_row) and prints any that fail.
+
+    Returns:
+        list: The failing cases.
+    """
+    failures = []
+    for arguments, subject, expected in cases:
+        matcher = KeywordMatcher(**arguments)
+        result = matcher.matches_row(subject) if isinstance(subject, dict) else matcher.matches_text(subject)
+        if result != expected:
+            print(f"KeywordMatcher({arguments}) on {subject!r}: expected {expected}, got {result}")
+            failures.append((arguments, subject, expected))
+    print(f"{len(cases) - len(failures)} of {len(cases)} matching cases passed")
+    return failures
+
+
+def benchmark_matching(row_count=20000, term_count=50):
+    """
+    Compares one regex per term (the old approach, repeated per term) with the combined matcher.
+
+    Returns:
+        dict: Seconds for each approach.
+    """
+    words = [f"word{index}" for index in range(500)]
+    rows = [
+        {"Title": f"2018 Ford Fusion {words[index % 500]}", "Features": "; ".join(words[(index * 7 + k) % 500] for k in range(30))}
+        for index in range(row_count)
+    ]
+    terms = words[::500 // term_count][:term_count]
+
+    start_time = time.perf_counter()
+    patterns = [re.compile(rf"\b{re.escape(term)}\b", re.IGNORECASE) for term in terms]
+    per_term = sum(1 for row in rows if any(pattern.search(str(value)) for pattern in patterns for value in row.values()))
+    per_term_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    matcher = KeywordMatcher(include=terms, require_all=False)
+    combined = sum(1 for row in rows if matcher.matches_row(row))
+    combined_seconds = time.perf_counter() - start_time
+
+    print(f"{term_count} terms over {row_count} rows: one regex per term {per_term_seconds:.2f}s ({per_term} matches), "
+          f"combined {combined_seconds:.2f}s ({combined} matches)")
+    return {"per_term": per_term_seconds, "combined": combined_seconds}
+
+
+if __name__ == "__main__":
+    check_matching()
+    benchmark_matching()
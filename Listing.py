@@ -0,0 +1,261 @@
+import csv
+import re
+from urllib.parse import urlsplit
+
+import FeatureVocabulary
+
+# Columns every scraped listing has, in CSV order
+LISTING_COLUMNS = ["Title", "Price", "Location", "Mileage", "Link"]
+DETAIL_COLUMNS = ["Highlights", "Specifications", "Features"]
+
+YEAR_PATTERN = re.compile(r"\b(19[5-9]\d|20\d\d)\b")
+DIGITS_PATTERN = re.compile(r"\d+")
+
+# Specification labels (as shown on the detail page) that are promoted to real fields
+SPEC_FIELDS = {
+    "Year": "year",
+    "Make": "make",
+    "Model": "model",
+    "Trim": "trim",
+    "Drivetrain": "drivetrain",
+    "Transmission": "transmission",
+}
+
+
+def parse_int(text):
+    """
+    Reads an integer out of display text such as "$14,995" or "123,456 km".
+
+    Returns:
+        int or None: The number, or None if the text holds no digits (e.g. "Call for price").
+    """
+    if text is None:
+        return None
+    if isinstance(text, int):
+        return text
+    text = str(text).split(".")[0]  # "$14,995.00" -> "$14,995"
+    digits = "".join(DIGITS_PATTERN.findall(text))
+    return int(digits) if digits else None
+
+
+def parse_year(text):
+    """
+    Finds a model year (1950-2099) in text such as a listing title.
+    """
+    match = YEAR_PATTERN.search(str(text or ""))
+    return int(match.group(1)) if match else None
+
+
+def parse_specifications(text):
+    """
+    Splits the flattened "Key: value; Key: value" Specifications column back into a dict.
+    """
+    specifications = {}
+    for item in (text or "").split("; "):
+        key, separator, value = item.partition(":")
+        if separator and key.strip():
+            specifications[key.strip()] = value.strip()
+    return specifications
+
+
+def format_specifications(specifications):
+    return "; ".join(f"{key}: {value}" for key, value in specifications.items())
+
+
+def _split_items(text):
+    return [item for item in (text or "").split("; ") if item]
+
+
+def _make_model_from_link(link):
+    # Listing URLs look like /a/<make>/<model>/<city>/<province>/<id>/
+    parts = [part for part in urlsplit(link or "").path.split("/") if part]
+    if len(parts) >= 3 and parts[0] == "a":
+        return parts[1].replace("%20", " "), parts[2].replace("%20", " ")
+    return "", ""
+
+
+class Listing:
+    """
+    One vehicle listing with typed fields, parsed once when it is scraped or loaded.
+
+    Attributes:
+        title (str), location (str), link (str): As shown on the results page.
+        price (int or None): Asking price in dollars; None when there is no price.
+        mileage (int or None): Odometer reading in km.
+        year (int or None), make (str), model (str), trim (str),
+        drivetrain (str), transmission (str): From the specifications when known,
+            otherwise from the title and link.
+        specifications (dict): Spec label -> value, in page order.
+        highlights (list), features (list): Detail page strings, kept as tuples of
+            IDs in the shared FeatureVocabulary (highlight_ids, feature_ids).
+        price_display (str), mileage_display (str): The original Price/Mileage text when
+            it holds no number (e.g. "N/A"), written back to CSV as it was.
+        extra (dict): Any other CSV columns, carried through unchanged.
+    """
+
+    __slots__ = (
+        "title", "price", "location", "mileage", "link",
+        "year", "make", "model", "trim", "drivetrain", "transmission",
+        "specifications", "highlight_ids", "feature_ids", "price_display", "mileage_display", "extra",
+    )
+
+    def __init__(self, title="", price=None, location="", mileage=None, link="", year=None, make="", model="",
+                 trim="", drivetrain="", transmission="", specifications=None, highlights=None, features=None,
+                 extra=None):
+        self.title = title
+        self.price = price
+        self.location = location
+        self.mileage = mileage
+        self.link = link
+        self.year = year
+        self.make = make
+        self.model = model
+        self.trim = trim
+        self.drivetrain = drivetrain
+        self.transmission = transmission
+        self.specifications = specifications if specifications is not None else {}
+        self.highlights = highlights or []
+        self.features = features or []
+        self.price_display = ""
+        self.mileage_display = ""
+        self.extra = extra if extra is not None else {}
+
+    @property
+    def highlights(self):
+        return FeatureVocabulary.get_vocabulary().decode(self.highlight_ids)
+
+    @highlights.setter
+    def highlights(self, items):
+        self.highlight_ids = FeatureVocabulary.get_vocabulary().encode(items)
+
+    @property
+    def features(self):
+        return FeatureVocabulary.get_vocabulary().decode(self.feature_ids)
+
+    @features.setter
+    def features(self, items):
+        self.feature_ids = FeatureVocabulary.get_vocabulary().encode(items)
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Builds a listing from a scraped listing dict or a CSV row (display strings).
+
+        Args:
+            row (dict): Title/Price/Location/Mileage/Link, optionally the detail
+                columns (Highlights/Specifications/Features), Trim and other columns.
+
+        Returns:
+            Listing: The parsed listing.
+        """
+        row = {key: value for key, value in row.items() if key is not None}
+        link = (row.get("Link") or "").strip()
+        make, model = _make_model_from_link(link)
+        listing = cls(
+            title=(row.get("Title") or "").strip(),
+            price=parse_int(row.get("Price")),
+            location=(row.get("Location") or "").strip(),
+            mileage=parse_int(row.get("Mileage")),
+            link=link,
+            year=parse_year(row.get("Title")),
+            make=make,
+            model=model,
+            highlights=_split_items(row.get("Highlights")),
+            features=_split_items(row.get("Features")),
+            extra={key: value for key, value in row.items()
+                   if key not in LISTING_COLUMNS and key not in DETAIL_COLUMNS and key != "Trim"},
+        )
+        if listing.price is None:
+            listing.price_display = (row.get("Price") or "").strip()
+        if listing.mileage is None:
+            listing.mileage_display = (row.get("Mileage") or "").strip()
+        trim = (row.get("Trim") or "").strip()
+        if trim and trim != "Unknown":
+            listing.trim = trim
+        listing.apply_specifications(parse_specifications(row.get("Specifications")))
+        return listing
+
+    def apply_specifications(self, specifications):
+        """
+        Stores the detail page's specifications and promotes the known labels to fields.
+        """
+        self.specifications = dict(specifications)
+        for label, field in SPEC_FIELDS.items():
+            value = self.specifications.get(label)
+            if not value:
+                continue
+            setattr(self, field, parse_int(value) if field == "year" else value)
+        if self.mileage is None and self.specifications.get("Kilometres"):
+            self.mileage = parse_int(self.specifications["Kilometres"])
+
+    def apply_details(self, details):
+        """
+        Adds the Highlights/Specifications/Features columns returned by the deep search.
+        """
+        vocabulary = FeatureVocabulary.get_vocabulary()
+        self.highlight_ids = vocabulary.encode_text(details.get("Highlights"))
+        self.feature_ids = vocabulary.encode_text(details.get("Features"))
+        self.apply_specifications(parse_specifications(details.get("Specifications")))
+
+    @property
+    def price_text(self):
+        return f"${self.price:,}" if self.price is not None else self.price_display
+
+    @property
+    def mileage_text(self):
+        return f"{self.mileage:,} km" if self.mileage is not None else self.mileage_display
+
+    def to_row(self):
+        """
+        Returns the listing as CSV columns, with price and mileage formatted for display again.
+        """
+        row = {
+            "Title": self.title,
+            "Price": self.price_text,
+            "Location": self.location,
+            "Mileage": self.mileage_text,
+            "Link": self.link,
+            "Trim": self.trim or "Unknown",
+        }
+        if self.specifications or self.highlight_ids or self.feature_ids:
+            row["Highlights"] = "; ".join(self.highlights)
+            row["Specifications"] = format_specifications(self.specifications)
+            row["Features"] = "; ".join(self.features)
+        row.update(self.extra)
+        return row
+
+    def __repr__(self):
+        return f"Listing({self.year} {self.make} {self.model} {self.trim}, {self.price_text}, {self.mileage_text}, {self.link})"
+
+
+def csv_fieldnames(fieldnames):
+    """
+    Output columns for a CSV with the given input columns: Trim goes after the first four, once.
+    """
+    fieldnames = [name for name in fieldnames if name != "Trim"]
+    return fieldnames[:4] + ["Trim"] + fieldnames[4:]
+
+
+def read_listings_csv(file_path):
+    """
+    Loads every row of a listings CSV as a Listing.
+
+    Returns:
+        tuple: (list of Listing, the CSV's column names)
+    """
+    with open(file_path, mode='r', newline='', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        return [Listing.from_row(row) for row in reader], reader.fieldnames or []
+
+
+def write_listings_csv(listings, file_path, fieldnames=None):
+    """
+    Writes listings to a CSV with the usual display-formatted columns.
+    """
+    fieldnames = fieldnames or csv_fieldnames(LISTING_COLUMNS)
+    with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for listing in listings:
+            writer.writerow(listing.to_row())
+
@@ -0,0 +1,157 @@
+import csv
+import time
+
+import ListingStore
+
+NEW = "new"
+UNCHANGED = "unchanged"
+PRICE_CHANGED = "price_changed"
+DELISTED = "delisted"
+
+# Columns of the delta report CSV
+REPORT_FIELDNAMES = ["Status", "Title", "OldPrice", "Price", "PriceChange", "OldMileage", "Mileage", "FirstSeen", "Link"]
+
+
+class ListingDelta:
+    """
+    What changed between a search run and the previous run of the same search.
+
+    Listings are keyed by their normalized link (ListingStore.listing_key). A
+    listing is new if the store has never seen it, price-changed if its price
+    (or mileage) differs from the stored one, and unchanged otherwise. Listings
+    of the previous run that this run did not find are delisted; when a run is
+    cut short by max_pages those may just be on a later page.
+
+    Attributes:
+        new, unchanged (list): Listing records of this run.
+        price_changed (list): (listing, old price, old mileage) tuples.
+        delisted (list): Listing records as stored, for listings no longer found.
+        first_seen (dict): Listing key -> first-seen time, for listings seen before.
+    """
+
+    def __init__(self):
+        self.new = []
+        self.unchanged = []
+        self.price_changed = []
+        self.delisted = []
+        self.first_seen = {}
+
+    def classify(self, listings, states):
+        """
+        Sorts this run's listings against the stored state of each.
+
+        Args:
+            listings (iterable): Listing records of this run.
+            states (dict): ListingStore.listing_states() of those listings, read before storing them.
+        """
+        seen = set()
+        for listing in listings:
+            key = ListingStore.listing_key(listing.link)
+            if key in seen:
+                continue
+            seen.add(key)
+            state = states.get(key)
+            if state is None:
+                self.new.append(listing)
+                continue
+            old_price, old_mileage, first_seen = state
+            self.first_seen[key] = first_seen
+            mileage_changed = listing.mileage is not None and listing.mileage != old_mileage
+            if listing.price != old_price or mileage_changed:
+                self.price_changed.append((listing, old_price, old_mileage))
+            else:
+                self.unchanged.append(listing)
+
+    def unchanged_keys(self):
+        """
+        Keys of the listings whose stored details can be reused instead of searched again.
+        """
+        return {ListingStore.listing_key(listing.link) for listing in self.unchanged}
+
+    def report(self):
+        print(f"Delta: {len(self.new)} new, {len(self.price_changed)} price changed, "
+              f"{len(self.unchanged)} unchanged, {len(self.delisted)} delisted")
+        for listing, old_price, _ in self.price_changed:
+            if listing.price != old_price:
+                print(f"  {listing.title}: {_money(old_price)} -> {listing.price_text} ({listing.link})")
+
+    def rows(self):
+        """
+        Yields the delta report rows: new, price-changed, delisted, then unchanged listings.
+        """
+        for listing in self.new:
+            yield _report_row(NEW, listing, None, None, None)
+        for listing, old_price, old_mileage in self.price_changed:
+            first_seen = self.first_seen.get(ListingStore.listing_key(listing.link))
+            yield _report_row(PRICE_CHANGED, listing, old_price, old_mileage, first_seen)
+        for listing in self.delisted:
+            yield _report_row(DELISTED, listing, listing.price, listing.mileage, None)
+        for listing in self.unchanged:
+            first_seen = self.first_seen.get(ListingStore.listing_key(listing.link))
+            yield _report_row(UNCHANGED, listing, listing.price, listing.mileage, first_seen)
+
+    def write_report(self, file_path):
+        """
+        Writes the delta report CSV.
+
+        Returns:
+            int: Number of rows written.
+        """
+        count = 0
+        with open(file_path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=REPORT_FIELDNAMES)
+            writer.writeheader()
+            for row in self.rows():
+                writer.writerow(row)
+                count += 1
+        return count
+
+
+def _money(value):
+    return f"${value:,}" if value is not None else ""
+
+
+def _report_row(status, listing, old_price, old_mileage, first_seen):
+    change = listing.price - old_price if listing.price is not None and old_price is not None else None
+    return {
+        "Status": status,
+        "Title": listing.title,
+        "OldPrice": _money(old_price),
+        "Price": listing.price_text,
+        "PriceChange": f"{change:+,}" if change else "",
+        "OldMileage": f"{old_mileage:,} km" if old_mileage is not None else "",
+        "Mileage": listing.mileage_text,
+        "FirstSeen": time.strftime("%Y-%m-%d %H:%M", time.localtime(first_seen)) if first_seen else "",
+        "Link": listing.link,
+    }
+
+
+def record_run(store, query, listings):
+    """
+    Classifies a run's listings against the store, then records the run.
+
+    The store keeps one history row per listing each time its price or mileage
+    changes (see ListingStore.price_history), so history stays as small as the
+    number of changes rather than the number of runs.
+
+    Args:
+        store (ListingStore): The listing store.
+        query (dict): The run's search filters; runs with equal filters are compared.
+        listings (list): Listing records of this run.
+
+    Returns:
+        tuple: (ListingDelta, the new run's id)
+    """
+    delta = ListingDelta()
+    delta.classify(listings, store.listing_states(listing.link for listing in listings))
+
+    run_id = store.start_run(query)
+    store.upsert_listings(listings, run_id)
+
+    previous_run_id = store.previous_run_id(query, before_run_id=run_id)
+    if previous_run_id is not None:
+        current = {ListingStore.listing_key(listing.link) for listing in listings}
+        gone = [key for key in store.run_keys(previous_run_id) if key not in current]
+        stored = store.listings_by_key(gone)
+        delta.delisted = [stored[key] for key in gone if key in stored]
+    return delta, run_id
@@ -0,0 +1,326 @@
+import glob
+import os
+import time
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import KeywordMatcher
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, the other backends only need bs4 / the standard library
+    lxml = None
+
+AUTOTRADER_BASE_URL = "https://www.autotrader.ca"
+
+# Class of the element wrapping each listing, and the (tag, class) of each field inside it
+WRAPPER_CLASS = "dealer-split-wrapper"
+LISTING_FIELDS = [
+    ("Title", "span", "title-with-trim"),
+    ("Price", "span", "price-amount"),
+    ("Location", "span", "proximity-text"),
+    ("Mileage", "span", "odometer-proximity"),
+]
+LINK_TAG, LINK_CLASS = "a", "inner-link"
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Inputs every backend must parse exactly like the soup backend, checked by benchmark_backends
+# alongside the fixtures: script/style text inside a field, and an XML encoding declaration
+_EDGE_CASE_LISTING = ('<div class="dealer-split-wrapper"><a class="inner-link" href="/a/ford/fusion/x/"></a>'
+                      '<span class="title-with-trim">2018 Ford<script>var x = 1;</script><style>.a {}</style>'
+                      ' Fusion Titanium</span><span class="price-amount">$14,995</span></div>')
+EDGE_CASE_PAGES = [
+    _EDGE_CASE_LISTING,
+    '<?xml version="1.0" encoding="utf-8"?>' + _EDGE_CASE_LISTING,
+]
+
+
+def _build_listing(link, fields):
+    return {
+        'Title': fields.get('Title', "N/A"),
+        'Price': fields.get('Price', "N/A"),
+        'Location': fields.get('Location', "N/A"),
+        'Mileage': fields.get('Mileage', "N/A"),
+        'Link': AUTOTRADER_BASE_URL + link if link is not None else "N/A",
+    }
+
+
+def _parse_wrappers_with_soup(listing_wrappers):
+    listings = []
+    for wrapper in listing_wrappers:
+        try:
+            # Extract listing link
+            link_element = wrapper.find(LINK_TAG, class_=LINK_CLASS)
+            link = link_element['href'] if link_element else None
+
+            # Extract title, price, location and mileage
+            fields = {}
+            for column, tag, class_name in LISTING_FIELDS:
+                element = wrapper.find(tag, class_=class_name)
+                if element:
+                    fields[column] = element.text.strip()
+
+            listings.append(_build_listing(link, fields))
+        except Exception as e:
+            print(f"Error parsing listing: {e}")
+    return listings
+
+
+def parse_listings_soup(page_source):
+    """
+    Original backend: builds the full BeautifulSoup tree of the page.
+    """
+    soup = BeautifulSoup(page_source, 'html.parser')
+    return _parse_wrappers_with_soup(soup.find_all('div', class_=WRAPPER_CLASS))
+
+
+def parse_listings_strainer(page_source):
+    """
+    BeautifulSoup backend that only builds the listing wrappers (SoupStrainer).
+    """
+    only_wrappers = SoupStrainer('div', class_=WRAPPER_CLASS)
+    soup = BeautifulSoup(page_source, 'html.parser', parse_only=only_wrappers)
+    return _parse_wrappers_with_soup(soup.find_all('div', class_=WRAPPER_CLASS))
+
+
+def _has_class_xpath(class_name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')"
+
+
+def _text_without_scripts(element):
+    # Like BeautifulSoup's .text: script and style contents aren't part of a field's text
+    return "".join(element.xpath(".//text()[not(ancestor::script) and not(ancestor::style)]"))
+
+
+def parse_listings_lxml(page_source):
+    """
+    lxml backend: parses with libxml2 and pulls the fields out with XPath.
+    """
+    if lxml is None:
+        raise ImportError("The lxml parser backend needs the lxml package.")
+    if not page_source.strip():
+        return []
+
+    # lxml refuses str input starting with an XML encoding declaration, so it gets
+    # UTF-8 bytes, with the encoding given explicitly so a declaration can't override it
+    if isinstance(page_source, str):
+        page_source = page_source.encode("utf-8")
+    tree = lxml.html.fromstring(page_source, parser=lxml.html.HTMLParser(encoding="utf-8"))
+    listings = []
+    for wrapper in tree.xpath(f"//div[{_has_class_xpath(WRAPPER_CLASS)}]"):
+        try:
+            link_elements = wrapper.xpath(f"(.//{LINK_TAG}[{_has_class_xpath(LINK_CLASS)}])[1]")
+            link = link_elements[0].attrib['href'] if link_elements else None
+
+            fields = {}
+            for column, tag, class_name in LISTING_FIELDS:
+                elements = wrapper.xpath(f"(.//{tag}[{_has_class_xpath(class_name)}])[1]")
+                if elements:
+                    fields[column] = _text_without_scripts(elements[0]).strip()
+
+            listings.append(_build_listing(link, fields))
+        except Exception as e:
+            print(f"Error parsing listing: {e}")
+    return listings
+
+
+class _ListingTokenizer(HTMLParser):
+    """
+    Streaming tokenizer that only keeps track of listing wrappers and the fields inside them.
+
+    Keeps a stack of open elements; each entry remembers whether the element is a
+    listing wrapper or a field being captured, so text only has to be collected
+    for the handful of elements that matter.
+    """
+
+    VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"}
+    SKIPPED_TEXT_ELEMENTS = {"script", "style"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []           # (tag, role, listing_state, number of captures open before it)
+        self.listings = []        # Listing states, in document order of their wrappers
+        self.open_wrappers = []   # Listing states of the wrappers currently open
+        self.open_captures = []   # (listing_state, column) of fields currently collecting text
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.VOID_ELEMENTS:
+            return
+
+        captures_before = len(self.open_captures)
+        classes = None
+        role, state = None, None
+        for name, value in attrs:
+            if name == "class" and value:
+                classes = value.split()
+
+        if classes:
+            if tag == "div" and WRAPPER_CLASS in classes:
+                state = {"link": None, "fields": {}, "seen": set(), "error": None}
+                self.listings.append(state)
+                self.open_wrappers.append(state)
+                role = "wrapper"
+            for wrapper_state in self.open_wrappers:
+                if role == "wrapper" and wrapper_state is state:
+                    continue
+                if tag == LINK_TAG and LINK_CLASS in classes and "Link" not in wrapper_state["seen"]:
+                    wrapper_state["seen"].add("Link")
+                    href = dict(attrs).get("href")
+                    if href is None:
+                        wrapper_state["error"] = KeyError('href')
+                    else:
+                        wrapper_state["link"] = href
+                for field_column, field_tag, class_name in LISTING_FIELDS:
+                    if tag == field_tag and class_name in classes and field_column not in wrapper_state["seen"]:
+                        wrapper_state["seen"].add(field_column)
+                        wrapper_state["fields"][field_column] = []
+                        self.open_captures.append((wrapper_state, field_column))
+
+        if tag in self.SKIPPED_TEXT_ELEMENTS:
+            self.skip_depth += 1
+        self.stack.append((tag, role, state, captures_before))
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags never hold text, only the link attribute could matter
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self.VOID_ELEMENTS or not any(entry[0] == tag for entry in self.stack):
+            return
+        # Close everything up to the matching start tag, like html.parser's tree builder does
+        while self.stack:
+            open_tag, role, state, captures_before = self.stack.pop()
+            del self.open_captures[captures_before:]
+            if open_tag in self.SKIPPED_TEXT_ELEMENTS:
+                self.skip_depth -= 1
+            if role == "wrapper":
+                self.open_wrappers.remove(state)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        for state, column in self.open_captures:
+            state["fields"][column].append(data)
+
+    def results(self):
+        listings = []
+        for state in self.listings:
+            if state["error"] is not None:
+                print(f"Error parsing listing: {state['error']}")
+                continue
+            fields = {column: "".join(parts).strip() for column, parts in state["fields"].items()}
+            listings.append(_build_listing(state["link"], fields))
+        return listings
+
+
+def parse_listings_stream(page_source):
+    """
+    Streaming backend: a single pass of the standard library tokenizer, no tree is built.
+    """
+    tokenizer = _ListingTokenizer()
+    tokenizer.feed(page_source)
+    tokenizer.close()
+    return tokenizer.results()
+
+
+PARSER_BACKENDS = {
+    "soup": parse_listings_soup,
+    "strainer": parse_listings_strainer,
+    "lxml": parse_listings_lxml,
+    "stream": parse_listings_stream,
+}
+# lxml is the fastest backend when installed, the streaming tokenizer is the fastest without it
+DEFAULT_BACKEND = "lxml" if lxml is not None else "stream"
+
+
+def parse_listings(page_source, exclusions=None, backend=None):
+    """
+    Extracts all listings from a search results page.
+
+    Args:
+        page_source (str): HTML of a results page (or the listings fragment returned by the search API).
+        exclusions (list or KeywordMatcher): Keywords to exclude; listings whose title
+            contains one (as a whole word) are dropped here, before any later stage.
+        backend (str): One of PARSER_BACKENDS; defaults to DEFAULT_BACKEND.
+
+    Returns:
+        list: A list of dicts with Title, Price, Location, Mileage and Link keys.
+    """
+    listings = PARSER_BACKENDS[backend or DEFAULT_BACKEND](page_source)
+    if exclusions:
+        matcher = KeywordMatcher.exclusion_matcher(exclusions)
+        listings = [listing for listing in listings if not matcher.excludes_listing(listing)]
+    return listings
+
+
+def parse_result_count(page_source):
+    """
+    Reads the total number of results shown on a search results page.
+
+    Args:
+        page_source (str): HTML of a results page.
+
+    Returns:
+        int or None: The total result count, or None if the page does not show one.
+    """
+    count_ids = ("titleCount", "sbCount")
+    soup = BeautifulSoup(page_source, 'html.parser', parse_only=SoupStrainer(id=count_ids))
+    for element_id in count_ids:
+        count_element = soup.find(id=element_id)
+        if count_element:
+            digits = "".join(ch for ch in count_element.text if ch.isdigit())
+            if digits:
+                return int(digits)
+    return None
+
+
+def benchmark_backends(fixture_paths=None, repeat=20):
+    """
+    Times every available parser backend over saved result-page fixtures and checks
+    they all return exactly what the original soup backend returns, on the fixtures
+    and on EDGE_CASE_PAGES.
+
+    Args:
+        fixture_paths (list): HTML files to parse; defaults to fixtures/results_page_*.html.
+        repeat (int): Number of times each fixture is parsed per backend.
+
+    Returns:
+        dict: Backend name -> average milliseconds per page.
+    """
+    if fixture_paths is None:
+        fixture_paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, "results_page_*.html")))
+    pages = []
+    for path in fixture_paths:
+        with open(path, "r", encoding="utf-8") as file:
+            pages.append(file.read())
+    if not pages:
+        print("No fixtures found.")
+        return {}
+
+    expected = [parse_listings_soup(page) for page in pages + EDGE_CASE_PAGES]
+    timings = {}
+    for name, backend in PARSER_BACKENDS.items():
+        if name == "lxml" and lxml is None:
+            print(f"{name:>9}: skipped (lxml not installed)")
+            continue
+        if [backend(page) for page in pages + EDGE_CASE_PAGES] != expected:
+            print(f"{name:>9}: output differs from the soup backend!")
+
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                backend(page)
+        timings[name] = (time.perf_counter() - start_time) * 1000 / (repeat * len(pages))
+        print(f"{name:>9}: {timings[name]:.2f} ms/page")
+    return timings
+
+
+if __name__ == "__main__":
+    benchmark_backends()
@@ -0,0 +1,550 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+import DiskCache
+import Listing
+
+LISTING_STORE_PATH = "listings.sqlite"
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS listings ("
+    "link TEXT PRIMARY KEY, url TEXT NOT NULL, title TEXT, price INTEGER, location TEXT, mileage INTEGER, "
+    "year INTEGER, make TEXT, model TEXT, trim TEXT, drivetrain TEXT, transmission TEXT, "
+    "first_seen REAL NOT NULL, last_seen REAL NOT NULL, times_seen INTEGER NOT NULL DEFAULT 1)",
+    "CREATE INDEX IF NOT EXISTS listings_make_model_year ON listings (make COLLATE NOCASE, model COLLATE NOCASE, year)",
+    "CREATE INDEX IF NOT EXISTS listings_year ON listings (year)",
+    "CREATE INDEX IF NOT EXISTS listings_price ON listings (price)",
+    "CREATE INDEX IF NOT EXISTS listings_mileage ON listings (mileage)",
+    "CREATE TABLE IF NOT EXISTS enrichments ("
+    "link TEXT PRIMARY KEY REFERENCES listings (link), highlights TEXT, specifications TEXT, features TEXT, "
+    "enriched_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS runs ("
+    "id INTEGER PRIMARY KEY AUTOINCREMENT, started_at REAL NOT NULL, query TEXT)",
+    "CREATE TABLE IF NOT EXISTS run_listings ("
+    "run_id INTEGER NOT NULL REFERENCES runs (id), link TEXT NOT NULL REFERENCES listings (link), "
+    "position INTEGER NOT NULL, PRIMARY KEY (run_id, link))",
+    # One row per listing each time its price or mileage was first seen at a new value
+    "CREATE TABLE IF NOT EXISTS listing_history ("
+    "link TEXT NOT NULL REFERENCES listings (link), observed_at REAL NOT NULL, price INTEGER, mileage INTEGER, "
+    "run_id INTEGER REFERENCES runs (id))",
+    "CREATE INDEX IF NOT EXISTS listing_history_link ON listing_history (link, observed_at)",
+    "CREATE INDEX IF NOT EXISTS runs_query ON runs (query, id)",
+]
+
+LISTING_COLUMNS = [
+    "link", "url", "title", "price", "location", "mileage",
+    "year", "make", "model", "trim", "drivetrain", "transmission",
+]
+
+# Columns that keep their stored value when a new scrape doesn't know them (e.g. trim before the deep search)
+_KEEP_IF_EMPTY = ["year", "make", "model", "trim", "drivetrain", "transmission"]
+
+UPSERT_LISTING = (
+    f"INSERT INTO listings ({', '.join(LISTING_COLUMNS)}, first_seen, last_seen) "
+    f"VALUES ({', '.join('?' for _ in LISTING_COLUMNS)}, ?, ?) "
+    "ON CONFLICT (link) DO UPDATE SET "
+    "url = excluded.url, title = excluded.title, price = excluded.price, location = excluded.location, "
+    "mileage = COALESCE(excluded.mileage, listings.mileage), "
+    + ", ".join(f"{column} = COALESCE(NULLIF(excluded.{column}, ''), listings.{column})" for column in _KEEP_IF_EMPTY)
+    + ", last_seen = excluded.last_seen, times_seen = listings.times_seen + 1"
+)
+
+SELECT_LISTINGS = (
+    "SELECT " + ", ".join(f"l.{column}" for column in LISTING_COLUMNS)
+    + ", e.highlights, e.specifications, e.features "
+    "FROM listings l LEFT JOIN enrichments e ON e.link = l.link"
+)
+
+# Adds a history row unless the stored listing already has this price (and mileage, when known)
+APPEND_HISTORY = (
+    "INSERT INTO listing_history (link, observed_at, price, mileage, run_id) SELECT ?, ?, ?, ?, ? "
+    "WHERE NOT EXISTS (SELECT 1 FROM listings WHERE link = ? AND price IS ? AND (? IS NULL OR mileage IS ?))"
+)
+
+ORDER_COLUMNS = ("price", "mileage", "year", "last_seen", "first_seen")
+
+# SQLite's default limit on ? parameters per statement is 999
+_CHUNK_SIZE = 900
+
+# Full-text index over the searchable columns; its rowid is the listing's rowid
+TEXT_INDEX_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS listing_text USING fts5("
+    "title, highlights, specifications, features, tokenize = 'unicode61 remove_diacritics 2')"
+)
+INDEX_LISTINGS = (
+    "INSERT OR REPLACE INTO listing_text (rowid, title, highlights, specifications, features) "
+    "SELECT l.rowid, l.title, e.highlights, e.specifications, e.features "
+    "FROM listings l LEFT JOIN enrichments e ON e.link = l.link"
+)
+
+
+def listing_key(link):
+    """
+    The key a listing is stored under: its normalized URL, so tracking parameters don't create duplicates.
+    """
+    return DiskCache.normalize_listing_url(link)
+
+
+def _quote_term(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def build_text_query(include=(), exclude=(), phrases=(), require_all=True):
+    """
+    Builds a full-text query from plain terms, quoting each one so user input can't break the syntax.
+
+    Args:
+        include (list): Words that must appear (all of them, or any with require_all=False).
+        exclude (list): Words that must not appear.
+        phrases (list): Exact phrases treated like include terms.
+
+    Returns:
+        str: An FTS5 query for ListingStore.search, e.g. '("sport" AND "adaptive cruise") NOT "salvage"'.
+    """
+    terms = [_quote_term(term.strip()) for term in list(include) + list(phrases) if term and term.strip()]
+    if not terms:
+        raise ValueError("A full-text query needs at least one include term or phrase")
+    query = "(" + (" AND " if require_all else " OR ").join(terms) + ")"
+    for term in exclude:
+        if term and term.strip():
+            query += f" NOT {_quote_term(term.strip())}"
+    return query
+
+
+def _filter_conditions(make=None, model=None, min_year=None, max_year=None, min_price=None, max_price=None,
+                       max_mileage=None, seen_since=None):
+    conditions, parameters = [], []
+    for column, value in (("make", make), ("model", model)):
+        if value:
+            conditions.append(f"l.{column} = ? COLLATE NOCASE")
+            parameters.append(value)
+    for column, operator, value in (
+        ("year", ">=", min_year), ("year", "<=", max_year),
+        ("price", ">=", min_price), ("price", "<=", max_price),
+        ("mileage", "<=", max_mileage), ("last_seen", ">=", seen_since),
+    ):
+        if value is not None:
+            conditions.append(f"l.{column} {operator} ?")
+            parameters.append(value)
+    return conditions, parameters
+
+
+def _query_key(query):
+    # Same filters, same text: runs of one search can be found again by comparing strings
+    return json.dumps(query or {}, sort_keys=True)
+
+
+def _listing_from_row(row):
+    values = dict(zip(LISTING_COLUMNS, row[:len(LISTING_COLUMNS)]))
+    highlights, specifications, features = row[len(LISTING_COLUMNS):]
+    listing = Listing.Listing(
+        title=values["title"] or "",
+        price=values["price"],
+        location=values["location"] or "",
+        mileage=values["mileage"],
+        link=values["url"],
+        year=values["year"],
+        make=values["make"] or "",
+        model=values["model"] or "",
+        trim=values["trim"] or "",
+        drivetrain=values["drivetrain"] or "",
+        transmission=values["transmission"] or "",
+        highlights=json.loads(highlights) if highlights else None,
+        features=json.loads(features) if features else None,
+    )
+    if specifications:
+        listing.specifications = json.loads(specifications)
+    return listing
+
+
+class ListingStore:
+    """
+    Every listing ever scraped, in one SQLite file.
+
+    Listings are upserted by Link (normalized), so repeat searches update rows
+    instead of piling up CSV files; each search run records which listings it
+    returned, in order. Detail-page results live in their own enrichments table.
+    Safe to share between threads.
+
+    Usage:
+        with ListingStore.ListingStore() as store:
+            run_id = store.start_run(filters)
+            store.upsert_listings(listings, run_id)
+            cheap = store.query(make="ford", max_price=15000, order_by="price")
+    """
+
+    def __init__(self, path=LISTING_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self.connection.execute(statement)
+        try:
+            self.connection.execute(TEXT_INDEX_SCHEMA)
+            self.has_text_index = True
+            # Stores created before the index existed get it built once
+            index_empty = self.connection.execute("SELECT 1 FROM listing_text LIMIT 1").fetchone() is None
+            if index_empty and self.connection.execute("SELECT 1 FROM listings LIMIT 1").fetchone():
+                self.connection.execute(INDEX_LISTINGS)
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5: everything but search() still works
+            self.has_text_index = False
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start_run(self, query=None):
+        """
+        Records a new search run.
+
+        Args:
+            query (dict): The search filters, kept for reference.
+
+        Returns:
+            int: The run id.
+        """
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT INTO runs (started_at, query) VALUES (?, ?)", (time.time(), _query_key(query)))
+            self.connection.commit()
+            return cursor.lastrowid
+
+    def upsert_listings(self, listings, run_id=None):
+        """
+        Inserts new listings and refreshes the ones already stored, in one transaction.
+
+        Args:
+            listings (iterable): Listing records (or scraped dicts).
+            run_id (int): Run the listings were found in; their order is kept.
+
+        Returns:
+            int: Number of listings written.
+        """
+        now = time.time()
+        rows, run_rows, history_rows = [], [], []
+        for listing in listings:
+            if not isinstance(listing, Listing.Listing):
+                listing = Listing.Listing.from_row(listing)
+            if not listing.link:
+                continue
+            key = listing_key(listing.link)
+            rows.append((
+                key, listing.link, listing.title, listing.price, listing.location, listing.mileage,
+                listing.year, listing.make, listing.model, listing.trim, listing.drivetrain, listing.transmission,
+                now, now,
+            ))
+            if run_id is not None:
+                run_rows.append((run_id, key, len(run_rows)))
+            history_rows.append((key, now, listing.price, listing.mileage, run_id,
+                                 key, listing.price, listing.mileage, listing.mileage))
+
+        with self.lock:
+            with self.connection:
+                # History first: it compares against the values the upsert is about to replace
+                self.connection.executemany(APPEND_HISTORY, history_rows)
+                self.connection.executemany(UPSERT_LISTING, rows)
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO run_listings (run_id, link, position) VALUES (?, ?, ?)", run_rows)
+                self._index_text([(row[0],) for row in rows])
+        return len(rows)
+
+    def _index_text(self, keys):
+        # Re-indexes the given listings (a list of 1-tuples of keys); callers hold the lock and transaction
+        if self.has_text_index:
+            self.connection.executemany(INDEX_LISTINGS + " WHERE l.link = ?", keys)
+
+    def save_enrichment(self, link, details):
+        """
+        Stores a listing's Highlights/Specifications/Features (as returned by the deep search)
+        and copies the typed fields found in its specifications onto the listing.
+        """
+        self.save_enrichments([(link, details)])
+
+    def save_enrichments(self, enriched):
+        """
+        Like save_enrichment for many (link, details) pairs, in one transaction.
+        """
+        now = time.time()
+        enrichment_rows, update_rows, keys = [], [], []
+        for link, details in enriched:
+            listing = Listing.Listing(link=link)
+            listing.apply_details(details)
+            key = listing_key(link)
+            enrichment_rows.append((key, json.dumps(listing.highlights), json.dumps(listing.specifications),
+                                    json.dumps(listing.features), now))
+            update_rows.append([getattr(listing, column) for column in _KEEP_IF_EMPTY] + [listing.mileage, key])
+            keys.append((key,))
+
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO enrichments (link, highlights, specifications, features, enriched_at) "
+                    "VALUES (?, ?, ?, ?, ?)", enrichment_rows)
+                self.connection.executemany(
+                    "UPDATE listings SET "
+                    + ", ".join(f"{column} = COALESCE(NULLIF(?, ''), {column})" for column in _KEEP_IF_EMPTY)
+                    + ", mileage = COALESCE(mileage, ?) WHERE link = ?", update_rows)
+                self._index_text(keys)
+
+    def enrichment(self, link):
+        """
+        Returns the stored detail columns of a listing, or None if it was never enriched.
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT highlights, specifications, features FROM enrichments WHERE link = ?",
+                (listing_key(link),)).fetchone()
+        if row is None:
+            return None
+        highlights, specifications, features = (json.loads(value) for value in row)
+        return {
+            "Highlights": "; ".join(highlights),
+            "Specifications": Listing.format_specifications(specifications),
+            "Features": "; ".join(features),
+        }
+
+    def run_listings(self, run_id):
+        """
+        Yields the listings of one run as Listing records, in the order they were found.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                SELECT_LISTINGS + " JOIN run_listings r ON r.link = l.link WHERE r.run_id = ? ORDER BY r.position",
+                (run_id,)).fetchall()
+        for row in rows:
+            yield _listing_from_row(row)
+
+    def query(self, make=None, model=None, min_year=None, max_year=None, min_price=None, max_price=None,
+              max_mileage=None, seen_since=None, order_by="price", descending=False, limit=None):
+        """
+        Finds stored listings matching every given filter, using the indexes.
+
+        Args:
+            make, model (str): Case-insensitive match.
+            min_year, max_year, min_price, max_price, max_mileage (int): Inclusive bounds.
+            seen_since (float): Only listings seen at or after this Unix time.
+            order_by (str): One of price, mileage, year, last_seen, first_seen.
+            descending (bool): Sort largest first.
+            limit (int): Maximum number of listings.
+
+        Returns:
+            list: Listing records.
+        """
+        if order_by not in ORDER_COLUMNS:
+            raise ValueError(f"Cannot order listings by {order_by!r}")
+        conditions, parameters = _filter_conditions(
+            make, model, min_year, max_year, min_price, max_price, max_mileage, seen_since)
+
+        # Listings without a value for the sort column go last. Fetching them separately keeps
+        # the ORDER BY a plain column, so SQLite can walk its index and stop at the limit.
+        rows = []
+        with self.lock:
+            for null_check, order in ((f"l.{order_by} IS NOT NULL", f" ORDER BY l.{order_by} {'DESC' if descending else 'ASC'}"),
+                                      (f"l.{order_by} IS NULL", "")):
+                remaining = limit - len(rows) if limit else None
+                if remaining is not None and remaining <= 0:
+                    break
+                sql = SELECT_LISTINGS + " WHERE " + " AND ".join(conditions + [null_check]) + order
+                if remaining:
+                    sql += f" LIMIT {int(remaining)}"
+                rows.extend(self.connection.execute(sql, parameters).fetchall())
+        return [_listing_from_row(row) for row in rows]
+
+    def listing_states(self, links):
+        """
+        Returns the stored price, mileage and first-seen time of the given listings.
+
+        Returns:
+            dict: Listing key -> (price, mileage, first_seen), for listings already stored.
+        """
+        keys = list({listing_key(link) for link in links})
+        states = {}
+        with self.lock:
+            for start in range(0, len(keys), _CHUNK_SIZE):
+                chunk = keys[start:start + _CHUNK_SIZE]
+                rows = self.connection.execute(
+                    f"SELECT link, price, mileage, first_seen FROM listings WHERE link IN ({', '.join('?' for _ in chunk)})",
+                    chunk).fetchall()
+                states.update((row[0], row[1:]) for row in rows)
+        return states
+
+    def previous_run_id(self, query, before_run_id=None):
+        """
+        Returns the id of the latest earlier run of the same search (same filters), or None.
+        """
+        sql = "SELECT MAX(id) FROM runs WHERE query = ?"
+        parameters = [_query_key(query)]
+        if before_run_id is not None:
+            sql += " AND id < ?"
+            parameters.append(before_run_id)
+        with self.lock:
+            return self.connection.execute(sql, parameters).fetchone()[0]
+
+    def run_keys(self, run_id):
+        """
+        Returns the keys of a run's listings, in the order they were found.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT link FROM run_listings WHERE run_id = ? ORDER BY position", (run_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def listings_by_key(self, keys):
+        """
+        Returns stored listings by key, as Listing records.
+        """
+        keys = list(keys)
+        listings = {}
+        with self.lock:
+            for start in range(0, len(keys), _CHUNK_SIZE):
+                chunk = keys[start:start + _CHUNK_SIZE]
+                rows = self.connection.execute(
+                    SELECT_LISTINGS + f" WHERE l.link IN ({', '.join('?' for _ in chunk)})", chunk).fetchall()
+                for row in rows:
+                    listings[row[0]] = _listing_from_row(row)
+        return listings
+
+    def price_history(self, link):
+        """
+        Returns a listing's price and mileage changes, oldest first.
+
+        Returns:
+            list: (observed_at, price, mileage) tuples.
+        """
+        with self.lock:
+            return self.connection.execute(
+                "SELECT observed_at, price, mileage FROM listing_history WHERE link = ? ORDER BY observed_at",
+                (listing_key(link),)).fetchall()
+
+    def search(self, text_query, make=None, model=None, min_year=None, max_year=None, min_price=None,
+               max_price=None, max_mileage=None, seen_since=None, limit=100):
+        """
+        Full-text search over the title, highlights, specifications and features of
+        every stored listing, combined with the same filters as query().
+
+        Args:
+            text_query (str): FTS5 query: words, "quoted phrases", AND/OR/NOT, prefix*
+                and column filters (e.g. features: heated). build_text_query makes
+                one from plain terms.
+            limit (int): Maximum number of listings (best matches first).
+
+        Returns:
+            list: Listing records, best match first.
+        """
+        if not self.has_text_index:
+            raise RuntimeError("This SQLite build has no FTS5; full-text search is unavailable")
+        conditions, parameters = _filter_conditions(
+            make, model, min_year, max_year, min_price, max_price, max_mileage, seen_since)
+        sql = (SELECT_LISTINGS + " JOIN listing_text t ON t.rowid = l.rowid WHERE listing_text MATCH ?"
+               + "".join(" AND " + condition for condition in conditions) + " ORDER BY t.rank")
+        parameters = [text_query] + parameters
+        if limit:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        with self.lock:
+            rows = self.connection.execute(sql, parameters).fetchall()
+        return [_listing_from_row(row) for row in rows]
+
+    def rebuild_text_index(self):
+        """
+        Rebuilds the full-text index from scratch (e.g. for a store created before it existed).
+        """
+        if not self.has_text_index:
+            return
+        with self.lock:
+            with self.connection:
+                self.connection.execute("DELETE FROM listing_text")
+                self.connection.execute(INDEX_LISTINGS)
+
+    def export_csv(self, file_path, run_id=None, listings=None):
+        """
+        Writes a run's listings (or the given ones) to a CSV in the usual column layout.
+        """
+        listings = list(self.run_listings(run_id) if listings is None else listings)
+        fieldnames = Listing.csv_fieldnames(Listing.LISTING_COLUMNS + Listing.DETAIL_COLUMNS)
+        Listing.write_listings_csv(listings, file_path, fieldnames)
+        return file_path
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def benchmark_queries(listing_count=200000, repeat=20):
+    """
+    Fills a throwaway store with synthetic listings (months of scrapes' worth) and
+    times typical queries against it.
+
+    Returns:
+        dict: Query name -> average milliseconds.
+    """
+    makes = {"ford": ["fusion", "escape", "focus"], "honda": ["civic", "accord"], "toyota": ["corolla", "camry"]}
+    directory = tempfile.mkdtemp()
+    store = ListingStore(os.path.join(directory, "benchmark.sqlite"))
+    generator = random.Random(0)
+
+    features = ["Adaptive Cruise Control", "Heated Seats", "Backup Camera", "Bluetooth", "Sunroof",
+                "Remote Start", "Navigation", "Lane Keeping Assist", "Leather Seats", "Apple CarPlay"]
+    features += [f"Option {index}" for index in range(300)]
+
+    start_time = time.perf_counter()
+    batch, enriched = [], []
+    for index in range(listing_count):
+        make = generator.choice(list(makes))
+        model = generator.choice(makes[make])
+        link = f"https://www.autotrader.ca/a/{make}/{model}/kanata/ontario/5_{index}_bench/"
+        batch.append(Listing.Listing(
+            title=f"{make} {model} listing {index}", price=generator.randint(3000, 60000), location="Kanata",
+            mileage=generator.randint(0, 300000), year=generator.randint(2005, 2024), make=make, model=model,
+            link=link,
+        ))
+        enriched.append((link, {
+            "Highlights": "; ".join(generator.sample(features[:10], 3)),
+            "Specifications": f"Trim: {generator.choice(['S', 'SE', 'Titanium'])}; Drivetrain: {generator.choice(['FWD', 'AWD'])}",
+            "Features": "; ".join(generator.sample(features, 15)),
+        }))
+        if len(batch) == 10000:
+            store.upsert_listings(batch)
+            store.save_enrichments(enriched)
+            batch, enriched = [], []
+    store.upsert_listings(batch)
+    store.save_enrichments(enriched)
+    print(f"Inserted and indexed {listing_count} listings in {time.perf_counter() - start_time:.1f}s")
+
+    queries = {
+        "make/model/year range": lambda: store.query(make="ford", model="fusion", min_year=2017, max_year=2019),
+        "price range, cheapest 50": lambda: store.query(min_price=10000, max_price=15000, limit=50),
+        "low mileage, newest 50": lambda: store.query(max_mileage=20000, order_by="year", descending=True, limit=50),
+        "text: phrase + years": lambda: store.search(
+            '"adaptive cruise control"', make="ford", model="fusion", min_year=2017, max_year=2019),
+        "text: boolean, best 50": lambda: store.search(
+            build_text_query(["heated seats", "sunroof"], exclude=["navigation"]), max_price=20000, limit=50),
+    }
+    results = {}
+    for name, run_query in queries.items():
+        start_time = time.perf_counter()
+        for _ in range(repeat):
+            matched = run_query()
+        results[name] = (time.perf_counter() - start_time) / repeat * 1000
+        print(f"{name:>26}: {results[name]:7.2f} ms ({len(matched)} listings)")
+    store.close()
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_queries()
@@ -0,0 +1,279 @@
+import difflib
+import re
+import threading
+import time
+
+from bs4 import BeautifulSoup
+
+import CarDataCollector
+import DetailFetcher
+import DiskCache
+import ListingParser
+import RateLimiter
+
+CATALOG_PATH = "catalog_cache.sqlite"
+# Lists older than this are still answered from disk, and refreshed in the background
+CATALOG_TTL_SECONDS = 7 * 24 * 3600
+# Lists older than this are dropped and fetched again before answering
+CATALOG_MAX_AGE_SECONDS = 90 * 24 * 3600
+CATALOG_MAX_BYTES = 5 * 1024 * 1024
+
+# difflib ratio a typed make/model must reach to be taken as a name
+FUZZY_CUTOFF = 0.75
+
+_COUNT_PATTERN = re.compile(r"\((\d[\d,]*)\)")
+
+
+def parse_catalog_options(html, list_id):
+    """
+    Reads the entries of a make or model dropdown (id rfMakes or rfModel) from page HTML.
+
+    Handles both the <ul class="list-options"> form with a count per entry (see
+    CarDataCollector.extract_car_companies) and a plain <select>.
+
+    Returns:
+        list: (name, listing count or None) pairs, in page order.
+    """
+    container = BeautifulSoup(html, "html.parser").find(id=list_id)
+    if container is None:
+        return []
+    entries = []
+    for item in container.find_all(["li", "option"]):
+        text = item.get_text(" ", strip=True)
+        name = item.get("data-dropdownvalue") or text.split("(")[0].strip()
+        if not name or (item.name == "option" and not item.get("value")):
+            continue  # "Any Make" style placeholders have no value
+        count = _COUNT_PATTERN.search(text)
+        entries.append((name, int(count.group(1).replace(",", "")) if count else None))
+    return entries
+
+
+def _fetch_options(url, list_id, session=None, timeout=15):
+    session = session or DetailFetcher.create_session(pool_size=1)
+    with RateLimiter.throttled():
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+    return parse_catalog_options(response.text, list_id)
+
+
+def fetch_makes(session=None):
+    """
+    Fetches every make with its listing count, from the home page's static HTML;
+    falls back to the browser (CarDataCollector) when the list isn't server-rendered.
+    """
+    try:
+        makes = _fetch_options(ListingParser.AUTOTRADER_BASE_URL + "/", "rfMakes", session)
+    except Exception as e:
+        print(f"Fetching makes over HTTP failed: {e}")
+        makes = []
+    if not makes:
+        makes = [(name, None) for name in CarDataCollector.get_makes_from_autotrader()]
+    return makes
+
+
+def fetch_models(make, session=None):
+    """
+    Fetches every model of a make with its listing count, from the make's results
+    page; falls back to the browser (CarDataCollector) like fetch_makes.
+    """
+    make_encoded = make.replace(" ", "%20").lower()
+    try:
+        models = _fetch_options(f"{ListingParser.AUTOTRADER_BASE_URL}/cars/{make_encoded}/", "rfModel", session)
+    except Exception as e:
+        print(f"Fetching models of {make} over HTTP failed: {e}")
+        models = []
+    if not models:
+        models = [(name, None) for name in CarDataCollector.get_models_from_autotrader(make)]
+    return models
+
+
+def _compact(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+def fuzzy_match(text, names, cutoff=FUZZY_CUTOFF):
+    """
+    Returns the name the user most likely meant, or None.
+
+    Tries, in order: a case-insensitive match, a match ignoring spaces and
+    punctuation ("mercedes benz" -> "Mercedes-Benz"), a unique prefix ("volks" ->
+    "Volkswagen"), then the closest name by difflib ratio ("toyta" -> "Toyota").
+    """
+    key = " ".join((text or "").lower().split())
+    if not key:
+        return None
+    lowered = {name.lower(): name for name in names}
+    if key in lowered:
+        return lowered[key]
+    compact = {_compact(name): name for name in names}
+    if _compact(key) in compact:
+        return compact[_compact(key)]
+    prefixed = [name for lower, name in lowered.items() if lower.startswith(key)]
+    if len(prefixed) == 1:
+        return prefixed[0]
+    close = difflib.get_close_matches(key, list(lowered), n=1, cutoff=cutoff)
+    return lowered[close[0]] if close else None
+
+
+def suggestions(text, names, count=5):
+    """
+    Returns up to count names that look like the text, best first, for "did you mean" prompts.
+    """
+    lowered = {name.lower(): name for name in names}
+    close = difflib.get_close_matches(" ".join((text or "").lower().split()), list(lowered), n=count, cutoff=0.4)
+    return [lowered[name] for name in close]
+
+
+class MakeModelCatalog:
+    """
+    Makes and models (with listing counts) kept on disk, so a new query doesn't
+    start a browser just to list them.
+
+    Lists are stored in a DiskCache with the time they were fetched. A lookup
+    answers from memory or disk right away; a list older than ttl_seconds is
+    still returned, and refreshed on a background thread for the next lookup.
+    Only a list never fetched (or older than CATALOG_MAX_AGE_SECONDS) is fetched
+    before answering. refresh() fetches on demand.
+    """
+
+    def __init__(self, path=CATALOG_PATH, ttl_seconds=CATALOG_TTL_SECONDS, makes_fetcher=fetch_makes,
+                 models_fetcher=fetch_models):
+        self.cache = DiskCache.DiskCache(path, CATALOG_MAX_AGE_SECONDS, CATALOG_MAX_BYTES)
+        self.ttl_seconds = ttl_seconds
+        self.makes_fetcher = makes_fetcher
+        self.models_fetcher = models_fetcher
+        self.entries = {}
+        self.refreshing = {}
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.cache.get(key)
+            if entry is not None:
+                self.entries[key] = entry
+        return entry
+
+    def _fetch(self, key, fetch):
+        items = [list(item) for item in fetch()]
+        if not items:
+            return None  # keep the old list rather than caching a failed fetch
+        entry = {"fetched_at": time.time(), "items": items}
+        self.cache.set(key, entry)
+        self.entries[key] = entry
+        return entry
+
+    def _refresh_in_background(self, key, fetch):
+        with self.lock:
+            if key in self.refreshing:
+                return self.refreshing[key]
+
+            def refresh():
+                try:
+                    self._fetch(key, fetch)
+                except Exception as e:
+                    print(f"Refreshing the catalog ({key}) failed: {e}")
+                finally:
+                    with self.lock:
+                        self.refreshing.pop(key, None)
+
+            thread = threading.Thread(target=refresh, name=f"catalog-refresh-{key}", daemon=True)
+            self.refreshing[key] = thread
+        thread.start()
+        return thread
+
+    def _items(self, key, fetch):
+        entry = self._entry(key)
+        if entry is None:
+            entry = self._fetch(key, fetch)
+            return [tuple(item) for item in entry["items"]] if entry else []
+        if time.time() - entry["fetched_at"] > self.ttl_seconds:
+            self._refresh_in_background(key, fetch)
+        return [tuple(item) for item in entry["items"]]
+
+    def make_counts(self):
+        """
+        Returns (make, listing count) pairs.
+        """
+        return self._items("makes", self.makes_fetcher)
+
+    def model_counts(self, make):
+        """
+        Returns (model, listing count) pairs for a make (any spelling fuzzy_match accepts).
+        """
+        make = self.match_make(make) or make
+        return self._items(f"models:{make.lower()}", lambda: self.models_fetcher(make))
+
+    def makes(self):
+        return [name for name, _ in self.make_counts()]
+
+    def models(self, make):
+        return [name for name, _ in self.model_counts(make)]
+
+    def match_make(self, text):
+        """
+        Returns the catalog make the text most likely means, or None.
+        """
+        return fuzzy_match(text, [name for name, _ in self._items("makes", self.makes_fetcher)])
+
+    def match_model(self, make, text):
+        """
+        Returns the model of make the text most likely means, or None.
+        """
+        return fuzzy_match(text, self.models(make))
+
+    def refresh(self, make=None):
+        """
+        Fetches the makes (or one make's models) again now, whatever their age.
+        """
+        if make is None:
+            self._fetch("makes", self.makes_fetcher)
+        else:
+            make = self.match_make(make) or make
+            self._fetch(f"models:{make.lower()}", lambda: self.models_fetcher(make))
+
+    def refresh_in_background(self, make=None):
+        """
+        Starts refresh() on a background thread; returns the thread.
+        """
+        if make is None:
+            return self._refresh_in_background("makes", self.makes_fetcher)
+        make = self.match_make(make) or make
+        return self._refresh_in_background(f"models:{make.lower()}", lambda: self.models_fetcher(make))
+
+    def close(self):
+        with self.lock:
+            threads = list(self.refreshing.values())
+        for thread in threads:
+            thread.join()
+        self.cache.close()
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """
+    Returns the process's catalog, opening CATALOG_PATH on first use.
+    """
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = MakeModelCatalog()
+        return _catalog
+
+
+if __name__ == "__main__":
+    catalog = get_catalog()
+    for label in ("First lookup", "Second lookup"):
+        start_time = time.perf_counter()
+        makes = catalog.make_counts()
+        print(f"{label}: {len(makes)} makes in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+    print(catalog.match_make("toyta"), catalog.match_make("mercedes benz"), catalog.match_make("volks"))
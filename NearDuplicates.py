@@ -0,0 +1,289 @@
+import hashlib
+import random
+import re
+import time
+
+import FeatureVocabulary
+import Listing
+
+# MinHash signature length, split into LSH_BANDS bands of SIGNATURE_SIZE // LSH_BANDS values.
+# Two listings share a band (become candidates) with probability 1 - (1 - J^4)^8 for token
+# Jaccard similarity J: ~0.98 at J=0.8, ~0.7 at J=0.6, ~0.05 at J=0.3.
+SIGNATURE_SIZE = 32
+LSH_BANDS = 8
+
+# Candidates are only duplicates if their token sets are at least this similar...
+SIMILARITY_THRESHOLD = 0.75
+# ...and their odometers are within this many km (or this fraction of the reading). A relisted
+# car gains a few hundred km at most; two cars of one dealer's fleet are often 1,000 km apart.
+MILEAGE_TOLERANCE_KM = 500
+MILEAGE_TOLERANCE_RATIO = 0.005
+
+# Specifications (from the deep search) that identify a vehicle: listings where both are known
+# and differ are never the same vehicle, and listings with the same VIN always are
+IDENTITY_SPECIFICATIONS = ("VIN", "Exterior Colour")
+
+# Mileage and price are tokenized on two offset grids, so close values share a token
+MILEAGE_BUCKET_KM = 2000
+PRICE_BUCKET = 1000
+
+# Candidates compared per bucket, newest first, so one crowded bucket can't make a run quadratic
+MAX_BUCKET_CHECKS = 50
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def _bucket_tokens(name, value, size):
+    return (f"{name}:{value // size}", f"{name}~{(value + size // 2) // size}")
+
+
+def listing_tokens(listing):
+    """
+    Returns the set of tokens a listing's signature is built from: title words,
+    trim, year/make/model, location, mileage and price buckets, and features.
+    """
+    tokens = {f"t:{word}" for word in _WORD_PATTERN.findall(listing.title.lower())}
+    for name in ("trim", "make", "model", "location"):
+        value = getattr(listing, name)
+        if value:
+            tokens.add(f"{name}:{value.lower()}")
+    if listing.year is not None:
+        tokens.add(f"year:{listing.year}")
+    if listing.mileage is not None:
+        tokens.update(_bucket_tokens("km", listing.mileage, MILEAGE_BUCKET_KM))
+    if listing.price is not None:
+        tokens.update(_bucket_tokens("price", listing.price, PRICE_BUCKET))
+    # Feature IDs from the shared vocabulary, so equal features give equal short tokens
+    tokens.update(f"f:{feature_id}" for feature_id in listing.highlight_ids + listing.feature_ids)
+    return tokens
+
+
+def jaccard(tokens, other_tokens):
+    if not tokens and not other_tokens:
+        return 1.0
+    return len(tokens & other_tokens) / len(tokens | other_tokens)
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures with SIGNATURE_SIZE universal hash functions.
+
+    Each distinct token's hash values are computed once and cached; listings
+    share most tokens (title words, buckets, features), so a signature is mostly
+    an element-wise min over cached tuples.
+    """
+
+    def __init__(self, size=SIGNATURE_SIZE, seed=0):
+        generator = random.Random(seed)
+        self.coefficients = [(generator.randrange(1, _MERSENNE_PRIME), generator.randrange(_MERSENNE_PRIME))
+                             for _ in range(size)]
+        self.token_hashes = {}
+
+    def token_hash(self, token):
+        values = self.token_hashes.get(token)
+        if values is None:
+            base = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            values = tuple((a * base + b) % _MERSENNE_PRIME for a, b in self.coefficients)
+            self.token_hashes[token] = values
+        return values
+
+    def signature(self, tokens):
+        if not tokens:
+            return (_MERSENNE_PRIME,) * len(self.coefficients)
+        return tuple(map(min, zip(*(self.token_hash(token) for token in tokens))))
+
+
+class NearDuplicateIndex:
+    """
+    Finds listings that are the same vehicle under a different link (dealer relists).
+
+    Listings are added one at a time. Each is hashed into LSH_BANDS buckets; only
+    listings sharing a bucket are compared, so the cost grows with the number of
+    listings rather than the number of pairs. A candidate is a duplicate when the
+    token Jaccard similarity reaches the threshold, the odometers are within
+    tolerance and year, make, model, VIN and colour (when both are known) agree;
+    two listings with the same VIN always are.
+
+    Run it on deep-searched listings: before the deep search there is no VIN or
+    feature list, and two similar cars at one dealer can look like a relist.
+
+    Usage:
+        index = NearDuplicateIndex()
+        for listing in listings:
+            if index.add(listing) is None:
+                keep(listing)
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, bands=LSH_BANDS, hasher=None):
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.bands = bands
+        self.rows_per_band = len(self.hasher.coefficients) // bands
+        self.buckets = {}
+        self.comparisons = 0
+
+    def _band_keys(self, signature):
+        rows = self.rows_per_band
+        return [(band, signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def is_duplicate(self, listing, tokens, other, other_tokens):
+        vin, other_vin = listing.specifications.get("VIN"), other.specifications.get("VIN")
+        if vin and other_vin:
+            return vin.strip().upper() == other_vin.strip().upper()
+        for label in IDENTITY_SPECIFICATIONS:
+            value, other_value = listing.specifications.get(label), other.specifications.get(label)
+            if value and other_value and value.strip().lower() != other_value.strip().lower():
+                return False
+        for field in ("year", "make", "model"):
+            value, other_value = getattr(listing, field), getattr(other, field)
+            if value and other_value and str(value).lower() != str(other_value).lower():
+                return False
+        if listing.mileage is not None and other.mileage is not None:
+            tolerance = max(MILEAGE_TOLERANCE_KM, MILEAGE_TOLERANCE_RATIO * max(listing.mileage, other.mileage))
+            if abs(listing.mileage - other.mileage) > tolerance:
+                return False
+        return jaccard(tokens, other_tokens) >= self.threshold
+
+    def find(self, listing, tokens=None, band_keys=None):
+        """
+        Returns an indexed listing the given one duplicates, or None.
+        """
+        tokens = tokens if tokens is not None else listing_tokens(listing)
+        band_keys = band_keys if band_keys is not None else self._band_keys(self.hasher.signature(tokens))
+        checked = set()
+        for band_key in band_keys:
+            for other, other_tokens in reversed(self.buckets.get(band_key, ())[-MAX_BUCKET_CHECKS:]):
+                if id(other) in checked:
+                    continue
+                checked.add(id(other))
+                self.comparisons += 1
+                if self.is_duplicate(listing, tokens, other, other_tokens):
+                    return other
+        return None
+
+    def add(self, listing):
+        """
+        Indexes a listing unless it duplicates one already indexed.
+
+        Returns:
+            Listing or None: The earlier listing it duplicates, or None if it was indexed.
+        """
+        tokens = listing_tokens(listing)
+        band_keys = self._band_keys(self.hasher.signature(tokens))
+        original = self.find(listing, tokens, band_keys)
+        if original is None:
+            entry = (listing, tokens)
+            for band_key in band_keys:
+                self.buckets.setdefault(band_key, []).append(entry)
+        return original
+
+
+def find_near_duplicates(listings, threshold=SIMILARITY_THRESHOLD):
+    """
+    Returns (kept listing, duplicate) pairs; the first listing of each vehicle is kept.
+    """
+    index = NearDuplicateIndex(threshold)
+    pairs = []
+    for listing in listings:
+        original = index.add(listing)
+        if original is not None:
+            pairs.append((original, listing))
+    return pairs
+
+
+def _synthetic_listings(count, relist_ratio=0.1, seed=0):
+    """
+    Returns (listings, set of (original index, relist index)) with relisted copies under new links.
+    """
+    generator = random.Random(seed)
+    vocabulary = FeatureVocabulary.get_vocabulary()
+    makes = {"ford": ["fusion", "escape", "f-150"], "honda": ["civic", "accord", "cr-v"], "tesla": ["model 3", "model y"],
+             "toyota": ["corolla", "camry", "rav4"], "mazda": ["mazda3", "cx-5"]}
+    trims = ["SE", "SEL", "Titanium", "Sport", "LX", "EX", "Touring", "Limited", "Long Range"]
+    cities = ["Ottawa", "Kanata", "Toronto", "Montreal", "Kingston", "Gatineau"]
+    features = vocabulary.encode(f"Synthetic feature {index}" for index in range(300))
+
+    listings, relists = [], set()
+    while len(listings) < count:
+        if listings and generator.random() < relist_ratio:
+            original_index = generator.randrange(len(listings))
+            original = listings[original_index]
+            relisted = Listing.Listing(
+                title=original.title, price=original.price - generator.choice([0, 0, 500, 1000]),
+                location=original.location, mileage=original.mileage + generator.randrange(0, 300),
+                link=f"https://www.autotrader.ca/a/{original.make}/{original.model}/x/on/{len(listings)}/",
+                year=original.year, make=original.make, model=original.model, trim=original.trim)
+            relisted.feature_ids = original.feature_ids
+            relists.add((original_index, len(listings)))
+            listings.append(relisted)
+            continue
+        make = generator.choice(list(makes))
+        model = generator.choice(makes[make])
+        year = generator.randrange(2010, 2025)
+        trim = generator.choice(trims)
+        listing = Listing.Listing(
+            title=f"{year} {make.title()} {model.title()} {trim}", price=generator.randrange(5000, 60000, 100),
+            location=f"{generator.choice(cities)}, ON", mileage=generator.randrange(1000, 250000),
+            link=f"https://www.autotrader.ca/a/{make}/{model}/x/on/{len(listings)}/",
+            year=year, make=make, model=model, trim=trim)
+        listing.feature_ids = tuple(generator.sample(features, 30))
+        listings.append(listing)
+    return listings, relists
+
+
+def _pairwise_duplicates(listings):
+    index = NearDuplicateIndex()
+    tokens = [listing_tokens(listing) for listing in listings]
+    pairs = 0
+    for i in range(len(listings)):
+        for j in range(i):
+            if index.is_duplicate(listings[i], tokens[i], listings[j], tokens[j]):
+                pairs += 1
+                break
+    return pairs
+
+
+def benchmark_near_duplicates(sizes=(10000, 100000), pairwise_size=2000):
+    """
+    Times LSH near-duplicate detection on synthetic listings with 10% relists,
+    with recall/precision against the known relists, and times all-pairs
+    comparison on pairwise_size listings (extrapolated quadratically to each size).
+
+    Returns:
+        dict: Size -> seconds, comparisons, recall and precision.
+    """
+    sample, _ = _synthetic_listings(pairwise_size)
+    start_time = time.perf_counter()
+    _pairwise_duplicates(sample)
+    pairwise_seconds = time.perf_counter() - start_time
+
+    results = {}
+    for size in sizes:
+        listings, relists = _synthetic_listings(size)
+        index = NearDuplicateIndex()
+        start_time = time.perf_counter()
+        found = set()
+        for position, listing in enumerate(listings):
+            original = index.add(listing)
+            if original is not None:
+                found.add(position)
+        seconds = time.perf_counter() - start_time
+        # A relist of a relist is found against the first listing, so score by relisted position
+        expected = {relist for _, relist in relists}
+        true_positives = len(found & expected)
+        results[size] = {
+            "seconds": seconds,
+            "comparisons": index.comparisons,
+            "recall": true_positives / len(expected) if expected else 1.0,
+            "precision": true_positives / len(found) if found else 1.0,
+        }
+        estimated_pairwise = pairwise_seconds * (size / pairwise_size) ** 2
+        print(f"{size} listings: LSH {seconds:.2f}s, {index.comparisons} comparisons, "
+              f"recall {results[size]['recall']:.3f}, precision {results[size]['precision']:.3f}; "
+              f"all pairs ~{estimated_pairwise:.0f}s (measured {pairwise_seconds:.2f}s at {pairwise_size})")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_near_duplicates()
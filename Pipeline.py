@@ -0,0 +1,200 @@
+import contextlib
+import csv
+import os
+import time
+
+import Autotrader_DeepSearch
+import BrowserFactory
+import BrowserPool
+import CSVCleanup
+import DealScoring
+import DetailParser
+import DiskCache
+import KeywordMatcher
+import Listing
+import ListingStore
+import NearDuplicates
+import PipelineMetrics
+
+# Columns of the pipeline's CSV output
+OUTPUT_FIELDNAMES = Listing.csv_fieldnames(Listing.LISTING_COLUMNS + Listing.DETAIL_COLUMNS) + DealScoring.SCORE_COLUMNS
+
+
+def dedup(listings):
+    """
+    Stage: drops listings whose link (normalized) was already seen, and listings without a link.
+    """
+    metrics = PipelineMetrics.get_metrics().stage("dedup")
+    seen_links = set()
+    for listing in listings:
+        start_time = time.perf_counter()
+        link = DiskCache.normalize_listing_url(listing.link) if listing.link else None
+        unique = link is not None and link not in seen_links
+        if unique:
+            seen_links.add(link)
+        metrics.record(time.perf_counter() - start_time)
+        if unique:
+            yield listing
+
+
+def drop_near_duplicates(listings):
+    """
+    Stage: drops relists of a vehicle already seen under another link (see NearDuplicates).
+
+    Runs after the deep search, so the comparison has the VIN, trim and features:
+    listings with different VINs are never merged. Every dropped listing is printed
+    with the one it duplicates.
+    """
+    metrics = PipelineMetrics.get_metrics().stage("near_duplicates")
+    index = NearDuplicates.NearDuplicateIndex()
+    for listing in listings:
+        start_time = time.perf_counter()
+        original = index.add(listing)
+        metrics.record(time.perf_counter() - start_time)
+        if original is None:
+            yield listing
+            continue
+        PipelineMetrics.get_metrics().add("near_duplicates", 1)
+        print(f"Dropped near duplicate {listing.link} ({listing.title}, {listing.price_text}, {listing.mileage_text}): "
+              f"same vehicle as {original.link}")
+
+
+def deep_search(listings, driver_path=BrowserFactory.CHROMEDRIVER_PATH, workers=BrowserPool.DEFAULT_WORKERS,
+                store=None, total=None, headless=True, http_first=True,
+                cache_path=Autotrader_DeepSearch.DETAIL_CACHE_PATH, reuse_keys=None):
+    """
+    Stage: adds the detail page's highlights, specifications and features to each listing.
+
+    Listings are enriched concurrently (see Autotrader_DeepSearch.enrich_stream) and
+    come out in input order. Details are saved to the listing store when one is given;
+    a rerun after a crash gets the finished pages back from the detail cache.
+    Listings whose key is in reuse_keys (unchanged since the last run, see
+    ListingDelta) get their stored details instead, when the store has them.
+    """
+    known_details = None
+    if store is not None and reuse_keys:
+        def known_details(listing):
+            if ListingStore.listing_key(listing.link) in reuse_keys:
+                return store.enrichment(listing.link)
+            return None
+
+    enriched = Autotrader_DeepSearch.enrich_stream(
+        listings, driver_path, workers, headless=headless, http_first=http_first, cache_path=cache_path, total=total,
+        known_details=known_details)
+    with contextlib.closing(enriched):
+        for listing, details in enriched:
+            listing.apply_details(details)
+            if store is not None and details != DetailParser.EMPTY_DETAILS:
+                store.save_enrichment(listing.link, details)
+            yield listing
+
+
+def cleanup(listings):
+    """
+    Stage: drops features repeated across a listing's highlights and features.
+    """
+    metrics = PipelineMetrics.get_metrics().stage("cleanup")
+    for listing in listings:
+        start_time = time.perf_counter()
+        cleaned = CSVCleanup.clean_listing_features(listing)
+        metrics.record(time.perf_counter() - start_time)
+        yield cleaned
+
+
+def keyword_filter(listings, keyword="null", exclusions=()):
+    """
+    Stage: keeps only listings that have the keyword as a whole word ("null" keeps all)
+    and none of the exclusions. The keyword is looked for in every column, the
+    exclusions only in KeywordMatcher.EXCLUSION_COLUMNS (Title and Trim).
+    A KeywordMatcher can be passed as keyword for any other combination.
+    """
+    metrics = PipelineMetrics.get_metrics().stage("keyword_filter")
+    if isinstance(keyword, KeywordMatcher.KeywordMatcher):
+        matcher = keyword
+    else:
+        matcher = KeywordMatcher.KeywordMatcher.from_keyword(keyword, exclusions)
+    for listing in listings:
+        start_time = time.perf_counter()
+        matches = matcher.matches_listing(listing)
+        metrics.record(time.perf_counter() - start_time)
+        if matches:
+            yield listing
+
+
+def score_deals(listings):
+    """
+    Stage: scores each listing's price against comparable listings (see DealScoring)
+    and yields them best deal first. Ranking needs every listing, so this stage
+    waits for the previous ones to finish.
+    """
+    metrics = PipelineMetrics.get_metrics().stage("deal_scoring")
+    listings = list(listings)
+    start_time = time.perf_counter()
+    ranked = DealScoring.score_listings(listings)
+    metrics.record(time.perf_counter() - start_time)
+    yield from ranked
+
+
+def write_csv(listings, file_path, fieldnames=OUTPUT_FIELDNAMES):
+    """
+    Sink: writes each listing to the CSV as it arrives. The file only replaces
+    file_path once every listing is written.
+
+    Returns:
+        int: Number of listings written.
+    """
+    partial_path = file_path + ".partial"
+    count = 0
+    with open(partial_path, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for listing in listings:
+            writer.writerow(listing.to_row())
+            count += 1
+    os.replace(partial_path, file_path)
+    return count
+
+
+def run_pipeline(listings, output_csv, keyword="null", store=None, driver_path=BrowserFactory.CHROMEDRIVER_PATH,
+                 workers=BrowserPool.DEFAULT_WORKERS, exclusions=(), delta=None, rank=True,
+                 cache_path=Autotrader_DeepSearch.DETAIL_CACHE_PATH):
+    """
+    Streams listings through dedup, deep search, cleanup, near-duplicate removal and the keyword filter into one CSV,
+    ranked best deal first (see score_deals) unless rank is False.
+
+    Each listing flows through every stage before the next one is finished, so
+    nothing is written to disk between stages and memory stays constant per row
+    (apart from the deep search's bounded look-ahead window, and the ranking, which
+    holds the filtered listings until the last one is scored).
+
+    Args:
+        listings (iterable): Listing records from the search.
+        output_csv (str): Where to write the listings that pass every stage.
+        keyword (str or KeywordMatcher): Keyword the final listings must contain in some column ("null" for all).
+        exclusions (list): Keywords no final listing may contain in its title or trim
+            (KeywordMatcher.EXCLUSION_COLUMNS).
+        store (ListingStore): Saves the deep-search details when given.
+        driver_path (str): Path to chromedriver for pages that need a browser.
+        workers (int): Number of concurrent deep-search workers.
+        delta (ListingDelta): This run's changes; unchanged listings reuse their stored details.
+        cache_path (str or DiskCache): The deep search's detail cache (see Autotrader_DeepSearch.enrich_stream).
+
+    Returns:
+        str: output_csv.
+    """
+    total = None
+    if isinstance(listings, list):
+        # Unique links, so the deep search ETA matches what dedup lets through
+        total = len({DiskCache.normalize_listing_url(listing.link) for listing in listings if listing.link})
+    stream = dedup(listings)
+    reuse_keys = delta.unchanged_keys() if delta is not None else None
+    stream = deep_search(stream, driver_path, workers, store=store, total=total, cache_path=cache_path,
+                         reuse_keys=reuse_keys)
+    stream = cleanup(stream)
+    stream = drop_near_duplicates(stream)
+    stream = keyword_filter(stream, keyword, exclusions)
+    if rank:
+        stream = score_deals(stream)
+    count = write_csv(stream, output_csv)
+    print(f"{count} listings saved to {output_csv}")
+    return output_csv
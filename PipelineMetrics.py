@@ -0,0 +1,255 @@
+import csv
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the per-item latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, math.inf)
+# Weight of the newest interval in the throughput average; higher reacts faster, lower is smoother
+EWMA_ALPHA = 0.2
+
+TIMEOUT_ERROR_NAMES = ("Timeout", "TimeoutError", "TimeoutException", "ReadTimeout", "ConnectTimeout")
+
+
+def _bucket_label(upper_bound):
+    return "inf" if math.isinf(upper_bound) else str(upper_bound)
+
+
+def is_timeout(error):
+    """
+    True for requests, Selenium and built-in timeout errors.
+    """
+    return any(cls.__name__ in TIMEOUT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def format_duration(seconds):
+    """
+    Formats seconds as e.g. "1h 02m 03s".
+    """
+    if seconds is None or math.isinf(seconds):
+        return "?"
+    seconds = int(round(seconds))
+    return f"{seconds // 3600}h {(seconds % 3600) // 60:02d}m {seconds % 60:02d}s"
+
+
+class StageMetrics:
+    """
+    Counters, a latency histogram and an EWMA throughput for one pipeline stage.
+
+    Throughput is measured from the wall-clock gaps between completed items, so it
+    stays correct when several workers finish items concurrently. Everything is
+    O(1) per item.
+    """
+
+    def __init__(self, name, total=None, alpha=EWMA_ALPHA):
+        self.name = name
+        self.total = total
+        self.alpha = alpha
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency_sum = 0.0
+        self.latency_min = None
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.ewma_interval = None
+        self.started_at = time.time()
+        self.last_completed_at = None
+        self.lock = threading.Lock()
+
+    def record(self, latency, ok=True, timeout=False):
+        """
+        Records one finished item.
+
+        Args:
+            latency (float): Seconds spent on the item.
+            ok (bool): False if the item failed.
+            timeout (bool): True if it failed because something timed out.
+        """
+        now = time.time()
+        with self.lock:
+            self.count += 1
+            if not ok:
+                self.errors += 1
+            if timeout:
+                self.timeouts += 1
+
+            self.latency_sum += latency
+            self.latency_min = latency if self.latency_min is None else min(self.latency_min, latency)
+            self.latency_max = max(self.latency_max, latency)
+            for index, upper_bound in enumerate(LATENCY_BUCKETS):
+                if latency <= upper_bound:
+                    self.buckets[index] += 1
+                    break
+
+            interval = now - (self.last_completed_at or self.started_at)
+            self.last_completed_at = now
+            if self.ewma_interval is None:
+                self.ewma_interval = interval
+            else:
+                self.ewma_interval = self.alpha * interval + (1 - self.alpha) * self.ewma_interval
+
+    @contextmanager
+    def timed(self):
+        """
+        Times the wrapped block as one item; exceptions count as errors (or timeouts) and are re-raised.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(time.perf_counter() - start_time, ok=False, timeout=is_timeout(e))
+            raise
+        self.record(time.perf_counter() - start_time)
+
+    def throughput(self):
+        """
+        EWMA throughput in items per second.
+        """
+        if not self.ewma_interval:
+            return 0.0
+        return 1.0 / self.ewma_interval
+
+    def eta_seconds(self):
+        """
+        Seconds left at the current EWMA throughput, or None if the total is unknown.
+        """
+        if self.total is None or self.ewma_interval is None:
+            return None
+        return max(self.total - self.count, 0) * self.ewma_interval
+
+    def percentile(self, fraction):
+        """
+        Approximate latency percentile (upper bound of the histogram bucket it falls in).
+        """
+        if not self.count:
+            return None
+        target = fraction * self.count
+        seen = 0
+        for upper_bound, bucket_count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += bucket_count
+            if seen >= target:
+                return min(upper_bound, self.latency_max)
+        return self.latency_max
+
+    def progress_line(self):
+        done = f"{self.count}/{self.total}" if self.total is not None else str(self.count)
+        mean = self.latency_sum / self.count if self.count else 0.0
+        return (
+            f"[{self.name}] {done} | avg {mean:.2f}s/item | {self.throughput():.2f} items/s | "
+            f"ETA {format_duration(self.eta_seconds())} | {self.errors} errors, {self.timeouts} timeouts"
+        )
+
+    def as_dict(self):
+        with self.lock:
+            elapsed = (self.last_completed_at or time.time()) - self.started_at
+            return {
+                "stage": self.name,
+                "items": self.count,
+                "total": self.total,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "elapsed_seconds": round(elapsed, 3),
+                "latency_mean": round(self.latency_sum / self.count, 4) if self.count else None,
+                "latency_min": round(self.latency_min, 4) if self.latency_min is not None else None,
+                "latency_max": round(self.latency_max, 4),
+                "latency_p50": self.percentile(0.5),
+                "latency_p95": self.percentile(0.95),
+                "ewma_items_per_second": round(self.throughput(), 4),
+                "average_items_per_second": round(self.count / elapsed, 4) if elapsed > 0 else None,
+                "latency_histogram": {
+                    _bucket_label(upper_bound): bucket_count
+                    for upper_bound, bucket_count in zip(LATENCY_BUCKETS, self.buckets)
+                },
+            }
+
+
+class PipelineMetrics:
+    """
+    The metrics of every stage of one pipeline run, plus run-level counters
+    (e.g. browser startup time) and a JSON/CSV dump.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+
+    def stage(self, name, total=None):
+        """
+        Returns the metrics of a stage, creating them on first use. A total is added to
+        the stage's ETA target, so queries of a batch running the same stage
+        concurrently each count their own items instead of replacing each other's.
+        """
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageMetrics(name, total)
+            elif total is not None:
+                stage = self.stages[name]
+                stage.total = total if stage.total is None else stage.total + total
+            return self.stages[name]
+
+    def add(self, counter, value=1):
+        """
+        Adds to a run-level counter.
+        """
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def as_dict(self):
+        return {
+            "started_at": self.started_at,
+            "elapsed_seconds": round(time.time() - self.started_at, 3),
+            "counters": dict(self.counters),
+            "stages": [stage.as_dict() for stage in self.stages.values()],
+        }
+
+    def dump(self, json_path=None, csv_path=None):
+        """
+        Writes the run's metrics as JSON (everything) and/or CSV (one row per stage).
+        """
+        data = self.as_dict()
+        if json_path:
+            with open(json_path, mode='w', encoding='utf-8') as file:
+                json.dump(data, file, indent=2)
+        if csv_path:
+            histogram_columns = [f"le_{_bucket_label(upper_bound)}" for upper_bound in LATENCY_BUCKETS]
+            with open(csv_path, mode='w', newline='', encoding='utf-8') as file:
+                writer = None
+                for stage in data["stages"]:
+                    row = {key: value for key, value in stage.items() if key != "latency_histogram"}
+                    row.update(zip(histogram_columns, stage["latency_histogram"].values()))
+                    if writer is None:
+                        writer = csv.DictWriter(file, fieldnames=list(row))
+                        writer.writeheader()
+                    writer.writerow(row)
+        return data
+
+    def report(self):
+        """
+        Prints one summary line per stage.
+        """
+        for stage in self.stages.values():
+            print(stage.progress_line())
+
+
+_metrics = PipelineMetrics()
+
+
+def get_metrics():
+    """
+    Returns the metrics of the current run, shared by every stage.
+    """
+    return _metrics
+
+
+def reset():
+    """
+    Starts a fresh set of metrics for a new run.
+    """
+    global _metrics
+    _metrics = PipelineMetrics()
+    return _metrics
@@ -0,0 +1,108 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Requests per second every fetch path starts at, and the bounds the limiter adapts within
+DEFAULT_RATE = 2.0
+DEFAULT_BURST = 4
+MIN_RATE = 0.2
+MAX_RATE = 8.0
+# Responses slower than this many seconds count as a sign the site is struggling
+SLOW_RESPONSE_SECONDS = 8.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket whose refill rate adapts to how the site responds.
+
+    Every successful, fast response nudges the rate up by a small step; an error
+    or a slow response halves it (additive increase, multiplicative decrease),
+    so the scraper settles at the fastest rate the site tolerates.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=MIN_RATE, max_rate=MAX_RATE,
+                 slow_response_seconds=SLOW_RESPONSE_SECONDS, increase_step=0.1):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_response_seconds = slow_response_seconds
+        self.increase_step = increase_step
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until the requested number of tokens is available, then takes them.
+        """
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def record(self, elapsed, ok=True):
+        """
+        Feeds the outcome of one request back into the rate.
+
+        Args:
+            elapsed (float): How long the request took, in seconds.
+            ok (bool): False if the request failed or was refused by the site.
+        """
+        with self.lock:
+            if not ok or elapsed >= self.slow_response_seconds:
+                self.rate = max(self.min_rate, self.rate / 2)
+                # Drop any saved-up burst so the slowdown takes effect right away
+                self.tokens = min(self.tokens, 0.0)
+            else:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+
+_limiter = TokenBucket()
+
+
+def configure(rate=DEFAULT_RATE, burst=DEFAULT_BURST, min_rate=MIN_RATE, max_rate=MAX_RATE,
+              slow_response_seconds=SLOW_RESPONSE_SECONDS):
+    """
+    Replaces the shared limiter used by every fetch path.
+    """
+    global _limiter
+    _limiter = TokenBucket(rate, burst, min_rate, max_rate, slow_response_seconds)
+    return _limiter
+
+
+def get_limiter():
+    """
+    Returns the shared limiter used by every fetch path.
+    """
+    return _limiter
+
+
+@contextmanager
+def throttled():
+    """
+    Waits for a token from the shared limiter, then times the wrapped request and
+    reports its outcome back so the rate can adapt.
+
+    Usage:
+        with RateLimiter.throttled():
+            driver.get(url)
+    """
+    limiter = get_limiter()
+    limiter.acquire()
+    start_time = time.monotonic()
+    try:
+        yield
+    except Exception:
+        limiter.record(time.monotonic() - start_time, ok=False)
+        raise
+    limiter.record(time.monotonic() - start_time, ok=True)
@@ -0,0 +1,193 @@
+import json
+import threading
+import time
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import DiskCache
+
+RESULT_CACHE_PATH = "result_cache.sqlite"
+# Results pages are reused without asking the site for this long
+RESULT_CACHE_TTL_SECONDS = 30 * 60
+# With check_newest, older pages are still reused (up to this age) when page 1 shows nothing new
+RESULT_CACHE_MAX_STALE_SECONDS = 24 * 3600
+RESULT_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Results page sort (srt) assumed to list the newest ads first, for the check_newest head check.
+# An assumption: nothing in the tree confirms it (the searches themselves use srt=35). The head
+# check also compares the result count, but pass the right code (or None, to compare the query's
+# own page 1) to ShardPlanner.results_page_fetcher if the site's sort dropdown says otherwise.
+NEWEST_FIRST_SORT = "9"
+
+# Parameters that are not part of what a search returns: the page offset is keyed separately
+_IGNORED_URL_PARAMETERS = {"rcs"}
+_IGNORED_PAYLOAD_KEYS = {"Skip"}
+
+
+def normalize_search_url(url):
+    """
+    Returns a search URL in a canonical form: lowercase host and path, parameters
+    decoded and sorted, without the rcs offset. URLs for the same search (whatever
+    their parameter order or encoding) normalize to the same string.
+    """
+    parts = urlsplit(url)
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if key not in _IGNORED_URL_PARAMETERS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.lower().rstrip("/") + "/",
+                       urlencode(query, quote_via=quote), ""))
+
+
+def with_sort(url, sort):
+    """
+    Returns the search URL with its srt (sort order) parameter replaced.
+    """
+    parts = urlsplit(url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    query["srt"] = sort
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def search_key(request, exclusions=None):
+    """
+    Returns the cache key of a search: a results page URL or a search API payload, plus
+    the exclusions the cached listings were filtered with.
+    """
+    if isinstance(request, dict):
+        normalized = json.dumps({key: value for key, value in request.items() if key not in _IGNORED_PAYLOAD_KEYS},
+                                sort_keys=True)
+    else:
+        normalized = normalize_search_url(request)
+    excluded = ",".join(sorted({keyword.strip().lower() for keyword in exclusions or () if keyword.strip()}))
+    return f"{normalized}|{excluded}"
+
+
+class ResultPageCache:
+    """
+    Search results pages kept on disk, keyed by the normalized search and the page offset.
+
+    A page is reused for ttl_seconds. In check_newest mode (see CachedPageFetcher),
+    pages up to max_stale_seconds old are reused while the search's newest
+    listings are unchanged. Storage is bounded by the DiskCache's LRU eviction.
+    Safe to share between threads.
+    """
+
+    def __init__(self, path=RESULT_CACHE_PATH, ttl_seconds=RESULT_CACHE_TTL_SECONDS, max_bytes=RESULT_CACHE_MAX_BYTES,
+                 max_stale_seconds=RESULT_CACHE_MAX_STALE_SECONDS):
+        self.cache = DiskCache.DiskCache(path, max(ttl_seconds, max_stale_seconds), max_bytes)
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.stats = {"page_hits": 0, "page_misses": 0, "head_checks": 0, "heads_unchanged": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get(self, key, offset):
+        """
+        Returns the cached page at offset as a dict (listings, total, stored_at), or None.
+        """
+        return self.cache.get(f"{key}#{offset}")
+
+    def set(self, key, offset, listings, total):
+        self.cache.set(f"{key}#{offset}", {"listings": listings, "total": total, "stored_at": time.time()})
+
+    def head_unchanged(self, key, listings, total):
+        """
+        Records a search's newest listings and returns True if they are the ones recorded last time.
+        """
+        head = {"links": [listing.get("Link") for listing in listings], "total": total}
+        unchanged = self.cache.get(key + "#head") == head
+        self.cache.set(key + "#head", head)
+        self.count("head_checks")
+        if unchanged:
+            self.count("heads_unchanged")
+        return unchanged
+
+    def cached_fetcher(self, fetch_page, request_for, exclusions=None, check_newest=False, fetch_head=None,
+                       head_is_first_page=False):
+        """
+        Wraps a ShardPlanner fetch_page(filters, offset) so pages come from the cache when they can.
+        See CachedPageFetcher for the arguments; make one per search run.
+        """
+        return CachedPageFetcher(self, fetch_page, request_for, exclusions, check_newest, fetch_head,
+                                 head_is_first_page)
+
+    def report(self, label="Result page cache"):
+        stats = self.stats
+        pages = stats["page_hits"] + stats["page_misses"]
+        hit_rate = stats["page_hits"] / pages if pages else 0.0
+        print(f"{label}: {stats['page_hits']} of {pages} pages from cache ({hit_rate:.1%}), "
+              f"{stats['heads_unchanged']} of {stats['head_checks']} searches unchanged at the top")
+
+    def close(self):
+        self.cache.close()
+
+
+class CachedPageFetcher:
+    """
+    A ShardPlanner fetch_page(filters, offset) -> (listings, total) that reads and
+    fills a ResultPageCache, for one search run.
+
+    Pages fetched during the run are always reused. Older pages are reused while
+    younger than the cache's ttl_seconds; with check_newest, start_query() instead
+    fetches the query's newest-first page 1 once, before it is split into shards,
+    and every shard's cached pages (up to max_stale_seconds old) are reused only if
+    that page lists the same ads, and the same result count, as last time.
+
+    Args:
+        request_for (callable): Returns the URL or payload a filters dict is fetched with.
+        fetch_head (callable): fetch_head(filters) -> (listings, total) of the newest-first page 1.
+        head_is_first_page (bool): True when fetch_head fetches the query's own page 1 (the
+            search API), so the head doubles as that page instead of being fetched twice.
+    """
+
+    def __init__(self, cache, fetch_page, request_for, exclusions=None, check_newest=False, fetch_head=None,
+                 head_is_first_page=False):
+        self.cache = cache
+        self.fetch_page = fetch_page
+        self.request_for = request_for
+        self.exclusions = exclusions
+        self.check_newest = check_newest and fetch_head is not None
+        self.fetch_head = fetch_head
+        self.head_is_first_page = head_is_first_page
+        self.started_at = time.time()
+        self.unchanged = None  # unknown until start_query
+
+    def key(self, filters):
+        return search_key(self.request_for(filters), self.exclusions)
+
+    def start_query(self, filters):
+        """
+        Runs the check_newest head check for the whole (unsharded) query; returns True if it is unchanged.
+        """
+        if not self.check_newest:
+            return None
+        key = self.key(filters)
+        listings, total = self.fetch_head(filters)
+        self.unchanged = self.cache.head_unchanged(key, listings, total)
+        if self.head_is_first_page:
+            self.cache.set(key, 0, listings, total)
+        return self.unchanged
+
+    def _usable(self, entry):
+        if entry["stored_at"] >= self.started_at:
+            return True  # fetched earlier in this run
+        if self.check_newest and self.unchanged is not None:
+            return self.unchanged  # the DiskCache has already dropped pages past max_stale_seconds
+        return time.time() - entry["stored_at"] <= self.cache.ttl_seconds
+
+    def __call__(self, filters, offset):
+        key = self.key(filters)
+        entry = self.cache.get(key, offset)
+        if entry is not None and self._usable(entry):
+            self.cache.count("page_hits")
+            return entry["listings"], entry["total"]
+        self.cache.count("page_misses")
+        listings, total = self.fetch_page(filters, offset)
+        self.cache.set(key, offset, listings, total)
+        return listings, total
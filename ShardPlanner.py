@@ -0,0 +1,250 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import parse_qsl, quote, urlencode, urlsplit, urlunsplit
+
+import AutotraderSearchAPI
+import PipelineMetrics
+import ResultPageCache
+
+# Most results one search is allowed to page through; bigger searches are split.
+# The site stops serving results past a cap while still reporting the full count,
+# so a shard over the cap would be silently truncated.
+MAX_SHARD_RESULTS = 1000
+# Shards probed (page 1 fetched) or crawled at the same time
+DEFAULT_SHARD_WORKERS = 4
+
+# Filter ranges a shard can be split on, in the order they are tried: (low key, high key, smallest span,
+# geometric). Prices and mileages are split at geometric steps, since open-ended ranges like
+# 0-999999 hold nearly every listing in their lowest few percent.
+SHARD_DIMENSIONS = [
+    ("min_year", "max_year", 1, False),
+    ("price_min", "price_max", 500, True),
+    ("min_mileage", "max_mileage", 1000, True),
+]
+
+# URL parameter holding each range, as GetUserQuery.build_query writes them
+URL_RANGE_PARAMETERS = {"min_year": "yRng", "price_min": "pRng", "min_mileage": "oRng"}
+
+
+class Shard:
+    """
+    One disjoint slice of a query: its filters, and what probing it found.
+
+    Attributes:
+        filters (dict): The query's filters with narrowed year/price/mileage ranges.
+        total (int or None): Results the site reported for the shard.
+        first_page (list): Listings of the shard's first page, fetched by the probe.
+        truncated (bool): True when the shard is still over the cap but can't be split further.
+    """
+
+    def __init__(self, filters, total=None, first_page=None, truncated=False):
+        self.filters = filters
+        self.total = total
+        self.first_page = first_page or []
+        self.truncated = truncated
+
+    def __repr__(self):
+        ranges = ", ".join(f"{self.filters[low]}-{self.filters[high]}" for low, high, _, _ in SHARD_DIMENSIONS)
+        return f"Shard({ranges}: {self.total} results)"
+
+
+def split_range(low, high, parts, geometric=False):
+    """
+    Splits the integer range low..high (both included) into up to `parts` disjoint ranges,
+    of equal width or (geometric) of equal ratio between their bounds.
+    """
+    parts = max(1, min(parts, high - low + 1))
+    if geometric:
+        # log1p, so a range starting at 0 works too
+        step = (math.log1p(high + 1) - math.log1p(low)) / parts
+        bounds = [round(math.expm1(math.log1p(low) + step * part)) for part in range(parts)] + [high + 1]
+    else:
+        width = (high - low + 1) / parts
+        bounds = [low + round(width * part) for part in range(parts)] + [high + 1]
+    return [(bounds[part], bounds[part + 1] - 1) for part in range(parts) if bounds[part] <= bounds[part + 1] - 1]
+
+
+def split_filters(filters, total, max_results=MAX_SHARD_RESULTS):
+    """
+    Splits a query's filters on its first range wide enough to split, into as many
+    parts as its result count needs (total / max_results, rounded up).
+
+    Returns:
+        list or None: Filters of the parts, or None if no range can be split any more.
+    """
+    parts = max(2, math.ceil(total / max_results))
+    for low_key, high_key, smallest_span, geometric in SHARD_DIMENSIONS:
+        low, high = int(filters[low_key]), int(filters[high_key])
+        if low_key == "min_year":
+            # No listing is newer than next year's models, so open-ended year ranges split where the cars are
+            high = min(high, datetime.now().year + 1)
+        if high - low + 1 < 2 * smallest_span:
+            continue
+        ranges = split_range(low, high, min(parts, (high - low + 1) // smallest_span), geometric)
+        # The last part keeps the original upper bound, so no listing falls outside every shard
+        ranges[-1] = (ranges[-1][0], int(filters[high_key]))
+        return [dict(filters, **{low_key: part_low, high_key: part_high}) for part_low, part_high in ranges]
+    return None
+
+
+def with_ranges(search_url, filters):
+    """
+    Returns the search URL with its yRng, pRng and oRng parameters set from the filters.
+    """
+    parts = urlsplit(search_url)
+    query = dict(parse_qsl(parts.query, keep_blank_values=True))
+    for low_key, high_key, _, _ in SHARD_DIMENSIONS:
+        query[URL_RANGE_PARAMETERS[low_key]] = f"{filters[low_key]},{filters[high_key]}"
+    query["rcs"] = "0"
+    # Keep commas and spaces the way GetUserQuery encodes them (%2C, %20)
+    return urlunsplit(parts._replace(query=urlencode(query, quote_via=quote)))
+
+
+def api_page_fetcher(session, api_url=AutotraderSearchAPI.SEARCH_API_URL, exclusions=None, cache=None,
+                     check_newest=False):
+    """
+    Returns fetch_page(filters, offset) -> (listings, total) over the search API, and the page size.
+
+    With a ResultPageCache, pages are reused from it (see ResultPageCache.CachedPageFetcher).
+    The API's newest-first order isn't known, so check_newest compares the query's
+    own page 1 and result count instead; that page is then used as page 1.
+    """
+    def fetch_page(filters, offset):
+        payload = AutotraderSearchAPI.build_search_payload(filters)
+        return AutotraderSearchAPI.fetch_search_page(session, payload, offset, payload["Top"], api_url, exclusions=exclusions)
+
+    def fetch_head(filters):
+        return fetch_page(filters, 0)
+
+    if cache is not None:
+        return (cache.cached_fetcher(fetch_page, AutotraderSearchAPI.build_search_payload, exclusions, check_newest,
+                                     fetch_head, head_is_first_page=True), AutotraderSearchAPI.DEFAULT_PAGE_SIZE)
+    return fetch_page, AutotraderSearchAPI.DEFAULT_PAGE_SIZE
+
+
+def results_page_fetcher(session, search_url, exclusions=None, cache=None, check_newest=False,
+                         newest_sort=ResultPageCache.NEWEST_FIRST_SORT):
+    """
+    Returns fetch_page(filters, offset) -> (listings, total) over server-rendered results pages, and the page size.
+
+    With a ResultPageCache, pages are reused from it; check_newest compares the
+    query's page 1 sorted by newest_sort (srt) with last time's. newest_sort is
+    an assumed code (see ResultPageCache.NEWEST_FIRST_SORT); None compares the
+    query's own page 1, like the search API.
+    """
+    def fetch_page(filters, offset):
+        return AutotraderSearchAPI.fetch_results_page(session, with_ranges(search_url, filters), offset, exclusions=exclusions)
+
+    def fetch_newest(filters):
+        newest_url = ResultPageCache.with_sort(with_ranges(search_url, filters), newest_sort)
+        return AutotraderSearchAPI.fetch_results_page(session, newest_url, 0, exclusions=exclusions)
+
+    page_size = AutotraderSearchAPI.page_size_from_url(search_url)
+    if cache is not None:
+        if newest_sort is None:
+            return (cache.cached_fetcher(fetch_page, lambda filters: with_ranges(search_url, filters), exclusions,
+                                         check_newest, lambda filters: fetch_page(filters, 0),
+                                         head_is_first_page=True), page_size)
+        return (cache.cached_fetcher(fetch_page, lambda filters: with_ranges(search_url, filters), exclusions,
+                                     check_newest, fetch_newest), page_size)
+    return fetch_page, page_size
+
+
+def plan_shards(filters, fetch_page, max_results=MAX_SHARD_RESULTS, shard_workers=DEFAULT_SHARD_WORKERS):
+    """
+    Splits a query into disjoint shards of at most max_results results each.
+
+    Each candidate shard is probed by fetching its first page, which reports its
+    result count; shards over the limit are split on year, then price, then
+    mileage (see split_filters) into as many parts as their count needs, and the
+    parts probed in turn, one level at a time, concurrently.
+
+    Args:
+        filters (dict): The query's filters (GetUserQuery format).
+        fetch_page (callable): fetch_page(filters, offset) -> (listings, total).
+
+    Returns:
+        list: Shard objects; their first pages are kept so they aren't fetched again.
+    """
+    metrics = PipelineMetrics.get_metrics()
+    shards = []
+    pending = [filters]
+    with ThreadPoolExecutor(max_workers=shard_workers) as executor:
+        while pending:
+            probes = list(executor.map(lambda shard_filters: fetch_page(shard_filters, 0), pending))
+            metrics.add("shard_probes", len(pending))
+            next_pending = []
+            for shard_filters, (first_page, total) in zip(pending, probes):
+                if total is None or total <= max_results:
+                    if total != 0:
+                        shards.append(Shard(shard_filters, total, first_page))
+                    continue
+                parts = split_filters(shard_filters, total, max_results)
+                if parts is None:
+                    print(f"Warning: {total} results can't be split below {max_results}; the site may truncate them.")
+                    shards.append(Shard(shard_filters, total, first_page, truncated=True))
+                    continue
+                next_pending.extend(parts)
+            pending = next_pending
+    metrics.add("shards", len(shards))
+    return shards
+
+
+def fetch_shard(shard, fetch_page, page_size, max_pages=9999, workers=AutotraderSearchAPI.DEFAULT_WORKERS):
+    """
+    Fetches every page of a probed shard after the first, concurrently.
+
+    Returns:
+        list: The shard's listings in page order, deduplicated by Link.
+    """
+    if shard.total is None:
+        # Without a count the offsets can't be computed up front, page through serially instead
+        pages = [shard.first_page]
+        while pages[-1] and len(pages) < max_pages:
+            pages.append(fetch_page(shard.filters, len(pages) * page_size)[0])
+        return AutotraderSearchAPI.merge_listings(pages)
+    offsets = AutotraderSearchAPI.page_offsets(shard.total, page_size, max_pages)
+    pages = AutotraderSearchAPI.fetch_pages_concurrently(
+        lambda offset: fetch_page(shard.filters, offset)[0], offsets, workers)
+    return AutotraderSearchAPI.merge_listings([shard.first_page] + pages)
+
+
+def search_sharded(filters, fetch_page, page_size, max_pages=9999, workers=AutotraderSearchAPI.DEFAULT_WORKERS,
+                   max_results=MAX_SHARD_RESULTS, shard_workers=DEFAULT_SHARD_WORKERS):
+    """
+    Runs one logical query as disjoint shards in parallel and merges the results.
+
+    Sharding only kicks in when the query asks for more results than
+    max_results (max_pages pages); a query limited to fewer pages runs as a
+    single shard, like before.
+
+    Args:
+        filters (dict): The query's filters (GetUserQuery format).
+        fetch_page (callable), page_size (int): From api_page_fetcher or results_page_fetcher.
+            A cached fetcher's check_newest head check runs here, once for the whole query.
+        max_pages (int): The query's page limit (per shard once the query is sharded).
+        workers (int): Page fetches at the same time within a shard.
+
+    Returns:
+        list: Listing dicts, in shard then page order, deduplicated by Link.
+    """
+    start_time = time.perf_counter()
+    if isinstance(fetch_page, ResultPageCache.CachedPageFetcher):
+        # One newest-first check for the whole query, reused by every shard
+        fetch_page.start_query(filters)
+    if max_pages * page_size <= max_results:
+        max_results = max_pages * page_size  # nothing past the page limit is wanted anyway
+        first_page, total = fetch_page(filters, 0)
+        shards = [Shard(filters, min(total, max_results) if total is not None else None, first_page)]
+    else:
+        shards = plan_shards(filters, fetch_page, max_results, shard_workers)
+    total = sum(shard.total or 0 for shard in shards)
+    print(f"{total} results in {len(shards)} shards, planned in {time.perf_counter() - start_time:.1f}s")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(shard_workers, len(shards)))) as executor:
+        pages = list(executor.map(lambda shard: fetch_shard(shard, fetch_page, page_size, max_pages, workers), shards))
+    listings = AutotraderSearchAPI.merge_listings(pages)
+    print(f"Fetched {len(listings)} listings from {len(shards)} shards in {time.perf_counter() - start_time:.1f}s")
+    return listings
@@ -1,13 +1,14 @@
 import csv
 import webbrowser
 
-def open_links_from_csv(file_path, column_name = "Link"):
+def open_links_from_csv(file_path, column_name = "Link", limit = None):
     """
     Opens links from a specified column in a CSV file in Chrome tabs.
 
     Parameters:
         file_path (str): Path to the CSV file.
         column_name (str): The name of the column containing the links.
+        limit (int): Open only the first this many links (the pipeline's CSV is ranked best deal first).
     """
     try:
         # Open the CSV file
@@ -20,10 +21,14 @@ def open_links_from_csv(file_path, column_name = "Link"):
                 return
 
             # Open each link in a new tab
+            opened = 0
             for row in reader:
+                if limit is not None and opened >= limit:
+                    break
                 link = row[column_name].strip()
                 if link:
                     webbrowser.open_new_tab(link)
+                    opened += 1
             print("Links have been opened in Chrome.")
     except FileNotFoundError:
         print(f"Error: File '{file_path}' not found.")
@@ -32,10 +37,10 @@ def open_links_from_csv(file_path, column_name = "Link"):
 
 # Example Usage
 # Provide the path to your CSV file and the column name containing the links
-def showcarsmain(csv_file_path):
+def showcarsmain(csv_file_path, limit = None):
     # Replace with the path to your CSV file
     link_column_name = 'Link'  # Replace with the actual column name in your CSV
-    open_links_from_csv(csv_file_path, link_column_name)
+    open_links_from_csv(csv_file_path, link_column_name, limit)
 
 
 # if True:
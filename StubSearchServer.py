@@ -0,0 +1,215 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+import AutotraderSearchAPI
+import GetUserQuery
+import ShardPlanner
+
+# Trims, cities and prices cycled through to make the fake listings look different
+STUB_TRIMS = ["SE", "Titanium", "S", "SEL", "Sport", "Platinum"]
+STUB_CITIES = ["Kanata, ON", "Ottawa, ON", "Gatineau, QC", "Kingston, ON", "Toronto, ON"]
+
+
+def listing_values(index):
+    """
+    Returns the (year, trim, price, mileage, city) of fake listing number index.
+    """
+    year = 2017 + index % 3
+    trim = STUB_TRIMS[index % len(STUB_TRIMS)]
+    price = 12000 + (index * 137) % 6000
+    mileage = 40000 + (index * 2311) % 120000
+    city = STUB_CITIES[index % len(STUB_CITIES)]
+    return year, trim, price, mileage, city
+
+
+def matching_indexes(total_listings, year_range=None, price_range=None, mileage_range=None):
+    """
+    Returns the indexes of the fake listings within every given (low, high) range, bounds included.
+    """
+    ranges = [(0, year_range), (2, price_range), (3, mileage_range)]
+    indexes = []
+    for index in range(total_listings):
+        values = listing_values(index)
+        if all(bounds is None or bounds[0] <= values[position] <= bounds[1] for position, bounds in ranges):
+            indexes.append(index)
+    return indexes
+
+
+def _url_range(query, name):
+    # yRng=2017%2C2019 arrives decoded as "2017,2019"; a missing side is unbounded
+    if name not in query:
+        return None
+    low, _, high = query[name].partition(",")
+    return (int(low) if low.strip() else float("-inf"), int(high) if high.strip() else float("inf"))
+
+
+def _payload_range(payload, low_key, high_key):
+    if low_key not in payload and high_key not in payload:
+        return None
+    return (payload.get(low_key, float("-inf")), payload.get(high_key, float("inf")))
+
+
+def render_listing_html(index, make="Ford", model="Fusion"):
+    """
+    Renders one search result in the same markup the results page uses.
+    """
+    year, trim, price, mileage, city = listing_values(index)
+    return (
+        f'<div class="dealer-split-wrapper">'
+        f'<a class="inner-link" href="/a/{make.lower()}/{model.lower()}/kanata/ontario/5_{100000 + index}_stub/">'
+        f'<span class="title-with-trim">{year} {make} {model} {trim}</span></a>'
+        f'<span class="price-amount">${price:,}</span>'
+        f'<span class="proximity-text">{city}</span>'
+        f'<span class="odometer-proximity">{mileage:,} km</span>'
+        f'</div>'
+    )
+
+
+def render_ads_html(skip, top, total_listings, make="Ford", model="Fusion", indexes=None, result_cap=None):
+    """
+    Renders the listings fragment for one page of results.
+
+    indexes are the listings matching the search (all of them by default); like
+    the real site, nothing past result_cap can be paged to, whatever the count says.
+    """
+    indexes = range(total_listings) if indexes is None else indexes
+    end = min(skip + top, len(indexes), result_cap if result_cap is not None else len(indexes))
+    return "".join(render_listing_html(indexes[position], make, model) for position in range(skip, end))
+
+
+def render_results_page(rcs, rcp, total_listings, make="Ford", model="Fusion", indexes=None, result_cap=None):
+    """
+    Renders a full server-side results page, including the result count in the title.
+    """
+    count = total_listings if indexes is None else len(indexes)
+    return (
+        f'<html><body><h1><span id="titleCount">{count:,}</span> results</h1>'
+        f'<div class="result-list">{render_ads_html(rcs, rcp, total_listings, make, model, indexes, result_cap)}</div>'
+        f'</body></html>'
+    )
+
+
+def render_detail_page(title):
+    """
+    Renders a detail page with the server-side highlight, specification and feature sections.
+    """
+    year, make, model, trim = (title.split(" ", 3) + ["", "", "", ""])[:4]
+    specs = {"Trim": trim, "Body Type": "Sedan", "Transmission": "Automatic", "Drivetrain": "FWD", "Year": year}
+    return (
+        f'<html><body><h1>{title}</h1><div id="highlightWidget">'
+        f'<div id="hl-card-body"><ul><li class="list-item"><span class="list-text">Backup Camera</span></li>'
+        f'<li class="list-item"><span class="list-text">Bluetooth</span></li></ul></div></div>'
+        f'<div id="sl-card-body"><ul>'
+        + "".join(f'<li class="list-item"><span class="col-xs-6">{key}</span><strong>{value}</strong></li>' for key, value in specs.items())
+        + f'</ul></div><div id="fo-card-body"><ul><li class="list-item"><span class="list-text">Air Conditioning</span></li>'
+        f'<li class="list-item"><span class="list-text">Bluetooth</span></li></ul></div></body></html>'
+    )
+
+
+class StubSearchHandler(BaseHTTPRequestHandler):
+    """
+    Answers POST /Refinement/Search the way the real search API does,
+    GET /cars/<make>/<model>/?rcp=..&rcs=.. with a results page, and
+    GET /a/... with a listing's detail page.
+    """
+
+    def _send(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        if segments and segments[0] == "a" and len(segments) >= 6:
+            # /a/<make>/<model>/<city>/<province>/5_<100000 + index>_stub/
+            index = int(segments[5].split("_")[1]) - 100000
+            year = 2017 + index % 3
+            title = f"{year} {segments[1].title()} {segments[2].title()} {STUB_TRIMS[index % len(STUB_TRIMS)]}"
+            self._send(render_detail_page(title).encode("utf-8"), "text/html")
+            return
+        if len(segments) < 3 or segments[0] != "cars":
+            self.send_error(404)
+            return
+
+        query = dict(parse_qsl(parts.query))
+        rcs = int(query.get("rcs", 0))
+        rcp = int(query.get("rcp", AutotraderSearchAPI.DEFAULT_PAGE_SIZE))
+        indexes = matching_indexes(self.server.total_listings, _url_range(query, "yRng"), _url_range(query, "pRng"),
+                                   _url_range(query, "oRng"))
+        body = render_results_page(rcs, rcp, self.server.total_listings, segments[1].title(), segments[2].title(),
+                                   indexes, self.server.result_cap)
+        self._send(body.encode("utf-8"), "text/html")
+
+    def do_POST(self):
+        if self.path.split("?")[0] != "/Refinement/Search":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        skip = int(payload.get("Skip", 0))
+        top = int(payload.get("Top", AutotraderSearchAPI.DEFAULT_PAGE_SIZE))
+        indexes = matching_indexes(
+            self.server.total_listings, _payload_range(payload, "YearMin", "YearMax"),
+            _payload_range(payload, "PriceMin", "PriceMax"), _payload_range(payload, "OdometerMin", "OdometerMax"))
+
+        body = json.dumps({
+            "AdsHtml": render_ads_html(skip, top, self.server.total_listings, payload.get("Make", "Ford"),
+                                       payload.get("Model", "Fusion"), indexes, self.server.result_cap),
+            "SearchResultsDataJson": json.dumps({"totalResultCount": len(indexes)}),
+        }).encode("utf-8")
+        self._send(body, "application/json")
+
+    def log_message(self, format, *args):
+        # Keep the console quiet, the scraper already prints its progress
+        pass
+
+
+def start_stub_server(total_listings=50, host="127.0.0.1", port=0, result_cap=None):
+    """
+    Starts the stub search server on a background thread.
+
+    Searches are filtered by their year, price and mileage ranges (yRng/pRng/oRng,
+    or YearMin/PriceMin/OdometerMin... in the API payload).
+
+    Args:
+        total_listings (int): Number of fake listings the server pages through.
+        result_cap (int): Results a single search can page through (None for no cap).
+        host (str): Interface to bind to.
+        port (int): Port to bind to (0 picks a free port).
+
+    Returns:
+        ThreadingHTTPServer: The running server; its base_url attribute points at it.
+            Call server.shutdown() to stop it.
+    """
+    server = ThreadingHTTPServer((host, port), StubSearchHandler)
+    server.total_listings = total_listings
+    server.result_cap = result_cap
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    server = start_stub_server(total_listings=47)
+    try:
+        payload = AutotraderSearchAPI.load_search_payload()
+        listings = AutotraderSearchAPI.search_listings(payload, api_url=server.base_url + "/Refinement/Search")
+        print(f"Fetched {len(listings)} listings from the stub server.")
+        for listing in listings[:3]:
+            print(listing)
+
+        filters = GetUserQuery.filters_from_payload({"Make": "Ford", "Model": "Fusion"})
+        search_url = server.base_url + "/cars/ford/fusion/?rcp=15&rcs=0&srt=35&pRng=12000%2C17000&loc=Kanata%2C%20ON"
+        with AutotraderSearchAPI.create_session(pool_size=4) as session:
+            fetch_page, page_size = ShardPlanner.results_page_fetcher(session, search_url)
+            listings = ShardPlanner.search_sharded(filters, fetch_page, page_size, workers=4)
+        print(f"Fetched {len(listings)} listings by offset from the stub server.")
+    finally:
+        server.shutdown()